@@ -0,0 +1,7 @@
+"""
+Performance benchmarks for every generation and export stage.
+
+    python -m benchmarks                        # full sweep, 4..4096 bars
+    python -m benchmarks --save main            # store benchmarks/baselines/main.json
+    python -m benchmarks --compare main         # fail (exit 1) on regressions
+"""
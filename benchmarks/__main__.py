@@ -0,0 +1,37 @@
+import argparse
+import sys
+
+from benchmarks.suite import (DEFAULT_THRESHOLD, QUICK_BARS, compare_results, load_baseline,
+                              run_suite, save_baseline)
+
+def main():
+    parser = argparse.ArgumentParser(description="Beat generator benchmark suite")
+    parser.add_argument('--bars', type=str, default=None, help="Comma-separated bar counts (default: 4,16,64,256,1024,4096)")
+    parser.add_argument('--quick', action='store_true', help="Only 4 and 64 bars")
+    parser.add_argument('--case', action='append', default=None, help="Only cases starting with this prefix (repeatable)")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Seconds of timing per measurement")
+    parser.add_argument('--save', type=str, default=None, help="Store results as a baseline (name or .json path)")
+    parser.add_argument('--compare', type=str, default=None, help="Compare against a baseline and fail on regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown/memory growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    bars_list = QUICK_BARS if args.quick else None
+    if args.bars:
+        bars_list = [int(b) for b in args.bars.split(',')]
+
+    results = run_suite(bars_list, args.case, args.min_time)
+
+    if args.save:
+        print(f"-> Saved baseline: {save_baseline(results, args.save)}")
+
+    if args.compare:
+        regressions = compare_results(load_baseline(args.compare), results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} vs {args.compare}.")
+
+if __name__ == "__main__":
+    main()
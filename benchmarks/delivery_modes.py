@@ -0,0 +1,47 @@
+"""
+Response payload size and latency of each generate_beat delivery mode, short beats to full songs.
+
+    python benchmarks/delivery_modes.py
+
+The payload is what travels back to the client: the base64 string, or the JSON of the response
+dict for the file modes (chunks: the manifest plus every read_beat_chunk response).
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Allow running directly from the repository root
+sys.path.append(os.getcwd())
+
+from src import delivery
+from src.server import generate_beat, read_beat_chunk
+
+BARS = [4, 64, 256, 1024]
+
+def run(bars, mode):
+    t0 = time.perf_counter()
+    result = asyncio.run(generate_beat(bars=bars, add_chords=True, add_drums=True, delivery=mode))
+    if mode == 'base64':
+        return len(base64.b64decode(result)), len(result), time.perf_counter() - t0
+    payload = len(json.dumps(result))
+    if mode == 'chunks':
+        payload += sum(len(json.dumps(read_beat_chunk(result['name'], i))) for i in range(result['chunks']))
+    return result['bytes'], payload, time.perf_counter() - t0
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        delivery.OUTPUT_DIR = tmp
+        run(4, 'base64') # Warm up imports and caches
+        print(f"{'Bars':>6} | {'Mode':<7} | {'File KB':>8} | {'Payload KB':>10} | {'ms':>8}")
+        print("-" * 50)
+        for bars in BARS:
+            for mode in delivery.DELIVERY_MODES:
+                size, payload, seconds = run(bars, mode)
+                print(f"{bars:>6} | {mode:<7} | {size / 1024:>8.1f} | {payload / 1024:>10.1f} | {seconds * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    main()
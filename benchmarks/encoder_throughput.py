@@ -0,0 +1,36 @@
+"""
+Track encoding throughput: pure-Python reference encoder vs the vectorized NumPy encoder.
+
+    python benchmarks/encoder_throughput.py
+"""
+import os
+import sys
+import time
+
+# Allow running directly from the repository root
+sys.path.append(os.getcwd())
+
+from src.accompaniment import DrumGenerator
+from src.midi_utils import encode_note_events_python, encode_note_events_numpy
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    print(f"{'Bars':>6} | {'Events':>8} | {'Python ev/s':>12} | {'NumPy ev/s':>12} | {'Speedup':>7}")
+    print("-" * 58)
+    for bars in [1, 4, 16, 64, 256, 1024, 4096]:
+        notes = DrumGenerator(140, seed=bars).generate_pattern(bars)
+        columns = notes.as_numpy()
+        events = 2 * len(notes)
+        t_py = best_of(lambda: encode_note_events_python(notes, notes.resolution, 9))
+        t_np = best_of(lambda: encode_note_events_numpy(*columns, channel=9))
+        print(f"{bars:>6} | {events:>8} | {events / t_py:>12,.0f} | {events / t_np:>12,.0f} | {t_py / t_np:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Import-time budget of the entry points (fresh interpreter, `python -X importtime`).
+
+    python benchmarks/import_time.py
+
+Exits 1 if a module takes longer than its budget to import.
+"""
+import os
+import subprocess
+import sys
+
+# Allow running directly from the repository root
+sys.path.append(os.getcwd())
+
+# Cumulative import time in ms, with headroom for slow machines
+IMPORT_BUDGETS_MS = {
+    'src.main': 50, # CLI up to argument parsing (generators are imported on use)
+    'src.daemon': 50, # Daemon client: what a forwarded CLI call loads
+    'src.server': 250, # MCP tools without the SDK (loaded by create_server())
+    'src.render': 400, # Full generator stack, NumPy included
+}
+RUNS = 3
+
+def import_times(module):
+    """(cumulative ms for `module`, {imported module: self ms}) from the best of RUNS fresh imports."""
+    best = None
+    for _ in range(RUNS):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                                capture_output=True, text=True, check=True, cwd=os.getcwd())
+        self_ms = {}
+        total = None
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            own, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+            self_ms[name] = int(own) / 1000
+            if name == module:
+                total = int(cumulative) / 1000
+        if best is None or total < best[0]:
+            best = (total, self_ms)
+    return best
+
+def main():
+    over = []
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        total, self_ms = import_times(module)
+        heaviest = sorted(self_ms.items(), key=lambda item: -item[1])[:3]
+        status = 'ok' if total <= budget else 'OVER'
+        print(f"{module:<12} {total:>8.1f} ms  (budget {budget} ms) {status:<4}  heaviest: "
+              + ', '.join(f"{name} {ms:.1f}" for name, ms in heaviest))
+        if total > budget:
+            over.append(module)
+    if over:
+        print(f"\nOver budget: {', '.join(over)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
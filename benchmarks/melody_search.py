@@ -0,0 +1,48 @@
+"""
+Throughput of the melody scorer and latency of best-of-K and beam search (src/scoring.py).
+
+    python benchmarks/melody_search.py
+
+Candidates/sec counts scored melodies (generate_batch not included); the search columns are
+the full call, drawing included.
+"""
+import os
+import sys
+import time
+
+# Allow running directly from the repository root
+sys.path.append(os.getcwd())
+
+from src.generator import MelodyGenerator
+from src.render_graph import RenderGraph
+from src.scoring import MelodyScorer, best_of_k, beam_search
+
+BARS = [4, 16, 64]
+CANDIDATES = 1024
+
+def best_time(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def main():
+    print(f"{'Bars':>5} | {'Var':<3} | {'Scored/sec':>11} | {'Best of 256 ms':>14} | {'Beam 256x8 ms':>13} | {'Score gain':>10}")
+    print("-" * 72)
+    for bars in BARS:
+        chords = RenderGraph(bars=bars, seed=1).chords()
+        for variation in 'ABC':
+            gen = MelodyGenerator('C', 'minor', 140, length_bars=bars, seed=1)
+            scorer = MelodyScorer(gen, chords)
+            batch = gen.generate_batch(CANDIDATES, variation)
+            scored = CANDIDATES / best_time(lambda: scorer.score(batch))
+            best = best_time(lambda: best_of_k(gen, variation, 256, chords=chords))
+            beam = best_time(lambda: beam_search(gen, variation, 256, 8, chords), repeat=2)
+            # Best found vs the median single draw
+            gain = best_of_k(gen, variation, 256, chords=chords)[0][0] - float(sorted(scorer.score(batch))[CANDIDATES // 2])
+            print(f"{bars:>5} | {variation:<3} | {scored:>11.0f} | {best * 1000:>14.1f} | {beam * 1000:>13.1f} | {gain:>+10.3f}")
+
+if __name__ == "__main__":
+    main()
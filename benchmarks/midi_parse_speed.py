@@ -0,0 +1,40 @@
+"""
+MidiReader parsing speed on a generated corpus.
+
+    python benchmarks/midi_parse_speed.py [num_files]
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Allow running directly from the repository root
+sys.path.append(os.getcwd())
+
+from src.catalog import build_jobs, render_catalog
+from src.midi_utils import scan_midi_folder
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with tempfile.TemporaryDirectory() as corpus:
+        # Mix of short loops and longer arrangements
+        jobs = build_jobs(num_files, seed=1)
+        for job in jobs:
+            job['bars'] = [4, 8, 16, 64][job['index'] % 4]
+        render_catalog(jobs, corpus, workers=1)
+        total_bytes = sum(os.path.getsize(os.path.join(corpus, f)) for f in os.listdir(corpus))
+
+        start = time.perf_counter()
+        notes = errors = 0
+        for _, tracks, error in scan_midi_folder(corpus):
+            if error is not None:
+                errors += 1
+                continue
+            notes += sum(len(t.notes) for t in tracks)
+        elapsed = time.perf_counter() - start
+
+    print(f"Parsed {num_files} files ({total_bytes / 1e6:.2f} MB, {notes} notes, {errors} errors) in {elapsed:.2f}s")
+    print(f"-> {total_bytes / 1e6 / elapsed:.2f} MB/s, {num_files / elapsed:.0f} files/s, {notes / elapsed:,.0f} notes/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# Allow running from the repository root without installing
+sys.path.append(os.getcwd())
+
+from src.accompaniment import ChordGenerator, DrumGenerator
+from src.generator import MelodyGenerator
+from src.midi_utils import MidiWriter
+
+DEFAULT_BARS = [4, 16, 64, 256, 1024, 4096]
+QUICK_BARS = [4, 64]
+DEFAULT_THRESHOLD = 0.25 # 25% slower (or 25% more peak memory) counts as a regression
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+# Each case: name -> setup(bars) returning the zero-argument callable to time
+def _melody_case(variation):
+    def setup(bars):
+        gen = MelodyGenerator('C', 'minor', 140, length_bars=bars, seed=1)
+        return lambda: gen.generate_variation(variation)
+    return setup
+
+def _drums(bars):
+    gen = DrumGenerator(140, seed=1)
+    return lambda: gen.generate_pattern(bars)
+
+def _drums_templated(bars):
+    gen = DrumGenerator(140, seed=1)
+    return lambda: gen.generate_pattern(bars, fill_every=8, variety=4)
+
+def _chords(bars):
+    gen = ChordGenerator('C', 'minor', seed=1)
+    return lambda: gen.generate_progression(bars)
+
+def _add_track(bars):
+    drums = DrumGenerator(140, seed=1).generate_pattern(bars)
+    return lambda: MidiWriter().add_track(drums, track_name="Drums", channel=9)
+
+def _write_to_stream(bars):
+    writer = MidiWriter()
+    writer.add_track(MelodyGenerator('C', 'minor', 140, length_bars=bars, seed=1).generate_variation('B'), channel=0)
+    writer.add_track(DrumGenerator(140, seed=1).generate_pattern(bars), channel=9)
+    return lambda: writer.write_to_stream(io.BytesIO())
+
+# One event loop for every generate_beat case (creating one per call would be timed too);
+# run_suite closes it when done
+_loop = None
+
+def _generate_beat(bars):
+    from src.server import generate_beat
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    loop = _loop
+    # Unseeded, so every call renders (no cache hits)
+    return lambda: loop.run_until_complete(generate_beat(key='C', scale='minor', bars=bars))
+
+def _close_loop():
+    global _loop
+    if _loop is not None:
+        _loop.close()
+        _loop = None
+
+CASES = {
+    'melody.generate_variation.A': _melody_case('A'),
+    'melody.generate_variation.B': _melody_case('B'),
+    'melody.generate_variation.C': _melody_case('C'),
+    'drums.generate_pattern': _drums,
+    'drums.templated': _drums_templated,
+    'chords.generate_progression': _chords,
+    'midi.add_track': _add_track,
+    'midi.write_to_stream': _write_to_stream,
+    'server.generate_beat': _generate_beat,
+}
+
+def time_ops(fn, min_time=0.2, repeat=3):
+    """Returns the best ops/sec over `repeat` runs of an auto-calibrated loop."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return 1.0 / best if best > 0 else float('inf')
+
+def peak_memory(fn):
+    """Peak traced allocation (bytes) during one call."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_suite(bars_list=None, cases=None, min_time=0.2, report=print):
+    """Runs the selected cases at every bar count. Returns a JSON-serializable results dict."""
+    bars_list = bars_list or DEFAULT_BARS
+    results = {}
+    try:
+        for name, setup in CASES.items():
+            if cases and not any(name.startswith(c) for c in cases):
+                continue
+            for bars in bars_list:
+                fn = setup(bars)
+                fn() # Warm up (imports, caches)
+                entry = {'ops_per_sec': time_ops(fn, min_time), 'peak_bytes': peak_memory(fn)}
+                results[f"{name}@{bars}"] = entry
+                if report:
+                    report(f"{name:<30} {bars:>5} bars  {entry['ops_per_sec']:>12,.1f} ops/s  "
+                           f"{entry['peak_bytes'] / 1024:>10,.1f} KB peak")
+    finally:
+        _close_loop()
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Lists regressions of current vs baseline: ops/sec dropping by more than threshold,
+    or peak memory growing by more than threshold. Cases missing from either side are ignored.
+    """
+    regressions = []
+    for key, base in baseline['results'].items():
+        cur = current['results'].get(key)
+        if cur is None:
+            continue
+        if cur['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{key}: {base['ops_per_sec']:,.1f} -> {cur['ops_per_sec']:,.1f} ops/s")
+        if base['peak_bytes'] and cur['peak_bytes'] > base['peak_bytes'] * (1 + threshold):
+            regressions.append(f"{key}: {base['peak_bytes']:,} -> {cur['peak_bytes']:,} peak bytes")
+    return regressions
+
+def baseline_path(name):
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, f"{name}.json")
+
+def save_baseline(results, name):
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    return path
+
+def load_baseline(name):
+    with open(baseline_path(name)) as f:
+        return json.load(f)
@@ -1,126 +1,161 @@
 import random
-from src.music_theory import get_scale_notes, get_note_index
+import numpy as np
+from src.music_theory import get_scale_notes, get_note_name
+from src.notes import NoteBuffer
+from src.timeline import bar_ticks, beats_to_ticks, parse_time_signature
+from src.profiling import timed
+from src.styles import load_style
+from src.voicings import chord_voicing, iter_voicings
+from src.drums import DrumArrangement, bar_layout, compile_templates
+
+CHORD_CHANNEL = 1
+DRUM_CHANNEL = 9 # General MIDI percussion
+DRUM_BLOCK_BARS = 16 # Bars drawn at a time by DrumGenerator.iter_pattern
+
+# Common Minor/Trap Progressions (Degrees)
+PROGRESSIONS = [
+    [1, 6, 7, 1], # i - VI - VII - i (Aeolian)
+    [1, 4, 5, 1], # i - iv - v - i
+    [1, 6, 3, 7], # i - VI - III - VII (Pop/Emotional)
+    [1, 2, 1, 5], # i - ii - i - v (Phrygian-ish if ii is flattened)
+]
 
 class ChordGenerator:
-    def __init__(self, key, scale_type):
+    def __init__(self, key, scale_type, seed=None, style=None, chord_type=None, voice_leading=None):
         self.key = key
         self.scale_type = scale_type
+        self.rng = random.Random(seed)
         self.scale_notes = get_scale_notes(key, scale_type, start_octave=3, end_octave=4)
-        # We need a way to build chords from scale degrees
-        # Simple mapping of scale degree (0-6) to MIDI note index
-        # This is tricky because self.scale_notes spans octaves.
-        # Let's get one octave of scale notes for degree mapping.
-        self.single_octave = get_scale_notes(key, scale_type, start_octave=3, end_octave=3)
-
-    def get_chord_notes(self, degree, octave_offset=0):
-        """Returns MIDI notes for a triad on the given scale degree (1-based)."""
-        # Degree 1 = index 0
-        root_idx = (degree - 1) % len(self.single_octave)
-        third_idx = (degree + 1) % len(self.single_octave) # +2 in diatonic
-        fifth_idx = (degree + 3) % len(self.single_octave) # +4 in diatonic
-
-        # We need to map these back to MIDI.
-        # If the index wrapped around, it means we went up an octave?
-        # Ideally we just pick from the large scale list.
-
-        # Better approach:
-        full_scale = get_scale_notes(self.key, self.scale_type, start_octave=3, end_octave=5)
-        # Find the root note in the full scale (first occurrence)
-        start_pos = 0
-        # If degree is 1, start_pos is 0. If degree is 2, start_pos is 1.
-        root_pos = (degree - 1)
-
-        chord_indices = [root_pos, root_pos + 2, root_pos + 4]
-        midi_notes = []
-        for idx in chord_indices:
-            if idx < len(full_scale):
-                midi_notes.append(full_scale[idx] + (octave_offset * 12))
-
-        return midi_notes
+        # Chord shape and voice leading come from the style preset unless given here
+        chords = load_style(style).params['chords']
+        self.chord_type = chord_type or chords['type']
+        self.voice_leading = chords['voice_leading'] if voice_leading is None else voice_leading
 
+    def get_chord_notes(self, degree, octave_offset=0, chord_type=None, inversion=0):
+        """Returns MIDI notes for a chord on the given scale degree (1-based), in root position by default."""
+        notes = chord_voicing(self.key, self.scale_type, degree, chord_type or self.chord_type, inversion)
+        return [n + (octave_offset * 12) for n in notes]
+
+    @timed('chords.generate_progression')
     def generate_progression(self, length_bars=4):
         """Generates a list of chords (list of notes) for each bar."""
-        # Common Minor/Trap Progressions (Degrees)
-        progressions = [
-            [1, 6, 7, 1], # i - VI - VII - i (Aeolian)
-            [1, 4, 5, 1], # i - iv - v - i
-            [1, 6, 3, 7], # i - VI - III - VII (Pop/Emotional)
-            [1, 2, 1, 5], # i - ii - i - v (Phrygian-ish if ii is flattened)
-        ]
+        return list(self.iter_progression(length_bars))
 
-        prog = random.choice(progressions)
+    def iter_progression(self, length_bars=4):
+        """Lazy generate_progression: yields one chord (list of notes) per bar."""
+        prog = self.rng.choice(PROGRESSIONS)
 
-        # Extend or truncate to length_bars
-        result = []
-        for i in range(length_bars):
-            degree = prog[i % len(prog)]
-            notes = self.get_chord_notes(degree)
-            result.append(notes)
+        # Extend or truncate to length_bars; voicings are shared table lookups
+        degrees = (prog[i % len(prog)] for i in range(length_bars))
+        for notes in iter_voicings(self.key, self.scale_type, degrees, self.chord_type, self.voice_leading):
+            yield list(notes)
 
-        return result
+    def iter_notes(self, length_bars=4, beats_per_bar=4, velocity=80):
+        """
+        Streams the progression as whole-bar chord note dicts in time order
+        (the lazy counterpart of progression_to_notes(generate_progression(...))).
+        """
+        for bar_idx, notes in enumerate(self.iter_progression(length_bars)):
+            for n in notes:
+                yield {'note': n, 'name': get_note_name(n), 'duration': float(beats_per_bar),
+                       'velocity': velocity, 'offset': float(bar_idx * beats_per_bar), 'channel': CHORD_CHANNEL}
+
+    def progression_to_notes(self, progression, beats_per_bar=4, velocity=80):
+        """Converts generate_progression output to a NoteBuffer of whole-bar chords."""
+        events = NoteBuffer()
+        ticks = beats_to_ticks(beats_per_bar, events.resolution)
+        for bar_idx, notes in enumerate(progression):
+            for n in notes:
+                events.append_ticks(n, bar_idx * ticks, ticks, velocity, CHORD_CHANNEL)
+        return events
 
 class DrumGenerator:
-    def __init__(self, tempo):
+    def __init__(self, tempo, seed=None, style=None, time_signature='4/4'):
         self.tempo = tempo
+        self.rng = random.Random(seed)
+        # Compiled hit-probability samplers (see src/styles.py)
+        self.style = load_style(style)
+        # Bars follow the meter: hats fill the bar, the snare lands on its backbeat
+        self.time_signature = parse_time_signature(time_signature)
+        self.bar_ticks = bar_ticks(*self.time_signature)
+
+    def generate_arrangement(self, length_bars=4, fill_every=None, variety=None):
+        """
+        Generates drums as a DrumArrangement: shared bar templates plus a template index per bar.
+        Hi-hat rolls and extra kicks are drawn for all bars at once; bars with the same hits
+        share one template.
+        fill_every: put a snare fill in every n-th bar (e.g. 8 ends each 8-bar section with a fill).
+        variety: draw only this many distinct bars and arrange them, for long repetitive tracks.
+        Both default to the style preset's values.
+        """
+        for _, arrangement in self._iter_arrangements(length_bars, fill_every, variety, length_bars):
+            return arrangement
+        return DrumArrangement([], [], bar_ticks=self.bar_ticks)
 
-    def generate_pattern(self, length_bars=4):
+    def _iter_arrangements(self, length_bars, fill_every, variety, block_bars):
+        """
+        Yields (first bar, DrumArrangement) for consecutive blocks of up to block_bars bars.
+        Each block has its own templates; only the variety pool is kept between blocks.
+        """
+        rng = np.random.default_rng(self.rng.getrandbits(64))
+        style = self.style
+        if fill_every is None:
+            fill_every = style.params['drums']['fill_every']
+        if variety is None:
+            variety = style.params['drums']['variety']
+        hat_step = 4.0 / len(style.hat_rolls.values[0])
+        num_kick_masks = len(style.kicks.values)
+
+        if variety:
+            pool_rolls = style.hat_rolls.sample_indices(variety, rng)
+            pool_kicks = style.kicks.sample_indices(variety, rng)
+
+        for first in range(0, length_bars, max(block_bars, 1)):
+            count = min(block_bars, length_bars - first)
+            # One vectorized draw per bar picks the whole roll mask / kick mask
+            if variety:
+                choice = rng.integers(0, variety, size=count)
+                rolls, kicks = pool_rolls[choice], pool_kicks[choice]
+            else:
+                rolls = style.hat_rolls.sample_indices(count, rng)
+                kicks = style.kicks.sample_indices(count, rng)
+
+            fills = np.zeros(count, dtype=np.int64)
+            if fill_every:
+                fills[(np.arange(first, first + count) + 1) % fill_every == 0] = 1
+
+            # Bars with identical masks (and fill flag) share one template
+            codes = (rolls * num_kick_masks + kicks) * 2 + fills
+            unique, bars = np.unique(codes, return_inverse=True)
+            layouts = []
+            for code in unique.tolist():
+                code, fill = divmod(code, 2)
+                roll_idx, kick_idx = divmod(code, num_kick_masks)
+                spots = tuple(s for s, hit in zip(style.kick_spots, style.kicks.values[kick_idx]) if hit)
+                layouts.append(bar_layout(hat_step, style.hat_rolls.values[roll_idx], spots, bool(fill),
+                                          time_signature=self.time_signature))
+            yield first, DrumArrangement(compile_templates(layouts, rng), bars, bar_ticks=self.bar_ticks)
+
+    @timed('drums.generate_pattern')
+    def generate_pattern(self, length_bars=4, fill_every=None, variety=None):
         """
         Generates drum events.
-        Returns list of {'note': int, 'duration': float, 'velocity': int, 'offset': float}
+        Returns a NoteBuffer (items read as {'note': int, 'duration': float, 'velocity': int, 'offset': float}), in time order.
+        See generate_arrangement for fill_every and variety.
         Using General MIDI:
         36 = Kick (C1)
         38 = Snare (D1) or 42 (Closed Hi-hat) -> Wait, Snare is 38 or 40. Clap is 39.
         42 = Closed Hi-hat
         """
-        events = []
-
-        for bar in range(length_bars):
-            bar_offset = bar * 4.0 # 4 beats per bar
-
-            # 1. Hi-Hats (8th notes)
-            for i in range(8):
-                # i * 0.5
-                beat = i * 0.5
-                # Random Rolls (32nd notes)
-                if random.random() < 0.15: # 15% chance of roll
-                    for r in range(4):
-                        events.append({
-                            'note': 42,
-                            'duration': 0.125,
-                            'velocity': random.randint(70, 90),
-                            'offset': bar_offset + beat + (r * 0.125)
-                        })
-                else:
-                    events.append({
-                        'note': 42,
-                        'duration': 0.5,
-                        'velocity': random.randint(80, 100),
-                        'offset': bar_offset + beat
-                    })
-
-            # 2. Snare / Clap (Beat 3)
-            # In Trap (140bpm), snare is on beat 3 of the 4/4 bar
-            events.append({
-                'note': 38, # Snare
-                'duration': 1.0,
-                'velocity': 127,
-                'offset': bar_offset + 2.0
-            })
-
-            # 3. Kick (Beat 1 + Syncopation)
-            kick_beats = [0.0]
-            # Add random kicks
-            possible_spots = [1.5, 2.5, 3.0, 3.5]
-            for spot in possible_spots:
-                if random.random() < 0.4:
-                    kick_beats.append(spot)
-
-            for kb in kick_beats:
-                 events.append({
-                    'note': 36,
-                    'duration': 0.5,
-                    'velocity': 120,
-                    'offset': bar_offset + kb
-                })
+        return self.generate_arrangement(length_bars, fill_every, variety).to_notes(DRUM_CHANNEL)
 
-        return events
+    def iter_pattern(self, length_bars=4, fill_every=None, variety=None, channel=DRUM_CHANNEL):
+        """
+        Lazy generate_pattern: yields drum note dicts in time order, drawing DRUM_BLOCK_BARS
+        bars at a time, so the first hit is ready at once and memory stays flat.
+        Block-wise draws consume the seed differently, so the hits differ from generate_pattern.
+        """
+        for first, arrangement in self._iter_arrangements(length_bars, fill_every, variety, DRUM_BLOCK_BARS):
+            shift = first * arrangement.beats_per_bar
+            for note in arrangement.to_notes(channel):
+                yield dict(note, offset=note['offset'] + shift)
@@ -0,0 +1,92 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.generator import derive_seed
+from src.music_theory import NOTES, SCALES
+from src.render import render_beat
+
+DEFAULT_TEMPOS = [130, 140, 150, 160]
+VARIATIONS = ['A', 'B', 'C']
+
+def build_jobs(count, keys=None, scales=None, tempos=None, variations=None, bars=4,
+               add_chords=True, add_drums=True, seed=0, compact=False, midi_format=1, style=None,
+               time_signature='4/4', candidates=1, beam_width=0, markov_model=None):
+    """
+    Lays out `count` render jobs over the key x scale x tempo x variation grid
+    (cycling through the grid if count is larger). Each job gets its own seed
+    derived from the base seed and its index, so a catalog is reproducible and
+    any single file can be re-rendered on its own. The remaining options apply to every job
+    (see render_beat).
+    """
+    grid = list(itertools.product(keys or NOTES, scales or list(SCALES), tempos or DEFAULT_TEMPOS,
+                                  variations or VARIATIONS))
+    jobs = []
+    for i in range(count):
+        key, scale, tempo, variation = grid[i % len(grid)]
+        jobs.append({
+            'index': i,
+            'key': key,
+            'scale': scale,
+            'tempo': tempo,
+            'bars': bars,
+            'variation': variation,
+            'add_chords': add_chords,
+            'add_drums': add_drums,
+            'seed': derive_seed(seed, f"job:{i}"),
+            'compact': compact,
+            'midi_format': midi_format,
+            'style': style,
+            'time_signature': time_signature,
+            'candidates': candidates,
+            'beam_width': beam_width,
+            'markov_model': markov_model,
+        })
+    return jobs
+
+def job_filename(job):
+    key = job['key'].replace('#', 's') # Filesystem friendly sharps
+    return f"{job['index']:05d}_{key}_{job['scale']}_{job['tempo']}bpm_var_{job['variation']}.mid"
+
+def render_job(job, output_dir):
+    """Renders one job to output_dir. Returns the number of bytes written."""
+    midi_bytes = render_beat(job['key'], job['scale'], job['tempo'], job['bars'], job['variation'],
+                             job['add_chords'], job['add_drums'], job['seed'],
+                             style=job['style'], time_signature=job['time_signature'], compact=job['compact'],
+                             midi_format=job['midi_format'], candidates=job['candidates'],
+                             beam_width=job['beam_width'], markov_model=job['markov_model'])
+    with open(os.path.join(output_dir, job_filename(job)), 'wb') as f:
+        f.write(midi_bytes)
+    return len(midi_bytes)
+
+def _render_chunk(jobs, output_dir):
+    # Workers write files themselves; only byte counts travel back to the parent
+    return sum(render_job(job, output_dir) for job in jobs)
+
+def render_catalog(jobs, output_dir, workers=None, chunk_size=None):
+    """
+    Renders all jobs into output_dir using a process pool (workers=1 runs in-process).
+    Returns throughput stats: {'files', 'bytes', 'seconds', 'files_per_sec', 'workers'}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    if workers == 1 or len(jobs) <= 1:
+        total_bytes = _render_chunk(jobs, output_dir)
+    else:
+        # A few chunks per worker keeps IPC overhead low while still balancing load
+        chunk_size = chunk_size or max(1, len(jobs) // (workers * 4))
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            total_bytes = sum(pool.map(_render_chunk, chunks, itertools.repeat(output_dir)))
+
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(jobs),
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'files_per_sec': len(jobs) / elapsed if elapsed > 0 else float('inf'),
+        'workers': workers,
+    }
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import socket
+import stat
+import sys
+
+# Warm daemon for the CLI: keeps the generator modules (and their caches) loaded and runs
+# `main.py` invocations sent over a UNIX socket, so scripts that call the CLI hundreds of
+# times pay for the interpreter, NumPy and the rhythm banks once.
+#
+#     python src/daemon.py &            # start (foreground process)
+#     python src/main.py --seed 1 ...   # forwarded automatically while it runs
+#     python src/daemon.py --stop
+#
+# Protocol: the client sends one JSON line {'argv': [...], 'cwd': str}; the daemon answers
+# with JSON lines {'stdout': str} / {'stderr': str} as the command prints, then {'exit': int}.
+# This module only imports the standard library at the top, so the client side stays cheap.
+
+def default_socket_path():
+    """
+    BEAT_DAEMON_SOCKET, or a socket in a private per-user directory (mode 0700) under
+    XDG_RUNTIME_DIR / the temp directory.
+    """
+    path = os.environ.get('BEAT_DAEMON_SOCKET')
+    if path:
+        return path
+    base = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(base, f"beat-daemon-{os.getuid()}", "daemon.sock")
+
+def _connect(path):
+    # Only talk to a daemon run by this user: in a shared directory anyone could create the
+    # socket first and receive our arguments
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def _private_directory(directory):
+    """Creates the default socket directory (0700), and refuses one that someone else controls."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{directory} must be a directory owned by this user with mode 0700")
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+def forward(argv, path=None):
+    """
+    Runs a CLI invocation (list of arguments) on the daemon, relaying its output as it comes.
+    Returns the exit code, or None if no daemon is listening (or BEAT_DAEMON=0), in which
+    case the caller runs the command itself.
+    """
+    if os.environ.get('BEAT_DAEMON') == '0':
+        return None
+    sock = _connect(path or default_socket_path())
+    if sock is None:
+        return None
+    with sock:
+        _send(sock, {'argv': list(argv), 'cwd': os.getcwd()})
+        with sock.makefile('r', encoding='utf-8') as replies:
+            for line in replies:
+                message = json.loads(line)
+                if 'exit' in message:
+                    return message['exit']
+                for name, stream in (('stdout', sys.stdout), ('stderr', sys.stderr)):
+                    if name in message:
+                        stream.write(message[name])
+                        stream.flush()
+    # Daemon went away mid-command
+    print("Beat daemon disconnected before finishing the command", file=sys.stderr)
+    return 1
+
+def stop(path=None):
+    """Asks a running daemon to exit. Returns False if none was listening."""
+    sock = _connect(path or default_socket_path())
+    if sock is None:
+        return False
+    with sock:
+        _send(sock, {'command': 'stop'})
+        sock.recv(1024)
+    return True
+
+class _Relay:
+    """File-like object that sends what is written to it to the client, a line at a time."""
+    def __init__(self, sock, name):
+        self.sock = sock
+        self.name = name
+        self.pending = []
+
+    def write(self, text):
+        self.pending.append(text)
+        if text.endswith('\n'):
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            _send(self.sock, {self.name: ''.join(self.pending)})
+            self.pending = []
+
+    def isatty(self):
+        return False
+
+def _warm_up():
+    """Imports the generator stack and fills the shared caches with one throwaway render."""
+    import src.catalog, src.song, src.playback # noqa: F401 (imported to keep them loaded)
+    from src.render import render_beat
+    for variation in 'ABC':
+        render_beat(variation=variation, seed=0)
+
+def _handle(conn, cli):
+    """Runs one request. Returns False when the daemon should stop."""
+    with conn.makefile('r', encoding='utf-8') as lines:
+        line = lines.readline()
+    if not line:
+        return True
+    request = json.loads(line)
+    if isinstance(request, dict) and request.get('command') == 'stop':
+        _send(conn, {'exit': 0})
+        return False
+    if not (isinstance(request, dict) and isinstance(request.get('argv'), list)
+            and all(isinstance(arg, str) for arg in request['argv'])
+            and isinstance(request.get('cwd', ''), (str, type(None)))):
+        _send(conn, {'stderr': "Bad request: expected {'argv': [str, ...], 'cwd': str}\n"})
+        _send(conn, {'exit': 2})
+        return True
+
+    stdout, stderr = sys.stdout, sys.stderr
+    relays = (_Relay(conn, 'stdout'), _Relay(conn, 'stderr'))
+    cwd = os.getcwd()
+    code = 0
+    try:
+        # Requests run one at a time, so the process-wide cwd and std streams are ours
+        os.chdir(request.get('cwd') or cwd)
+        sys.stdout, sys.stderr = relays
+        try:
+            cli.main(request['argv'], use_daemon=False)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        for relay in relays:
+            relay.flush()
+        _send(conn, {'exit': code})
+    except OSError:
+        pass # Client went away; nothing left to report to
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        os.chdir(cwd)
+    return True
+
+def serve(path=None):
+    """Runs the daemon in the foreground until stop() is called."""
+    if path is None:
+        path = default_socket_path()
+        if not os.environ.get('BEAT_DAEMON_SOCKET'):
+            _private_directory(os.path.dirname(path))
+    existing = _connect(path)
+    if existing is not None:
+        existing.close()
+        raise RuntimeError(f"A beat daemon is already listening on {path}")
+    if os.path.exists(path):
+        os.unlink(path) # Left over from a daemon that didn't shut down cleanly
+
+    from src import main as cli
+    _warm_up()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created 0600 from the start (chmod after bind would leave a window)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(16)
+    print(f"Beat daemon listening on {path}", file=sys.stderr)
+    try:
+        running = True
+        while running:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    running = _handle(conn, cli)
+                except (OSError, ValueError) as e:
+                    print(f"Bad request: {e}", file=sys.stderr)
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm daemon that serves src/main.py invocations")
+    parser.add_argument('--socket', type=str, default=None, help="Socket path (default: $BEAT_DAEMON_SOCKET or a per-user temp path)")
+    parser.add_argument('--stop', action='store_true', help="Stop the running daemon")
+    args = parser.parse_args()
+    if args.stop:
+        if not stop(args.socket):
+            print("No beat daemon running", file=sys.stderr)
+            sys.exit(1)
+        return
+    serve(args.socket)
+
+if __name__ == "__main__":
+    # Allow running directly from source directory
+    sys.path.append(os.getcwd())
+    main()
@@ -0,0 +1,199 @@
+import base64
+import hashlib
+import io
+import os
+import stat
+import tempfile
+import time
+import uuid
+import zipfile
+
+from src import profiling
+
+# Output modes of generate_beat besides inline base64. Large renders are written to a local
+# directory instead of travelling through the response:
+#   'file'   - the MIDI file; the response carries its path and a beat:// resource URI
+#   'zip'    - a deflated bundle of all three variations plus melody / chord / drum stems
+#   'chunks' - the MIDI file, read back in CHUNK_BYTES pieces with read_chunk()
+# Every response reports the file size and the server-side latency of the mode.
+DELIVERY_MODES = ('base64', 'file', 'zip', 'chunks')
+# BEAT_OUTPUT_DIR: where delivered files go (default: a private per-user directory, mode 0700,
+# in XDG_RUNTIME_DIR or the temp dir; nobody else can plant files that seeded requests reuse)
+DEFAULT_OUTPUT_DIR = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                                  f"beat-starter-{os.getuid()}")
+OUTPUT_DIR = os.environ.get('BEAT_OUTPUT_DIR') or DEFAULT_OUTPUT_DIR
+RESOURCE_PREFIX = 'beat://files/'
+CHUNK_BYTES = 256 * 1024 # Raw bytes per chunk (about 340KB once base64 encoded)
+VARIATIONS = ('A', 'B', 'C')
+# Delivered files are swept (at most every SWEEP_INTERVAL seconds, from deliver) once they are
+# MAX_AGE seconds past their last write or read, and oldest first while the directory holds
+# more than MAX_BYTES
+MAX_AGE = 60 * 60
+MAX_BYTES = 1024 * 1024 * 1024
+SWEEP_INTERVAL = 60
+_last_sweep = {} # directory -> time.monotonic() of its last sweep
+
+def file_name(params, suffix):
+    """
+    Name of the delivered file. Seeded requests always render the same bytes, so they get a name
+    derived from the request and a repeat is served from the existing file.
+    """
+    if params.get('seed') is None:
+        return f"beat-{uuid.uuid4().hex[:16]}{suffix}"
+    from src.styles import style_version
+    # The preset's file version too, so editing a preset doesn't serve files rendered with the old one
+    key = (sorted(params.items()), style_version(params.get('style')))
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return f"beat-{digest[:16]}{suffix}"
+
+def resolve(name, directory=None):
+    """Path of a delivered file. Only bare file names are accepted, never paths."""
+    if not name or os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError(f"Invalid beat file name: {name!r}")
+    path = os.path.join(directory or OUTPUT_DIR, name)
+    if not os.path.isfile(path):
+        raise ValueError(f"No such beat file: {name}")
+    return path
+
+def _prepare(directory):
+    """Creates the output directory (mode 0700). The default one must be this user's alone."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if os.path.abspath(directory) == os.path.abspath(DEFAULT_OUTPUT_DIR):
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise RuntimeError(f"{directory} must be a directory owned by this user with mode 0700")
+
+def sweep(directory=None, max_age=MAX_AGE, max_bytes=MAX_BYTES):
+    """
+    Deletes delivered files (and leftover partial writes) not written or read for max_age
+    seconds, then the least recently used ones while the rest exceed max_bytes.
+    Returns the number of files deleted.
+    """
+    directory = directory or OUTPUT_DIR
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('beat-') and entry.is_file(follow_symlinks=False):
+                    info = entry.stat(follow_symlinks=False)
+                    files.append((info.st_mtime, info.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+    files.sort()
+    cutoff = time.time() - max_age
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for mtime, size, path in files:
+        if mtime >= cutoff:
+            if total <= max_bytes:
+                break
+            if path.endswith('.tmp'):
+                continue # Being written right now
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+    return deleted
+
+def _maybe_sweep(directory):
+    now = time.monotonic()
+    if now - _last_sweep.get(directory, float('-inf')) >= SWEEP_INTERVAL:
+        _last_sweep[directory] = now
+        sweep(directory)
+
+def _touch(path):
+    # Reads count as use, so a file being fetched in chunks isn't swept
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _save(data, path):
+    # Write then rename, so a reader never sees a partial file
+    _prepare(os.path.dirname(path))
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def render_bundle(params):
+    """
+    Zip archive bytes with the full beat for every variation (beat_var_A.mid ...) and stems of its
+    parts (stems/melody_A.mid ..., stems/chords.mid, stems/drums.mid). params as in generate_beat;
+    'variation' is ignored.
+    """
+    from src.render_graph import RenderGraph
+    params = dict(params)
+    params.pop('variation', None)
+    add_chords, add_drums = params.pop('add_chords'), params.pop('add_drums')
+    # One graph: the chord and drum parts are generated and encoded once for all eight files
+    graph = RenderGraph(**params)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for variation in VARIATIONS:
+            bundle.writestr(f"beat_var_{variation}.mid", graph.to_midi((variation,), add_chords, add_drums))
+        for variation in VARIATIONS:
+            bundle.writestr(f"stems/melody_{variation}.mid", graph.to_midi((variation,), False, False))
+        if add_chords:
+            bundle.writestr("stems/chords.mid", graph.to_midi((), True, False))
+        if add_drums:
+            bundle.writestr("stems/drums.mid", graph.to_midi((), False, True))
+    return buffer.getvalue()
+
+def deliver(params, mode, directory=None):
+    """
+    Renders a beat (params as in generate_beat) and writes it to the output directory for the
+    'file', 'zip' and 'chunks' modes. Returns the response dict. Runs on a worker.
+    """
+    if mode not in DELIVERY_MODES or mode == 'base64':
+        raise ValueError(f"Unknown delivery mode: {mode} (expected one of {', '.join(DELIVERY_MODES[1:])})")
+    start = time.perf_counter()
+    with profiling.span(f"server.deliver.{mode}"):
+        name = file_name(params, '.zip' if mode == 'zip' else '.mid')
+        directory = directory or OUTPUT_DIR
+        _maybe_sweep(directory)
+        path = os.path.join(directory, name)
+        cached = params.get('seed') is not None and os.path.isfile(path)
+        if cached:
+            _touch(path)
+        else:
+            if mode == 'zip':
+                data = render_bundle(params)
+            else:
+                from src.render import render_beat
+                data = render_beat(**params)
+            _save(data, path)
+
+        size = os.path.getsize(path)
+        result = {'delivery': mode, 'name': name, 'path': path, 'uri': RESOURCE_PREFIX + name, 'bytes': size,
+                  'cached': cached}
+        if mode == 'zip':
+            with zipfile.ZipFile(path) as bundle:
+                result['files'] = bundle.namelist()
+        if mode == 'chunks':
+            result['chunk_bytes'] = CHUNK_BYTES
+            result['chunks'] = max(1, -(-size // CHUNK_BYTES))
+    result['ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+def read_chunk(name, index, directory=None):
+    """Chunk `index` of a delivered file as {'index', 'chunks', 'data' (base64)}."""
+    path = resolve(name, directory)
+    chunks = max(1, -(-os.path.getsize(path) // CHUNK_BYTES))
+    if not 0 <= index < chunks:
+        raise ValueError(f"Chunk index {index} out of range (file has {chunks} chunks)")
+    _touch(path)
+    with open(path, 'rb') as f:
+        f.seek(index * CHUNK_BYTES)
+        data = f.read(CHUNK_BYTES)
+    return {'index': index, 'chunks': chunks, 'data': base64.b64encode(data).decode('utf-8')}
+
+def read_file(name, directory=None):
+    """Raw bytes of a delivered file (served as the beat://files/{name} resource)."""
+    path = resolve(name, directory)
+    _touch(path)
+    with open(path, 'rb') as f:
+        return f.read()
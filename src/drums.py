@@ -0,0 +1,143 @@
+from functools import lru_cache
+import numpy as np
+
+from src.notes import NoteBuffer, DEFAULT_RESOLUTION
+from src.timeline import bar_ticks as meter_ticks, beat_unit_ticks
+
+# General MIDI percussion
+KICK = 36
+SNARE = 38
+CLOSED_HAT = 42
+
+BEATS_PER_BAR = 4
+FILL_VELOCITIES = (80, 95, 110, 127)
+
+def backbeat_tick(bar_ticks, unit_ticks):
+    """
+    Where the snare lands: half-way through the bar, on the meter's beat unit (beat 3 of 4/4,
+    the Trap half-time snare; the second dotted quarter of 6/8; beat 2 of 3/4).
+    """
+    return bar_ticks // 2 // unit_ticks * unit_ticks
+
+class DrumTemplate:
+    """
+    One bar of drums as compact arrays (ticks relative to the bar start), in time order.
+    Templates are immutable and shared by every bar of an arrangement that uses them.
+    """
+    __slots__ = ('start', 'duration', 'note', 'velocity')
+
+    def __init__(self, start, duration, note, velocity):
+        self.start = start
+        self.duration = duration
+        self.note = note
+        self.velocity = velocity
+
+    def __len__(self):
+        return len(self.start)
+
+@lru_cache(maxsize=16384)
+def bar_layout(hat_step, rolls, kick_spots, fill, resolution=DEFAULT_RESOLUTION, time_signature=(4, 4)):
+    """
+    Event layout of one bar for a hi-hat roll mask and the extra kick spots that hit,
+    as read-only arrays (start, duration, note, velocity_low, velocity_high), in time order.
+    The roll mask repeats (or is cut) to fill the bar of the time signature, and kick spots
+    past the bar line are dropped. With fill=True, hats and kicks on the last beat make way
+    for a snare run. Layouts are pure functions of the masks, so they are shared process-wide.
+    """
+    beat = resolution
+    bar = meter_ticks(*time_signature, resolution)
+    hat_ticks = int(round(hat_step * beat))
+    roll_ticks = max(hat_ticks // 4, 1) # A roll is four hits in one hat step (32nds for 8th hats)
+    fill_tick = max(bar - beat, 0) # Fills take the last quarter note
+    events = [] # (start, duration, note, velocity_low, velocity_high)
+
+    # 1. Hi-Hats, with rolls where the mask says so
+    for i in range(bar // hat_ticks):
+        tick = i * hat_ticks
+        if fill and tick >= fill_tick:
+            continue
+        if rolls[i % len(rolls)]:
+            events += [(tick + r * roll_ticks, roll_ticks, CLOSED_HAT, 70, 90) for r in range(4)]
+        else:
+            events.append((tick, hat_ticks, CLOSED_HAT, 80, 100))
+
+    # 2. Snare / Clap
+    events.append((backbeat_tick(bar, beat_unit_ticks(time_signature[1], resolution)), beat, SNARE, 127, 127))
+
+    # 3. Kick (Beat 1 + Syncopation)
+    for spot in (0.0,) + kick_spots:
+        tick = int(round(spot * beat))
+        if tick < bar and not (fill and tick >= fill_tick):
+            events.append((tick, beat // 2, KICK, 120, 120))
+
+    if fill:
+        # 16th-note snare run into the next bar
+        step = beat // 4
+        events += [(fill_tick + r * step, step, SNARE, vel, vel) for r, vel in enumerate(FILL_VELOCITIES)]
+
+    # Stable sort keeps hat / snare / kick order for hits on the same tick
+    events.sort(key=lambda e: e[0])
+    start, duration, note, low, high = np.array(events, dtype=np.int32).T
+    columns = (start.copy(), duration.copy(), note.astype(np.uint8), low.copy(), high.copy())
+    for col in columns:
+        col.flags.writeable = False
+    return columns
+
+def compile_templates(layouts, rng):
+    """
+    Instantiates bar layouts as DrumTemplates, drawing the humanized velocities
+    of all of them in one vectorized call on the NumPy rng.
+    """
+    if not layouts:
+        return []
+    low = np.concatenate([layout[3] for layout in layouts])
+    high = np.concatenate([layout[4] for layout in layouts])
+    velocity = rng.integers(low, high + 1).astype(np.uint8)
+    sizes = np.cumsum([len(layout[0]) for layout in layouts])
+    velocities = np.split(velocity, sizes[:-1])
+    return [DrumTemplate(start, duration, note, vel)
+            for (start, duration, note, _, _), vel in zip(layouts, velocities)]
+
+class DrumArrangement:
+    """
+    A drum track as shared bar templates plus one template index per bar.
+    Memory grows with the number of distinct bars, not the song length;
+    to_notes() expands it into a NoteBuffer with one vectorized gather.
+    """
+    def __init__(self, templates, bars, resolution=DEFAULT_RESOLUTION, bar_ticks=None):
+        self.templates = list(templates)
+        self.bars = np.asarray(bars, dtype=np.int64)
+        self.resolution = resolution
+        self.bar_ticks = bar_ticks or BEATS_PER_BAR * resolution
+
+    @property
+    def beats_per_bar(self):
+        return self.bar_ticks / self.resolution
+
+    def __len__(self):
+        return len(self.bars)
+
+    def event_count(self):
+        sizes = np.array([len(t) for t in self.templates], dtype=np.int64)
+        return int(sizes[self.bars].sum()) if len(self.bars) else 0
+
+    def to_notes(self, channel=9):
+        """Expands the arrangement into a time-ordered NoteBuffer."""
+        if not len(self.bars) or not self.templates:
+            return NoteBuffer(self.resolution)
+        # All template events back to back, plus where each template starts
+        sizes = np.array([len(t) for t in self.templates], dtype=np.int64)
+        first = np.cumsum(sizes) - sizes
+        start = np.concatenate([t.start for t in self.templates])
+        duration = np.concatenate([t.duration for t in self.templates])
+        note = np.concatenate([t.note for t in self.templates])
+        velocity = np.concatenate([t.velocity for t in self.templates])
+
+        counts = sizes[self.bars]
+        bar_first = np.cumsum(counts) - counts
+        within = np.arange(counts.sum()) - np.repeat(bar_first, counts)
+        events = np.repeat(first[self.bars], counts) + within
+        ticks = start[events] + np.repeat(np.arange(len(self.bars)) * self.bar_ticks, counts)
+
+        return NoteBuffer.from_columns(note[events], ticks, duration[events], velocity[events],
+                                       channel=channel, resolution=self.resolution)
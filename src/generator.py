@@ -1,27 +1,83 @@
 import random
-from src.music_theory import get_scale_notes, get_note_name, analyze_interval, is_stable_scale_degree
+import numpy as np
+from src.music_theory import get_scale_table, get_note_name, analyze_interval
+from src.notes import NoteBuffer, DEFAULT_RESOLUTION
+from src.timeline import beats_to_ticks, bar_ticks, parse_time_signature, quarter_beats
+from src.styles import load_style
+from src.profiling import timed
+
+# Named density ranges for generate_rhythm_pattern ('medium' keeps the style's own mix)
+DENSITY_RANGES = {
+    'low': (0.0, 0.3),
+    'medium': None,
+    'high': (0.5, 1.0),
+}
+
+def derive_seed(seed, stream):
+    """Derives an independent, reproducible seed for one generator from a master seed."""
+    if seed is None:
+        return None
+    return random.Random(f"{seed}:{stream}").getrandbits(64)
+
+class MelodyBatch:
+    """
+    Struct-of-arrays output of MelodyGenerator.generate_batch.
+    Every array is (n, max_len); row i holds length[i] events, and mask marks
+    the events that are sounding notes (False for rests and padding).
+    duration and offset are in beats.
+    """
+    def __init__(self, pitch, scale_index, duration, offset, velocity, mask, length):
+        self.pitch = pitch
+        self.scale_index = scale_index
+        self.duration = duration
+        self.offset = offset
+        self.velocity = velocity
+        self.mask = mask
+        self.length = length
+
+    def __len__(self):
+        return self.pitch.shape[0]
+
+    def melody(self, i, resolution=DEFAULT_RESOLUTION):
+        """Returns melody i in the generate_variation format (NoteBuffer)."""
+        sel = self.mask[i]
+        return NoteBuffer.from_columns(
+            self.pitch[i][sel],
+            (self.offset[i][sel] * resolution).astype(np.int64),
+            (self.duration[i][sel] * resolution).astype(np.int64),
+            self.velocity[i][sel],
+            resolution=resolution,
+        )
 
 class MelodyGenerator:
-    def __init__(self, key, scale_type, tempo, length_bars=4, time_signature='4/4', range_octaves=(3, 5)):
+    def __init__(self, key, scale_type, tempo, length_bars=4, time_signature='4/4', range_octaves=(3, 5), seed=None, style=None):
         self.key = key
         self.scale_type = scale_type
         self.tempo = tempo
         self.length_bars = length_bars
         self.time_signature = time_signature
         self.range_octaves = range_octaves
-
-        # Get valid notes for the scale
-        self.scale_notes = get_scale_notes(key, scale_type, range_octaves[0], range_octaves[1])
+        # Per-instance RNG so a seed reproduces the same output
+        self.rng = random.Random(seed)
+        # Compiled step/duration samplers, shared across instances using the same preset
+        self.style = load_style(style)
+
+        # Get valid notes for the scale (shared precomputed table, O(1) pitch -> index)
+        self.scale_table = get_scale_table(key, scale_type, range_octaves[0], range_octaves[1])
+        self.scale_notes = list(self.scale_table.notes)
+        self.scale_index = self.scale_table.index_map
         # Pre-calculate stable notes for performance
-        self.stable_notes = [n for n in self.scale_notes if is_stable_scale_degree(n, key, scale_type)]
+        self.stable_notes = list(self.scale_table.stable_notes)
 
         # Parsing time signature
         try:
-            num, den = map(int, time_signature.split('/'))
-        except:
+            num, den = parse_time_signature(time_signature)
+        except (ValueError, TypeError):
             num, den = 4, 4
-        self.beats_per_bar = num
         self.beat_unit = den # usually 4
+        # Bar length in beats (quarter notes: 6/8 is 3) and on the integer tick timeline
+        self.beats_per_bar = quarter_beats(num, den)
+        self.bar_ticks = bar_ticks(num, den, DEFAULT_RESOLUTION)
         self.total_beats = self.length_bars * self.beats_per_bar
 
     def generate_motif(self, length_in_notes=4):
@@ -31,9 +87,9 @@ class MelodyGenerator:
         start_index = len(self.scale_notes) // 2
         current_index = start_index
 
-        for _ in range(length_in_notes):
-            # Prefer small steps
-            step = random.choices([-2, -1, 0, 1, 2, 3, -3], weights=[1, 4, 2, 4, 1, 0.5, 0.5])[0]
+        # Prefer small steps
+        steps = self.style.motif.draw_many(length_in_notes, self.rng)
+        for step in steps:
             current_index = max(0, min(len(self.scale_notes) - 1, current_index + step))
             motif.append(self.scale_notes[current_index])
 
@@ -43,98 +99,141 @@ class MelodyGenerator:
         """
         Generates a rhythm pattern (list of durations in beats).
         E.g., [0.5, 0.5, 1.0, ...]
+        density: 'low', 'medium' (the style's natural mix), 'high', or a (min, max) range of
+        notes per grid slot.
         """
+        return [t / DEFAULT_RESOLUTION for t in self.generate_rhythm_ticks(num_beats, density, style)]
+
+    def generate_rhythm_ticks(self, num_beats, density='medium', style='trap'):
+        """generate_rhythm_pattern in ticks: durations that add up to exactly num_beats."""
+        # Whole bars come from the precomputed rhythm bank: one weighted lookup
+        bank = self.get_rhythm_bank(style, num_beats)
+        if bank is not None:
+            bounds = DENSITY_RANGES.get(density) if isinstance(density, str) else density
+            if bounds is not None:
+                bank = bank.query(density=bounds)
+            return bank.sample_ticks(self.rng, DEFAULT_RESOLUTION)
+
+        # Off-grid lengths (or meters too long to enumerate): draw note by note
         pattern = []
-        beats_filled = 0.0
-
-        # Basic durations
-        durations = [0.25, 0.5, 0.75, 1.0] # 16th, 8th, dotted 8th, quarter
-        weights = [10, 40, 10, 40]
+        total = beats_to_ticks(num_beats)
+        filled = 0
+        min_ticks = DEFAULT_RESOLUTION // 4
 
-        if style == 'trap':
-            # Add triplet feel
-            # 1/3 beat (triplet 8th) = 0.333... hard to represent in float beats nicely without grid
-            # Let's stick to 16th grid for simplicity but emphasize syncopation
-            durations = [0.25, 0.5, 1.0, 1.5]
-            weights = [30, 30, 30, 10]
+        # Duration table for the rhythm style (see src/styles.py); unknown styles use 'default'
+        draw = self.style.rhythm_sampler(style).draw
+        rng = self.rng
 
-        while beats_filled < num_beats:
-            dur = random.choices(durations, weights=weights)[0]
+        while filled < total:
+            dur = beats_to_ticks(draw(rng))
             # check if it fits
-            if beats_filled + dur > num_beats:
-                dur = num_beats - beats_filled
+            if filled + dur > total:
+                dur = total - filled
 
             # Avoid tiny remainders
-            if dur < 0.25:
-                dur = num_beats - beats_filled # take the rest
+            if dur < min_ticks:
+                dur = total - filled # take the rest
 
             pattern.append(dur)
-            beats_filled += dur
+            filled += dur
 
         return pattern
 
+    def get_rhythm_bank(self, style='trap', num_beats=None):
+        """The shared RhythmBank for a rhythm style and bar length, or None if it can't be indexed exactly."""
+        try:
+            bank = self.style.rhythm_bank(style, num_beats or self.beats_per_bar)
+        except ValueError:
+            return None
+        return bank if bank is not None and bank.exact else None
+
     def generate_phrase_structure(self, total_bars):
         """Generates a list of rhythm patterns for full length based on structure."""
-        bar_rhythm_A = self.generate_rhythm_pattern(self.beats_per_bar, style='trap')
-        bar_rhythm_B = self.generate_rhythm_pattern(self.beats_per_bar, style='trap')
-
         full_rhythm = []
-        # Common structure: A A B A or A B A C
-        structure_type = random.choice(['AABA', 'ABAB'])
+        for bar in self.iter_phrase_structure(total_bars):
+            full_rhythm.extend(bar)
+        return full_rhythm
 
-        for char in structure_type:
-            if char == 'A':
-                full_rhythm.extend(bar_rhythm_A)
-            elif char == 'B':
-                full_rhythm.extend(bar_rhythm_B)
-            else:
-                 full_rhythm.extend(self.generate_rhythm_pattern(self.beats_per_bar, style='trap'))
+    def iter_phrase_structure(self, total_bars):
+        """
+        Lazy generate_phrase_structure: yields one bar rhythm (list of durations) at a time.
+        The A and B bars and the structure are drawn on the first next(), so the state
+        is two bars however long the phrase is.
+        """
+        for bar in self._iter_bar_ticks(total_bars):
+            yield [t / DEFAULT_RESOLUTION for t in bar]
+
+    def _iter_bar_ticks(self, total_bars):
+        # iter_phrase_structure with durations in ticks
+        bar_rhythm_A = self.generate_rhythm_ticks(self.beats_per_bar, style='trap')
+        bar_rhythm_B = self.generate_rhythm_ticks(self.beats_per_bar, style='trap')
+
+        # Common structure: A A B A or A B A C
+        structure_type = self.rng.choice(['AABA', 'ABAB'])
 
         # Adjust for total bars if not 4
         if total_bars != 4:
             # Fallback simple repeat
-            full_rhythm = []
             for _ in range(total_bars):
-                full_rhythm.extend(bar_rhythm_A)
+                yield bar_rhythm_A
+            return
 
-        return full_rhythm
+        for char in structure_type:
+            if char == 'A':
+                yield bar_rhythm_A
+            elif char == 'B':
+                yield bar_rhythm_B
+            else:
+                yield self.generate_rhythm_ticks(self.beats_per_bar, style='trap')
 
     def apply_voice_leading(self, current_note, target_note=None, variation='A'):
         """
         Selects the next note based on voice leading rules.
         """
         # Find index of current note
-        try:
-            curr_idx = self.scale_notes.index(current_note)
-        except ValueError:
+        curr_idx = self.scale_index.get(current_note)
+        if curr_idx is None:
             curr_idx = len(self.scale_notes) // 2
 
-        if variation == 'A': # Smooth
-            # Stepwise motion preferred
-            steps = [-1, 1, 0]
-            weights = [4, 4, 1]
-        elif variation == 'B': # Aggressive/Trap
-            # More leaps, repeated notes
-            steps = [-2, 2, 0, -3, 3, 7, -7] # 7 is a fifth in diatonic scale roughly
-            weights = [2, 2, 3, 1, 1, 0.5, 0.5]
-        else: # C - Balanced/Motivic
-            steps = [-1, 1, -2, 2, 0]
-            weights = [3, 3, 1, 1, 1]
-
-        step = random.choices(steps, weights=weights)[0]
+        # A: stepwise motion preferred. B: more leaps, repeated notes.
+        # Anything else: C - Balanced/Motivic
+        step = self.style.step_sampler(variation).draw(self.rng)
         next_idx = max(0, min(len(self.scale_notes) - 1, curr_idx + step))
         return self.scale_notes[next_idx]
 
+    @timed('melody.generate_variation')
     def generate_variation(self, variation_type='A'):
         """
         Generates a full melody based on the variation type.
-        Returns a list of dicts: {'note': midi, 'name': str, 'duration': float, 'velocity': int, 'offset': float}
+        Returns a NoteBuffer; each item reads as {'note': midi, 'name': str, 'duration': float, 'velocity': int, 'offset': float}
         """
-        melody = []
+        melody = NoteBuffer()
+        for note, start, dur, velocity in self._iter_notes(variation_type):
+            melody.append_ticks(note, start, dur, velocity)
+        return melody
 
+    def iter_variation(self, variation_type='A', channel=0):
+        """
+        Lazy generate_variation: yields note dicts {'note', 'name', 'duration', 'velocity',
+        'offset', 'channel'} in time order as they are generated (same seed, same notes).
+        The first note costs the same for any length_bars and memory stays flat, so the
+        output can go straight into StreamingMidiWriter or through src/transforms.py.
+        """
+        res = DEFAULT_RESOLUTION
+        for note, start, dur, velocity in self._iter_notes(variation_type):
+            yield {'note': note, 'name': get_note_name(note), 'duration': dur / res,
+                   'velocity': velocity, 'offset': start / res, 'channel': channel}
+
+    def _iter_notes(self, variation_type):
+        """
+        Yields (note, start, duration, velocity) for generate_variation and iter_variation,
+        times in ticks (DEFAULT_RESOLUTION per beat).
+        """
         # 1. Determine Rhythm
-        # Use structured phrasing for better musicality
-        full_rhythm = self.generate_phrase_structure(self.length_bars)
+        # Use structured phrasing for better musicality, one bar at a time
+        durations = (dur for bar in self._iter_bar_ticks(self.length_bars) for dur in bar)
+        # One duration of lookahead tells us when the final note is coming
+        upcoming = next(durations, None)
 
         # 2. Generate Notes
         current_note = self.scale_notes[len(self.scale_notes) // 2] # Start mid-range
@@ -145,15 +244,17 @@ class MelodyGenerator:
             motif = self.generate_motif(4)
             motif_idx = 0
 
-        time_cursor = 0.0
-        total_duration = sum(full_rhythm)
-        current_beat = 0.0
+        # Integer ticks: phrase and bar boundaries are exact, triplets included
+        time_cursor = 0
+        phrase_ticks = self.bar_ticks * 4
 
-        for i, dur in enumerate(full_rhythm):
-            velocity = random.randint(80, 110)
+        while upcoming is not None:
+            dur = upcoming
+            upcoming = next(durations, None)
+            velocity = self.rng.randint(80, 110)
 
             # End of phrase resolution detection
-            is_end_of_phrase = (i == len(full_rhythm) - 1) or (current_beat + dur) % (self.beats_per_bar * 4) == 0
+            is_end_of_phrase = upcoming is None or (time_cursor + dur) % phrase_ticks == 0
 
             # Note Selection
             if variation_type == 'C' and motif:
@@ -162,14 +263,12 @@ class MelodyGenerator:
                 motif_idx += 1
 
                 # Transpose motif every 2 bars?
-                if int(current_beat / (self.beats_per_bar * 2)) % 2 == 1:
+                if time_cursor // (self.bar_ticks * 2) % 2 == 1:
                      # Simple diatonic transposition (shift index in scale)
-                     try:
-                         orig_idx = self.scale_notes.index(note)
+                     orig_idx = self.scale_index.get(note)
+                     if orig_idx is not None:
                          new_idx = min(len(self.scale_notes)-1, orig_idx + 2) # Shift up a third
                          note = self.scale_notes[new_idx]
-                     except:
-                         pass
 
             else:
                 note = self.apply_voice_leading(current_note, variation=variation_type)
@@ -188,27 +287,130 @@ class MelodyGenerator:
 
             # Rest logic (Trap leaves space)
             is_rest = False
-            if variation_type == 'B' and random.random() < 0.2 and not is_end_of_phrase:
+            if variation_type == 'B' and self.rng.random() < 0.2 and not is_end_of_phrase:
                  is_rest = True
 
             if not is_rest:
                 # Humanize
                 if variation_type == 'B': # Trap - rigid timing or triplets, high velocity variation
-                     velocity = random.choice([100, 110, 120, 60]) # Accent patterns
-
-                melody.append({
-                    'note': note,
-                    'name': get_note_name(note),
-                    'duration': dur,
-                    'velocity': velocity,
-                    'offset': time_cursor
-                })
+                     velocity = self.rng.choice([100, 110, 120, 60]) # Accent patterns
+
+                yield note, time_cursor, dur, velocity
                 current_note = note
 
             time_cursor += dur
-            current_beat += dur
 
-        return melody
+    @timed('melody.generate_batch')
+    def generate_batch(self, n, variation_type='A', seed=None):
+        """
+        Generates n melodies at once with NumPy, following the same rules as generate_variation.
+        Returns a MelodyBatch (struct-of-arrays, one row per melody).
+        Without a seed, the batch is drawn from the generator's own RNG.
+        """
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        rng = np.random.default_rng(seed)
+        num_scale = len(self.scale_notes)
+        sixteenths_per_bar = int(self.beats_per_bar * 4)
+
+        # 1. Rhythm: two candidate bars per melody (trap durations, in 16ths)
+        bar_durs = self._batch_bar_rhythms(rng, n, sixteenths_per_bar) # (n, 2, 16ths)
+        if self.length_bars == 4:
+            # AABA or ABAB per melody
+            structures = np.array([[0, 0, 1, 0], [0, 1, 0, 1]])
+            bar_choice = structures[rng.integers(0, 2, size=n)]
+        else:
+            bar_choice = np.zeros((n, self.length_bars), dtype=np.int64)
+        bars = np.take_along_axis(bar_durs, bar_choice[:, :, None], axis=1).reshape(n, -1)
+
+        # Compact each row so real notes come first (zeros are padding)
+        present = bars > 0
+        order = np.argsort(~present, axis=1, kind='stable')
+        durs = np.take_along_axis(bars, order, axis=1)
+        lengths = present.sum(axis=1)
+        max_len = int(lengths.max()) if n else 0
+        durs = durs[:, :max_len]
+        valid = np.arange(max_len)[None, :] < lengths[:, None]
+        ends = np.cumsum(durs, axis=1)
+        starts = ends - durs
+
+        # End of phrase: last note, or a note ending on a 4-bar boundary
+        is_end = (ends % (sixteenths_per_bar * 4) == 0) | (np.arange(max_len)[None, :] == lengths[:, None] - 1)
+        is_end &= valid
+
+        # 2. Notes, as indices into self.scale_notes
+        snap = self._stable_snap_indices()
+        mid = num_scale // 2
+        rest = np.zeros((n, max_len), dtype=bool)
+        if variation_type == 'C':
+            motif_steps = self.style.motif.sample((n, 4), rng)
+            motif = np.empty((n, 4), dtype=np.int64)
+            cur = np.full(n, mid)
+            for j in range(4):
+                cur = np.clip(cur + motif_steps[:, j], 0, num_scale - 1)
+                motif[:, j] = cur
+            idx = motif[:, np.arange(max_len) % 4]
+            # Transpose up a third on every other 2-bar block
+            shifted = (starts // (sixteenths_per_bar * 2)) % 2 == 1
+            idx = np.where(shifted, np.minimum(idx + 2, num_scale - 1), idx)
+            idx = np.where(is_end, snap[idx], idx)
+        else:
+            step_draws = self.style.step_sampler(variation_type).sample((n, max_len), rng)
+            if variation_type == 'B':
+                rest = (rng.random((n, max_len)) < 0.2) & ~is_end
+            # Clipped walk: one vectorized step per note position across all melodies
+            idx = np.empty((n, max_len), dtype=np.int64)
+            cur = np.full(n, mid)
+            for t in range(max_len):
+                nxt = np.clip(cur + step_draws[:, t], 0, num_scale - 1)
+                nxt = np.where(is_end[:, t], snap[nxt], nxt)
+                idx[:, t] = nxt
+                # A rest keeps the previous note as the voice-leading anchor
+                cur = np.where(rest[:, t], cur, nxt)
+
+        # 3. Velocity (Trap uses accent patterns)
+        if variation_type == 'B':
+            velocity = rng.choice(np.array([100, 110, 120, 60]), size=(n, max_len))
+        else:
+            velocity = rng.integers(80, 111, size=(n, max_len))
+
+        pitch = np.asarray(self.scale_notes, dtype=np.int64)[idx] if num_scale else idx
+        return MelodyBatch(
+            pitch=pitch,
+            scale_index=idx,
+            duration=durs / 4.0,
+            offset=starts / 4.0,
+            velocity=velocity,
+            mask=valid & ~rest,
+            length=lengths,
+        )
+
+    def _batch_bar_rhythms(self, rng, n, sixteenths_per_bar):
+        """Vectorized generate_rhythm_pattern(style='trap'): (n, 2, sixteenths_per_bar) durations in 16ths, 0-padded."""
+        bank = self.get_rhythm_bank('trap', self.beats_per_bar)
+        if bank is not None and bank.units_per_beat == 4:
+            # Two bank lookups per melody
+            return bank.durations[bank.sample_indices((n, 2), rng)].astype(np.int64)
+
+        sampler = self.style.rhythm_sampler('trap')
+        durations_16ths = np.rint(np.asarray(sampler.values) * 4).astype(np.int64)
+        if np.any(durations_16ths <= 0) or not np.allclose(durations_16ths, np.asarray(sampler.values) * 4):
+            raise ValueError("generate_batch needs rhythm durations on the 16th-note grid")
+        draws = durations_16ths[sampler.sample_indices((n, 2, sixteenths_per_bar), rng)]
+        ends = np.cumsum(draws, axis=2)
+        starts = ends - draws
+        # Keep draws that start inside the bar; the last one is cut to fit
+        return np.where(starts < sixteenths_per_bar, np.minimum(ends, sixteenths_per_bar) - starts, 0)
+
+    def _stable_snap_indices(self):
+        """For each scale index, the index of the nearest stable note (lower one on ties)."""
+        snap = np.arange(len(self.scale_notes))
+        if self.stable_notes:
+            notes = np.asarray(self.scale_notes)
+            stable = np.asarray(self.stable_notes)
+            nearest = np.argmin(np.abs(notes[:, None] - stable[None, :]), axis=1)
+            snap = np.array([self.scale_index[n] for n in stable[nearest].tolist()], dtype=np.int64)
+        return snap
 
     def get_theory_explanation(self, variation_type):
         if variation_type == 'A':
@@ -5,9 +5,10 @@ import os
 # Allow running directly from source directory
 sys.path.append(os.getcwd())
 
-from src.generator import MelodyGenerator
-from src.midi_utils import MidiWriter
-from src.accompaniment import ChordGenerator, DrumGenerator
+from src.timeline import parse_time_signature
+
+# The generator stack (NumPy and friends) is imported inside the run_* functions, so a call
+# that is handed to a running daemon (src/daemon.py) never pays for it.
 
 def print_melody_table(melody):
     print(f"{'Note':<6} | {'Name':<6} | {'Duration (Beats)':<16} | {'Velocity':<8} | {'Offset':<8}")
@@ -16,18 +17,182 @@ def print_melody_table(melody):
         print(f"{note['note']:<6} | {note['name']:<6} | {note['duration']:<16.2f} | {note['velocity']:<8} | {note['offset']:<8.2f}")
     print("-" * 60)
 
-def main():
+def parse_list(value, cast=str):
+    return [cast(v.strip()) for v in value.split(',') if v.strip()] if value else None
+
+def save_midi(graph, filename, variations, add_chords, add_drums):
+    """Writes the given variations (one melody track each) with the shared chords / drums."""
+    try:
+        graph.write_file(filename, variations, add_chords, add_drums)
+        if add_chords:
+            print("   + Added Chords Track")
+        if add_drums:
+            print("   + Added Drums Track")
+        print(f"-> Saved Multi-track MIDI file: {filename}")
+    except Exception as e:
+        print(f"Error saving MIDI: {e}")
+
+def run_catalog(args):
+    """Batch mode: renders --count beats across the key x scale x tempo grid into --outdir."""
+    from src.catalog import build_jobs, render_catalog, DEFAULT_TEMPOS
+    jobs = build_jobs(
+        args.count,
+        keys=parse_list(args.keys),
+        scales=parse_list(args.scales),
+        tempos=parse_list(args.tempos, int) or DEFAULT_TEMPOS,
+        bars=args.bars,
+        add_chords=args.chords,
+        add_drums=args.drums,
+        seed=args.seed if args.seed is not None else 0,
+        compact=args.compact,
+        midi_format=args.midi_format,
+        style=args.style,
+        time_signature=args.time_signature,
+        candidates=args.candidates,
+        beam_width=args.beam,
+        # Absolute, so process workers find it whatever their directory
+        markov_model=os.path.abspath(args.markov_model) if args.markov_model else None,
+    )
+    print(f"Rendering {len(jobs)} beats to {args.outdir} with {args.jobs or os.cpu_count()} worker(s)...")
+    stats = render_catalog(jobs, args.outdir, workers=args.jobs)
+    print(f"-> {stats['files']} files, {stats['bytes'] / 1024:.1f} KB in {stats['seconds']:.2f}s "
+          f"({stats['files_per_sec']:.1f} beats/sec)")
+
+def run_song(args):
+    """Song mode: renders a full arrangement (intro/verse/hook/...) to <output>_song.mid."""
+    from src.song import Song, DEFAULT_FORM
+    song = Song(args.key, args.scale, args.tempo, form=parse_list(args.song) or DEFAULT_FORM,
+                seed=args.seed, style=args.style, time_signature=args.time_signature)
+    filename = f"{args.output or 'song'}_song.mid"
+    with open(filename, 'wb') as f:
+        song.write_to_stream(f)
+    print(f"-> Saved {song.total_bars}-bar song ({' / '.join(song.form)}): {filename}")
+
+def run_play(args):
+    """Playback mode: streams the beat (Variation B, plus --chords / --drums) to a live MIDI sink."""
+    from src.generator import MelodyGenerator, derive_seed
+    from src.accompaniment import ChordGenerator, DrumGenerator, CHORD_CHANNEL, DRUM_CHANNEL
+    from src.playback import play_to
+    generator = MelodyGenerator(args.key, args.scale, args.tempo, length_bars=args.bars,
+                                time_signature=args.time_signature, seed=derive_seed(args.seed, 'melody:B'), style=args.style)
+    tracks = [(generator.iter_variation('B'), 0)]
+    if args.chords:
+        chord_gen = ChordGenerator(args.key, args.scale, seed=derive_seed(args.seed, 'chords'), style=args.style)
+        tracks.append((chord_gen.iter_notes(args.bars, generator.beats_per_bar), CHORD_CHANNEL))
+    if args.drums:
+        drum_gen = DrumGenerator(args.tempo, seed=derive_seed(args.seed, 'drums'), style=args.style,
+                                 time_signature=args.time_signature)
+        tracks.append((drum_gen.iter_pattern(args.bars), DRUM_CHANNEL))
+
+    # Reports go to stderr: stdout may be the sink
+    print(f"Playing {args.bars} bars at {generator.tempo} BPM to {args.play} (Ctrl+C stops)...", file=sys.stderr)
+    try:
+        stats = play_to(args.play, tracks, generator.tempo)
+    except KeyboardInterrupt:
+        print("-> Stopped", file=sys.stderr)
+        return
+    jitter = stats['jitter_ms']
+    print(f"-> {stats['messages']} messages in {stats['seconds']:.2f}s, jitter p50 {jitter['p50']:.2f} ms, "
+          f"p99 {jitter['p99']:.2f} ms, max {jitter['max']:.2f} ms", file=sys.stderr)
+
+def main(argv=None, use_daemon=True):
     parser = argparse.ArgumentParser(description="Hip-Hop/Trap MIDI Melody Generator")
     parser.add_argument('--key', type=str, default='C', help="Key (e.g., C, F#)")
     parser.add_argument('--scale', type=str, default='minor', help="Scale type (minor, harmonic_minor, phrygian, pentatonic_minor)")
     parser.add_argument('--tempo', type=int, default=140, help="Tempo in BPM")
     parser.add_argument('--bars', type=int, default=4, help="Length in bars")
+    parser.add_argument('--time-signature', type=str, default='4/4', help="Meter, e.g. 4/4, 3/4 or 6/8")
     parser.add_argument('--output', type=str, default=None, help="Base filename for MIDI export (e.g., 'melody')")
     parser.add_argument('--chords', action='store_true', help="Include chord progression in output")
     parser.add_argument('--drums', action='store_true', help="Include drum pattern in output")
+    parser.add_argument('--single-file', action='store_true',
+                        help="Write all three variations as tracks of one MIDI file (<output>_all.mid)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Size-optimized MIDI (running status, zero-velocity note offs)")
+    parser.add_argument('--midi-format', type=int, choices=[0, 1], default=1,
+                        help="1: a track per part (default); 0: all parts merged into one track")
+    parser.add_argument('--candidates', type=int, default=1,
+                        help="Draw this many melodies per variation and keep the best scoring one")
+    parser.add_argument('--beam', type=int, default=0,
+                        help="With --candidates, refine the melody bar by bar with this many beams")
+    parser.add_argument('--markov-model', type=str, default=None,
+                        help="Draw the melodies from a trained Markov model (.npz from src/markov.py)")
     parser.add_argument('--interactive', action='store_true', help="Run in interactive mode")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible output")
+    parser.add_argument('--style', type=str, default=None, help="Style preset name or .json file (rhythm, step and drum probabilities)")
+    parser.add_argument('--song', nargs='?', const='', default=None,
+                        help="Render a full song; optionally a comma-separated form (e.g. intro,verse,hook,verse,hook,outro)")
+    parser.add_argument('--play', type=str, default=None,
+                        help="Play the beat in real time as raw MIDI to stdout, tcp:HOST:PORT, unix:PATH or a FIFO path")
+    # Batch (catalog) mode
+    parser.add_argument('--count', type=int, default=None, help="Batch mode: render this many beats across the key/scale/tempo grid")
+    parser.add_argument('--jobs', type=int, default=None, help="Batch mode: worker processes (default: all cores)")
+    parser.add_argument('--outdir', type=str, default='catalog', help="Batch mode: output directory")
+    parser.add_argument('--keys', type=str, default=None, help="Batch mode: comma-separated keys (default: all 12)")
+    parser.add_argument('--scales', type=str, default=None, help="Batch mode: comma-separated scales (default: all)")
+    parser.add_argument('--tempos', type=str, default=None, help="Batch mode: comma-separated tempos (default: 130,140,150,160)")
+
+    parser.add_argument('--profile', action='store_true', help="Print per-stage timings (p50/p95/p99) to stderr when done")
+    parser.add_argument('--profile-memory', action='store_true', help="Like --profile, plus tracemalloc allocation sizes (slower)")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    try:
+        parse_time_signature(args.time_signature)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.candidates < 1 or args.beam < 0:
+        parser.error("--candidates must be at least 1 and --beam at least 0")
+    # Song and playback modes draw plain melodies and write plain tracks; refuse what they would ignore
+    mode = '--song' if args.song is not None else '--play' if args.play else None
+    if mode:
+        unsupported = [flag for flag, used in (('--candidates', args.candidates > 1), ('--beam', args.beam > 0),
+                                               ('--markov-model', args.markov_model),
+                                               ('--compact', args.compact and mode == '--song'),
+                                               ('--midi-format 0', args.midi_format == 0 and mode == '--song')) if used]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} can't be used with {mode}")
+    if args.single_file and args.midi_format == 0:
+        parser.error("--single-file needs --midi-format 1 (the variations would share one channel)")
+
+    # Hand the call to the warm daemon if one is running. Interactive input and
+    # real-time playback stay in this process.
+    if use_daemon and not (args.interactive or args.play):
+        from src.daemon import forward
+        code = forward(sys.argv[1:] if argv is None else argv)
+        if code is not None:
+            if code:
+                sys.exit(code)
+            return
+
+    if not (args.profile or args.profile_memory):
+        run(args)
+        return
+    from src import profiling
+    profiling.reset()
+    profiling.enable(memory=args.profile_memory)
+    try:
+        run(args)
+    finally:
+        profiling.disable()
+        print("\n=== Profile ===", file=sys.stderr)
+        print(profiling.format_stats(), file=sys.stderr)
+        profiling.reset()
+
+def run(args):
+    from src.generator import MelodyGenerator
+    from src.render_graph import RenderGraph
+
+    if args.count is not None:
+        run_catalog(args)
+        return
+
+    if args.song is not None:
+        run_song(args)
+        return
+
+    if args.play is not None:
+        run_play(args)
+        return
 
     key = args.key
     scale = args.scale
@@ -36,6 +201,7 @@ def main():
     output_base = args.output
     add_chords = args.chords
     add_drums = args.drums
+    seed = args.seed
 
     if args.interactive:
         print("=== MIDI Melody Composer Assistant ===")
@@ -56,12 +222,24 @@ def main():
 
     print(f"\nGenerating Beat Starter for: Key={key} {scale}, Tempo={tempo} BPM, Length={bars} Bars")
 
+    # Checks the key / scale and provides the theory notes; the notes come from the graph below
     try:
-        generator = MelodyGenerator(key, scale, tempo, length_bars=bars)
+        if args.markov_model:
+            from src.markov import MarkovMelodyGenerator
+            generator = MarkovMelodyGenerator(args.markov_model, key, scale, tempo, length_bars=bars,
+                                              time_signature=args.time_signature)
+        else:
+            generator = MelodyGenerator(key, scale, tempo, length_bars=bars, time_signature=args.time_signature,
+                                        style=args.style)
     except Exception as e:
         print(f"Error initializing generator: {e}")
         return
 
+    # Every stage (melodies, chords, drums and their encoded tracks) is built once and shared,
+    # so all variations play over the same accompaniment
+    graph = RenderGraph(key, scale, tempo, bars, seed=seed, style=args.style, time_signature=args.time_signature,
+                        compact=args.compact, midi_format=args.midi_format,
+                        candidates=args.candidates, beam_width=args.beam, markov_model=args.markov_model)
     variations = ['A', 'B', 'C']
 
     for var in variations:
@@ -69,44 +247,14 @@ def main():
         explanation = generator.get_theory_explanation(var)
         print(explanation)
         print("\nMIDI Output:")
-        melody = generator.generate_variation(var)
+        melody = graph.melody(var)
         print_melody_table(melody)
 
-        if output_base:
-            filename = f"{output_base}_var_{var}.mid"
-            try:
-                writer = MidiWriter()
-                # 1. Melody Track (Channel 0)
-                writer.add_track(melody, track_name=f"Melody Var {var}", channel=0)
-
-                # 2. Chords Track (Channel 1)
-                if add_chords:
-                    chord_gen = ChordGenerator(key, scale)
-                    progression_notes = chord_gen.generate_progression(bars)
-                    # Convert to event list
-                    chord_events = []
-                    for bar_idx, notes in enumerate(progression_notes):
-                        for n in notes:
-                            chord_events.append({
-                                'note': n,
-                                'duration': 4.0, # Whole note chords
-                                'velocity': 80,
-                                'offset': bar_idx * 4.0
-                            })
-                    writer.add_track(chord_events, track_name="Chords", channel=1)
-                    print("   + Added Chords Track")
-
-                # 3. Drums Track (Channel 9)
-                if add_drums:
-                    drum_gen = DrumGenerator(tempo)
-                    drum_events = drum_gen.generate_pattern(bars)
-                    writer.add_track(drum_events, track_name="Drums", channel=9)
-                    print("   + Added Drums Track")
-
-                writer.write_file(filename)
-                print(f"-> Saved Multi-track MIDI file: {filename}")
-            except Exception as e:
-                print(f"Error saving MIDI: {e}")
+        if output_base and not args.single_file:
+            save_midi(graph, f"{output_base}_var_{var}.mid", [var], add_chords, add_drums)
+
+    if output_base and args.single_file:
+        save_midi(graph, f"{output_base}_all.mid", variations, add_chords, add_drums)
 
     print("\n=== Implementation Guidance ===")
     if output_base:
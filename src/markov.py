@@ -0,0 +1,357 @@
+import argparse
+import os
+from bisect import bisect_left
+import sys
+import threading
+import zipfile
+
+import numpy as np
+
+# Allow running directly from source directory
+sys.path.append(os.getcwd())
+
+from src.generator import MelodyGenerator, MelodyBatch
+from src.midi_utils import MidiReader, scan_midi_folder
+from src.notes import NoteBuffer, DEFAULT_RESOLUTION
+from src.profiling import timed
+
+DRUM_CHANNEL = 9
+MAX_INTERVAL = 12 # Semitone leaps are clipped to +/- an octave
+NUM_INTERVALS = 2 * MAX_INTERVAL + 1
+MAX_SIXTEENTHS = 16 # Inter-onset times are clipped to one 4/4 bar
+FORMAT_VERSION = 1
+# The transition tables are dense (states ** order rows): order 4 is about 80 MB of counts
+# while training, order 5 about 2 GB
+MAX_ORDER = 4
+
+class MarkovModel:
+    """
+    Interval and rhythm n-gram transition tables learned from MIDI melodies.
+
+    interval_cdf: (NUM_INTERVALS ** order, NUM_INTERVALS) cumulative next-interval probabilities
+    rhythm_cdf:   (MAX_SIXTEENTHS ** order, MAX_SIXTEENTHS) cumulative next inter-onset time (in 16ths)
+    Contexts are the previous `order` states in base-N (most recent = least significant digit).
+    """
+    def __init__(self, order, interval_cdf, rhythm_cdf):
+        self.order = order
+        self.interval_cdf = interval_cdf
+        self.rhythm_cdf = rhythm_cdf
+
+    def save(self, path):
+        """Writes an uncompressed .npz, so load_markov_model can memory-map it."""
+        np.savez(path,
+                 meta=np.array([FORMAT_VERSION, self.order, MAX_INTERVAL, MAX_SIXTEENTHS], dtype=np.int32),
+                 interval_cdf=np.ascontiguousarray(self.interval_cdf, dtype=np.float32),
+                 rhythm_cdf=np.ascontiguousarray(self.rhythm_cdf, dtype=np.float32))
+
+def _melody_line(notes, resolution):
+    """Top voice of a NoteBuffer as (start ticks, pitch) arrays, ignoring drums."""
+    pitch, start, _, _, channel = notes.as_numpy()
+    keep = channel != DRUM_CHANNEL
+    pitch = pitch[keep].astype(np.int64)
+    start = start[keep].astype(np.int64)
+    if len(pitch) == 0:
+        return start, pitch
+    # Sort by onset, highest pitch first, then keep one note per onset
+    order = np.lexsort((-pitch, start))
+    pitch = pitch[order]
+    start = start[order]
+    first = np.concatenate(([True], start[1:] != start[:-1]))
+    return start[first], pitch[first]
+
+def _count_ngrams(counts, states, num_states, order):
+    if len(states) <= order:
+        return
+    ctx = np.zeros(len(states) - order, dtype=np.int64)
+    for k in range(order):
+        # Oldest state is the most significant digit
+        ctx = ctx * num_states + states[k:len(states) - order + k]
+    np.add.at(counts, (ctx, states[order:]), 1)
+
+def _to_cdf(counts, smoothing):
+    probs = counts + smoothing
+    cdf = np.cumsum(probs / probs.sum(axis=1, keepdims=True), axis=1)
+    cdf[:, -1] = 1.0 # Guard against rounding
+    return cdf.astype(np.float32)
+
+def train_markov_model(sources, order=2, smoothing=0.01):
+    """
+    Learns a MarkovModel from MIDI files. sources: a folder, a file path, or a list of either.
+    Non-drum tracks are reduced to their top voice; intervals are in semitones and
+    rhythm is the inter-onset time quantized to 16ths.
+    """
+    if not 1 <= order <= MAX_ORDER:
+        raise ValueError(f"order must be between 1 and {MAX_ORDER} (got {order})")
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+
+    interval_counts = np.zeros((NUM_INTERVALS ** order, NUM_INTERVALS))
+    rhythm_counts = np.zeros((MAX_SIXTEENTHS ** order, MAX_SIXTEENTHS))
+
+    def add_tracks(tracks, resolution):
+        sixteenth = resolution / 4
+        for track in tracks:
+            start, pitch = _melody_line(track.notes, resolution)
+            if len(pitch) < 2:
+                continue
+            intervals = np.clip(np.diff(pitch), -MAX_INTERVAL, MAX_INTERVAL) + MAX_INTERVAL
+            _count_ngrams(interval_counts, intervals, NUM_INTERVALS, order)
+            ioi = np.clip(np.rint(np.diff(start) / sixteenth).astype(np.int64), 1, MAX_SIXTEENTHS) - 1
+            _count_ngrams(rhythm_counts, ioi, MAX_SIXTEENTHS, order)
+
+    for source in sources:
+        if os.path.isdir(source):
+            for _, tracks, error in scan_midi_folder(source):
+                if error is None and tracks:
+                    add_tracks(tracks, tracks[0].notes.resolution)
+        else:
+            with MidiReader.open(source) as reader:
+                add_tracks(reader.tracks(), reader.resolution)
+
+    return MarkovModel(order, _to_cdf(interval_counts, smoothing), _to_cdf(rhythm_counts, smoothing))
+
+def _mmap_npz_member(mm, zf, name):
+    """Maps one stored (uncompressed) .npy member of a zip straight from the file, without reading it."""
+    info = zf.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{name} is compressed; save models with MarkovModel.save (np.savez)")
+    # Local file header: 30 bytes + file name + extra field
+    name_len = int.from_bytes(mm[info.header_offset + 26:info.header_offset + 28], 'little')
+    extra_len = int.from_bytes(mm[info.header_offset + 28:info.header_offset + 30], 'little')
+    npy_start = info.header_offset + 30 + name_len + extra_len
+
+    header = _BufferReader(mm, npy_start)
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    else:
+        raise ValueError(f"Unsupported .npy version {version} in {name}")
+    return np.ndarray(shape, dtype=dtype, buffer=mm, offset=header.pos, order='F' if fortran_order else 'C')
+
+class _BufferReader:
+    """Minimal file-like reader over a buffer (for numpy's .npy header parser)."""
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+
+    def read(self, n):
+        data = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return bytes(data)
+
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+def load_markov_model(path, mmap=True):
+    """
+    Loads a saved model. With mmap=True the tables are memory-mapped read-only, so loading
+    takes milliseconds and every worker process shares the same physical pages.
+    Models are cached per process by path and modification time, so a retrained model
+    replaces the cached one.
+    """
+    path = os.path.abspath(path)
+    key = (path, os.stat(path).st_mtime_ns, mmap)
+    with _MODEL_CACHE_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            for stale in [k for k in _MODEL_CACHE if k[0] == path and k[2] == mmap]:
+                del _MODEL_CACHE[stale]
+            if mmap:
+                import mmap as mmap_module
+                with open(path, 'rb') as f:
+                    mm = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+                with zipfile.ZipFile(path) as zf:
+                    arrays = {name[:-4]: _mmap_npz_member(mm, zf, name) for name in zf.namelist()}
+            else:
+                with np.load(path) as data:
+                    arrays = {name: data[name] for name in data.files}
+            version, order = int(arrays['meta'][0]), int(arrays['meta'][1])
+            if version != FORMAT_VERSION or int(arrays['meta'][2]) != MAX_INTERVAL or int(arrays['meta'][3]) != MAX_SIXTEENTHS:
+                raise ValueError(f"Unsupported Markov model format: {path}")
+            if (not 1 <= order <= MAX_ORDER
+                    or arrays['interval_cdf'].shape != (NUM_INTERVALS ** order, NUM_INTERVALS)
+                    or arrays['rhythm_cdf'].shape != (MAX_SIXTEENTHS ** order, MAX_SIXTEENTHS)):
+                raise ValueError(f"Markov model tables don't match its order ({order}): {path}")
+            model = MarkovModel(order, arrays['interval_cdf'], arrays['rhythm_cdf'])
+            _MODEL_CACHE[key] = model
+        return model
+
+def _sample_rows(cdf, ctx, rng):
+    """Vectorized inverse-CDF draw: one next state per context row."""
+    rows = cdf[ctx]
+    return (rows < rng.random(len(ctx))[:, None]).sum(axis=1)
+
+class MarkovMelodyGenerator(MelodyGenerator):
+    """
+    Melody engine driven by a corpus-trained MarkovModel instead of hard-coded step weights.
+    Shares scale handling, seeding and phrase-end resolution with MelodyGenerator.
+    """
+    def __init__(self, model, key, scale_type, tempo, length_bars=4, time_signature='4/4', range_octaves=(3, 5), seed=None):
+        super().__init__(key, scale_type, tempo, length_bars, time_signature, range_octaves, seed)
+        self.model = model if isinstance(model, MarkovModel) else load_markov_model(model)
+
+        # Nearest in-range scale index for every MIDI pitch (lower one on ties)
+        notes = np.asarray(self.scale_notes)
+        self._snap_pitch = np.argmin(np.abs(np.arange(128)[:, None] - notes[None, :]), axis=1)
+        # Scalar-path lookups (generate_variation); CDF rows are converted lazily as they are visited
+        self._snap_pitch_list = self._snap_pitch.tolist()
+        self._snap_stable_list = self._stable_snap_indices().tolist()
+        self._rhythm_rows = {}
+        self._interval_rows = {}
+
+    def _row(self, cache, cdf, ctx):
+        row = cache.get(ctx)
+        if row is None:
+            row = cache[ctx] = cdf[ctx].tolist()
+        return row
+
+    @timed('melody.generate_variation')
+    def generate_variation(self, variation_type=None):
+        """
+        Generates one melody (NoteBuffer) with scalar draws; same chain as generate_batch.
+        variation_type is accepted for API compatibility.
+        """
+        melody = NoteBuffer()
+        sixteenth = melody.resolution // 4
+        for pitch, start, dur, velocity in self._iter_sixteenths():
+            melody.append_ticks(pitch, start * sixteenth, dur * sixteenth, velocity)
+        return melody
+
+    def _iter_notes(self, variation_type=None):
+        # iter_variation: same chain, times in ticks
+        sixteenth = DEFAULT_RESOLUTION // 4
+        for pitch, start, dur, velocity in self._iter_sixteenths():
+            yield pitch, start * sixteenth, dur * sixteenth, velocity
+
+    def _iter_sixteenths(self):
+        """
+        Yields (pitch, start, duration, velocity), times in 16ths. The rhythm chain is drawn
+        up front (one int per note); pitches are drawn as the notes are consumed.
+        """
+        model = self.model
+        rng = self.rng
+        order = model.order
+        sixteenths_per_bar = int(self.beats_per_bar * 4)
+        total = sixteenths_per_bar * self.length_bars
+
+        # 1. Rhythm
+        rhythm_rows = self._rhythm_rows
+        radix = MAX_SIXTEENTHS ** order
+        durs = []
+        pos = 0
+        ctx = 0
+        while pos < total:
+            state = bisect_left(self._row(rhythm_rows, model.rhythm_cdf, ctx), rng.random())
+            dur = min(state + 1, sixteenths_per_bar - pos % sixteenths_per_bar)
+            durs.append(dur)
+            pos += dur
+            ctx = (ctx * MAX_SIXTEENTHS + state) % radix
+
+        # 2. Pitch
+        interval_rows = self._interval_rows
+        radix = NUM_INTERVALS ** order
+        snap_pitch = self._snap_pitch_list
+        snap_stable = self._snap_stable_list
+        scale = self.scale_notes
+        cur = len(scale) // 2
+        ctx = 0
+        for _ in range(order):
+            ctx = ctx * NUM_INTERVALS + MAX_INTERVAL
+        phrase = sixteenths_per_bar * 4
+
+        start = 0
+        for i, dur in enumerate(durs):
+            state = bisect_left(self._row(interval_rows, model.interval_cdf, ctx), rng.random())
+            cur = snap_pitch[min(max(scale[cur] + state - MAX_INTERVAL, 0), 127)]
+            if i == len(durs) - 1 or (start + dur) % phrase == 0:
+                cur = snap_stable[cur]
+            yield scale[cur], start, dur, rng.randint(80, 110)
+            start += dur
+            ctx = (ctx * NUM_INTERVALS + state) % radix
+
+    @timed('melody.generate_batch')
+    def generate_batch(self, n, variation_type=None, seed=None):
+        """Generates n melodies at once; returns a MelodyBatch."""
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        rng = np.random.default_rng(seed)
+        model = self.model
+        order = model.order
+        sixteenths_per_bar = int(self.beats_per_bar * 4)
+        total = sixteenths_per_bar * self.length_bars
+        max_len = total # At most one note per 16th
+
+        # 1. Rhythm: Markov chain over inter-onset times, cut at bar lines
+        durs = np.zeros((n, max_len), dtype=np.int64)
+        pos = np.zeros(n, dtype=np.int64)
+        ctx = np.zeros(n, dtype=np.int64) # Context starts as repeated shortest value
+        radix = MAX_SIXTEENTHS ** order
+        for t in range(max_len):
+            active = pos < total
+            if not active.any():
+                break
+            state = _sample_rows(model.rhythm_cdf, ctx, rng)
+            to_bar_end = sixteenths_per_bar - pos % sixteenths_per_bar
+            dur = np.where(active, np.minimum(state + 1, to_bar_end), 0)
+            durs[:, t] = dur
+            pos += dur
+            ctx = (ctx * MAX_SIXTEENTHS + state) % radix
+        lengths = (durs > 0).sum(axis=1)
+        max_len = int(lengths.max()) if n else 0
+        durs = durs[:, :max_len]
+        valid = np.arange(max_len)[None, :] < lengths[:, None]
+        ends = np.cumsum(durs, axis=1)
+        starts = ends - durs
+        is_end = (ends % (sixteenths_per_bar * 4) == 0) | (np.arange(max_len)[None, :] == lengths[:, None] - 1)
+        is_end &= valid
+
+        # 2. Pitch: Markov chain over semitone intervals, snapped into the scale
+        snap_stable = self._stable_snap_indices()
+        scale = np.asarray(self.scale_notes, dtype=np.int64)
+        idx = np.empty((n, max_len), dtype=np.int64)
+        cur = np.full(n, len(scale) // 2)
+        ctx = np.full(n, 0, dtype=np.int64)
+        for k in range(order):
+            ctx = ctx * NUM_INTERVALS + MAX_INTERVAL # Context starts as unisons
+        radix = NUM_INTERVALS ** order
+        for t in range(max_len):
+            state = _sample_rows(model.interval_cdf, ctx, rng)
+            target = np.clip(scale[cur] + state - MAX_INTERVAL, 0, 127)
+            nxt = self._snap_pitch[target]
+            nxt = np.where(is_end[:, t], snap_stable[nxt], nxt)
+            idx[:, t] = nxt
+            cur = nxt
+            ctx = (ctx * NUM_INTERVALS + state) % radix
+
+        velocity = rng.integers(80, 111, size=(n, max_len))
+        return MelodyBatch(
+            pitch=scale[idx],
+            scale_index=idx,
+            duration=durs / 4.0,
+            offset=starts / 4.0,
+            velocity=velocity,
+            mask=valid,
+            length=lengths,
+        )
+
+    def get_theory_explanation(self, variation_type=None):
+        return ("**Markov (Corpus-trained):** Intervals and rhythms follow transition statistics learned "
+                "from reference MIDI, snapped to the chosen scale with stable-tone phrase endings.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a Markov melody model from MIDI files")
+    parser.add_argument('sources', nargs='+', help="MIDI files or folders")
+    parser.add_argument('--output', required=True, help="Output model path (.npz)")
+    parser.add_argument('--order', type=int, default=2, help=f"n-gram order (context length, 1-{MAX_ORDER})")
+    args = parser.parse_args()
+    if not 1 <= args.order <= MAX_ORDER:
+        parser.error(f"--order must be between 1 and {MAX_ORDER}")
+
+    model = train_markov_model(args.sources, order=args.order)
+    model.save(args.output)
+    print(f"-> Saved order-{model.order} model: {args.output}")
+
+if __name__ == "__main__":
+    main()
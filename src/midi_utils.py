@@ -1,99 +1,397 @@
+import heapq
+from operator import itemgetter
+import shutil
 import struct
+import tempfile
+
+import numpy as np
+
+from src.notes import NoteBuffer
+from src.profiling import timed
+from src.timeline import PPQ, beats_to_ticks, parse_time_signature, tempo_to_mpq, metronome_clocks
 
 def text_to_bytes(text):
     return text.encode('latin1')
 
+def encode_variable_length(val):
+    bytes_list = []
+    bytes_list.append(val & 0x7F)
+    val >>= 7
+    while val > 0:
+        bytes_list.append((val & 0x7F) | 0x80)
+        val >>= 7
+    return bytes(reversed(bytes_list))
+
+def track_name_event(track_name):
+    """Delta 0 + Track Name Meta Event."""
+    name_bytes = text_to_bytes(track_name)
+    return b'\x00\xFF\x03' + encode_variable_length(len(name_bytes)) + name_bytes
+
+def iter_note_ticks(notes, resolution):
+    """
+    Yields (start_tick, duration_ticks, note, velocity, channel) for a NoteBuffer
+    or a list of note dicts, converting to the given resolution.
+    """
+    if isinstance(notes, NoteBuffer):
+        if notes.resolution != resolution:
+            notes = notes.rescaled(resolution)
+        return notes.iter_ticks()
+    return ((beats_to_ticks(n['offset'], resolution), beats_to_ticks(n['duration'], resolution),
+             n['note'], n['velocity'], n.get('channel', 0)) for n in notes)
+
+END_OF_TRACK = b'\x00\xFF\x2F\x00'
+MAX_VLQ = 0x0FFFFFFF # 4-byte SMF limit
+
+# Tracks with fewer notes than this are encoded in pure Python (NumPy setup costs more)
+VECTORIZE_MIN_NOTES = 48
+
+def _vlq_columns(values):
+    """Vectorized VLQ: (len(values), 4) right-aligned bytes and the byte count of each value."""
+    values = np.asarray(values, dtype=np.int64)
+    lengths = 1 + (values >= 1 << 7) + (values >= 1 << 14) + (values >= 1 << 21)
+    cols = np.empty((len(values), 4), dtype=np.uint8)
+    cols[:, 3] = values & 0x7F
+    cols[:, 2] = ((values >> 7) & 0x7F) | 0x80
+    cols[:, 1] = ((values >> 14) & 0x7F) | 0x80
+    cols[:, 0] = ((values >> 21) & 0x7F) | 0x80
+    return cols, lengths
+
+# Lookup table for the common (1-2 byte) VLQ values, i.e. deltas below 16384 ticks
+VLQ_TABLE_SIZE = 1 << 14
+_VLQ_TABLE, _VLQ_TABLE_LENGTHS = _vlq_columns(np.arange(VLQ_TABLE_SIZE))
+
+def encode_note_events_python(notes, resolution, channel=None, running_status=False, zero_velocity_offs=False):
+    """
+    Reference encoder: note on/off events (delta + message) for a track body.
+    zero_velocity_offs writes note offs as Note On velocity 0, so with running_status a
+    track on one channel needs a single status byte.
+    """
+    # Convert absolute offsets to delta times
+    # Sort notes by start time just in case
+    events = [] # (tick, status, note, velocity)
+    off_status = 0x90 if zero_velocity_offs else 0x80
+    for start_tick, duration_ticks, note, velocity, note_channel in sorted(
+            iter_note_ticks(notes, resolution), key=lambda x: x[0]):
+        if channel is not None:
+            note_channel = channel
+        events.append((start_tick, 0x90 | (note_channel & 0x0F), note, velocity)) # Note On + Channel
+        events.append((start_tick + duration_ticks, off_status | (note_channel & 0x0F), note, 0)) # Note Off + Channel
+
+    events.sort(key=lambda x: x[0])
+
+    data = bytearray()
+    last_tick = 0
+    last_status = None
+    for tick, status, note, velocity in events:
+        # Write variable length delta
+        data.extend(encode_variable_length(tick - last_tick))
+        last_tick = tick
+        if status != last_status or not running_status:
+            data.append(status)
+            last_status = status
+        data.append(note)
+        data.append(velocity)
+    return bytes(data)
+
+def encode_note_events_numpy(pitch, start, duration, velocity, channels, channel=None, running_status=False,
+                             zero_velocity_offs=False):
+    """
+    Vectorized encoder for note columns (times in ticks), byte-identical to encode_note_events_python.
+    Events are stably sorted by tick with note-offs before note-ons (a zero-length note's
+    off stays right after its on). Deltas use the VLQ lookup table and the whole body is
+    gathered from one (events x 7) byte matrix.
+    """
+    n = len(pitch)
+    if n == 0:
+        return b''
+    start = np.asarray(start, dtype=np.int64)
+    duration = np.asarray(duration, dtype=np.int64)
+    order = np.argsort(start, kind='stable')
+    start = start[order]
+    duration = duration[order]
+    if channel is None:
+        ch = np.asarray(channels, dtype=np.int64)[order] & 0x0F
+    else:
+        ch = np.full(n, channel & 0x0F, dtype=np.int64)
+
+    # Ons then offs; rank 0 = off, 1 = on (zero-length offs rank with the ons)
+    ticks = np.concatenate((start, start + duration))
+    rank = np.concatenate((np.ones(n, dtype=np.int8), (duration == 0).astype(np.int8)))
+    seq = np.concatenate((np.arange(n), np.arange(n)))
+    ev = np.lexsort((seq, rank, ticks))
+
+    ticks = ticks[ev]
+    deltas = np.diff(ticks, prepend=0)
+    if deltas.size and (deltas.min() < 0 or deltas.max() > MAX_VLQ):
+        raise ValueError("Delta time out of MIDI range")
+
+    rows = np.empty((2 * n, 7), dtype=np.uint8)
+    if deltas.max() < VLQ_TABLE_SIZE:
+        rows[:, :4] = _VLQ_TABLE[deltas]
+        vlq_len = _VLQ_TABLE_LENGTHS[deltas]
+    else:
+        rows[:, :4], vlq_len = _vlq_columns(deltas)
+
+    status = np.concatenate((0x90 | ch, (0x90 if zero_velocity_offs else 0x80) | ch))[ev]
+    rows[:, 4] = status
+    rows[:, 5] = np.concatenate((np.asarray(pitch)[order], np.asarray(pitch)[order]))[ev]
+    rows[:, 6] = np.concatenate((np.asarray(velocity)[order], np.zeros(n, dtype=np.int64)))[ev]
+
+    keep = np.ones((2 * n, 7), dtype=bool)
+    keep[:, :4] = np.arange(4)[None, :] >= (4 - vlq_len)[:, None]
+    if running_status:
+        keep[1:, 4] = status[1:] != status[:-1]
+    return rows[keep].tobytes()
+
+def encode_note_events(notes, resolution, channel=None, running_status=False, zero_velocity_offs=False):
+    """Encodes a track body (delta + note on/off messages), vectorized for larger tracks."""
+    if len(notes) < VECTORIZE_MIN_NOTES:
+        return encode_note_events_python(notes, resolution, channel, running_status, zero_velocity_offs)
+    buf = NoteBuffer.from_dicts(notes, resolution)
+    if buf.resolution != resolution:
+        buf = buf.rescaled(resolution)
+    return encode_note_events_numpy(*buf.as_numpy(), channel=channel, running_status=running_status,
+                                    zero_velocity_offs=zero_velocity_offs)
+
+class EncodedSegment:
+    """
+    A stretch of track body (e.g. one song section) encoded once, with times relative to its
+    own start, so it can be spliced into a track any number of times (see splice_segments).
+    body excludes the first delta; first_tick and last_tick are the first and last event times.
+    """
+    __slots__ = ('first_tick', 'body', 'last_tick')
+
+    def __init__(self, first_tick, body, last_tick):
+        self.first_tick = first_tick
+        self.body = body
+        self.last_tick = last_tick
+
+    def __len__(self):
+        return len(self.body)
+
+def encode_segment(notes, resolution, channel=None, running_status=False, zero_velocity_offs=False):
+    """Encodes notes (times relative to the segment start) as an EncodedSegment."""
+    data = encode_note_events(notes, resolution, channel, running_status, zero_velocity_offs)
+    if not data:
+        return EncodedSegment(0, b'', 0)
+    # Split off the first delta (VLQ: bytes up to the first one without the high bit)
+    i = 0
+    first_tick = 0
+    while True:
+        first_tick = (first_tick << 7) | (data[i] & 0x7F)
+        i += 1
+        if not data[i - 1] & 0x80:
+            break
+    last_tick = max(start + duration for start, duration, _, _, _ in iter_note_ticks(notes, resolution))
+    return EncodedSegment(first_tick, data[i:], last_tick)
+
+def splice_segments(placements):
+    """
+    Joins (start_tick, EncodedSegment) placements, in time order, into one track body.
+    Only the first delta of each segment is re-encoded; segments must not overlap.
+    Each segment starts with an explicit status byte, so running status restarts at splices.
+    """
+    out = bytearray()
+    last_tick = 0
+    for start_tick, segment in placements:
+        if not segment.body:
+            continue
+        delta = start_tick + segment.first_tick - last_tick
+        if delta < 0:
+            raise ValueError(f"Segment at tick {start_tick} overlaps the previous one")
+        out.extend(encode_variable_length(delta))
+        out.extend(segment.body)
+        last_tick = start_tick + segment.last_tick
+    return bytes(out)
+
+def conductor_track(tempo_map, time_signatures):
+    """
+    Track data with the tempo map and time signature meta events, in tick order, or None when
+    there are none. tempo_map: {tick: BPM}; time_signatures: {tick: (numerator, denominator)}.
+    In a format 1 file this goes first, ahead of the note tracks.
+    """
+    if not (tempo_map or time_signatures):
+        return None
+    events = [] # (tick, order, event): a time signature goes before a tempo change on the same tick
+    for tick, (numerator, denominator) in time_signatures.items():
+        events.append((tick, 0, b'\xFF\x58\x04' + bytes((numerator, denominator.bit_length() - 1,
+                                                          metronome_clocks(numerator, denominator), 8))))
+    for tick, bpm in tempo_map.items():
+        events.append((tick, 1, b'\xFF\x51\x03' + tempo_to_mpq(bpm).to_bytes(3, 'big')))
+    events.sort(key=lambda e: e[:2])
+
+    track_data = bytearray()
+    last_tick = 0
+    for tick, _, event in events:
+        track_data.extend(encode_variable_length(tick - last_tick))
+        track_data.extend(event)
+        last_tick = tick
+    track_data.extend(END_OF_TRACK)
+    return track_data
+
+# Data bytes per channel message (by high nibble of the status byte)
+_CHANNEL_DATA_LENGTHS = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+def iter_track_events(track_data):
+    """
+    Yields (tick, status, data) for every event of encoded track data up to its End of Track,
+    which comes last as (tick, 0xFF, b'\\x2F\\x00'). Running status is expanded, so each event
+    carries its own status; data is the message bytes after it (for meta and sysex events,
+    the type and length too).
+    """
+    body = bytes(track_data)
+    end = len(body)
+    pos = 0
+    tick = 0
+    status = 0
+    while pos < end:
+        byte = body[pos]
+        pos += 1
+        delta = byte & 0x7F
+        while byte >= 0x80:
+            byte = body[pos]
+            pos += 1
+            delta = (delta << 7) | (byte & 0x7F)
+        tick += delta
+
+        if body[pos] >= 0x80:
+            status = body[pos]
+            pos += 1
+        elif status < 0x80 or status >= 0xF0:
+            raise ValueError(f"Running status without a previous status at byte {pos}")
+
+        start = pos
+        if status < 0xF0:
+            pos += _CHANNEL_DATA_LENGTHS[status >> 4]
+        else:
+            # Meta (FF type len data) or sysex (F0/F7 len data)
+            if status == 0xFF:
+                pos += 1
+            size = 0
+            while True:
+                byte = body[pos]
+                pos += 1
+                size = (size << 7) | (byte & 0x7F)
+                if byte < 0x80:
+                    break
+            pos += size
+        data = body[start:pos]
+        yield tick, status, data
+        if status == 0xFF and data[0] == 0x2F: # End of Track
+            return
+        if status >= 0xF0:
+            status = 0
+
+def merge_tracks(tracks, running_status=False):
+    """
+    Merges encoded tracks into the data of one format 0 track: a k-way merge (heapq.merge) of
+    the per-track event streams, in time order. Events on the same tick keep the order of the
+    tracks (the conductor track's tempo comes before the first notes), and the merged track ends
+    with the latest End of Track. Track names are dropped, since the parts now share one track
+    and are told apart by channel.
+    """
+    out = bytearray()
+    last_tick = 0
+    last_status = None
+    end_tick = 0
+    for tick, status, data in heapq.merge(*(iter_track_events(t) for t in tracks), key=itemgetter(0)):
+        if status == 0xFF and data[0] in (0x03, 0x2F): # Track Name, End of Track
+            end_tick = max(end_tick, tick)
+            continue
+        delta = tick - last_tick
+        if delta < 0x80:
+            out.append(delta)
+        else:
+            out.extend(encode_variable_length(delta))
+        last_tick = tick
+        if status != last_status or not running_status:
+            out.append(status)
+        # Meta and sysex events cancel running status
+        last_status = status if status < 0xF0 else None
+        out.extend(data)
+    out.extend(encode_variable_length(max(end_tick - last_tick, 0)))
+    out.extend(b'\xFF\x2F\x00')
+    return out
+
+def write_header(stream, num_tracks, resolution, midi_format=1):
+    stream.write(b'MThd')
+    stream.write(struct.pack('>L', 6)) # Chunk size 6
+    stream.write(struct.pack('>H', midi_format)) # Format 1 (Multiple tracks) or 0 (one merged track)
+    stream.write(struct.pack('>H', num_tracks)) # Number of tracks
+    stream.write(struct.pack('>H', resolution))
+
 class MidiWriter:
-    def __init__(self):
+    def __init__(self, running_status=False, tempo=None, time_signature=None, compact=False, midi_format=1):
+        if midi_format not in (0, 1):
+            raise ValueError(f"Unsupported MIDI format {midi_format} (expected 0 or 1)")
         self.tracks = []
-        self.resolution = 480 # Ticks per quarter note
+        self.resolution = PPQ # Ticks per quarter note
+        # Omit repeated status bytes (smaller files, same MIDI)
+        self.running_status = running_status or compact
+        # compact: running status plus note offs as Note On velocity 0, so a track on one channel
+        # is a single run of note messages (about a third smaller for dense drum tracks)
+        self.zero_velocity_offs = compact
+        # 0 merges every track (conductor included) into the single track of a format 0 file
+        self.midi_format = midi_format
+        # Conductor track (written ahead of the note tracks when either is set)
+        self.tempo_map = {} # tick -> BPM
+        self.time_signatures = {} # tick -> (numerator, denominator)
+        if tempo is not None:
+            self.set_tempo(tempo)
+        if time_signature is not None:
+            self.set_time_signature(time_signature)
 
-    def add_track(self, notes, track_name="Melody", channel=0):
+    def set_tempo(self, bpm, tick=0):
+        """Sets the tempo from a tick on (one call per change for a tempo map)."""
+        tempo_to_mpq(bpm) # Validates the range
+        self.tempo_map[tick] = bpm
+
+    def set_time_signature(self, time_signature, tick=0):
+        """Sets the meter ('6/8' or (6, 8)) from a tick on, normally a bar line."""
+        self.time_signatures[tick] = parse_time_signature(time_signature)
+
+    @timed('midi.add_track')
+    def add_track(self, notes, track_name="Melody", channel=None):
         """
-        notes: list of dicts {'note': int, 'duration': float (beats), 'velocity': int, 'offset': float}
+        notes: NoteBuffer, or list of dicts {'note': int, 'duration': float (beats), 'velocity': int, 'offset': float}
         channel: MIDI channel (0-15). Channel 9 is usually Percussion.
+                 None uses each note's own channel (0 for dicts without one).
         """
         track_data = bytearray()
 
         # Track Name Meta Event
-        track_data.extend(b'\x00\xFF\x03')
-        name_bytes = text_to_bytes(track_name)
-        track_data.append(len(name_bytes))
-        track_data.extend(name_bytes)
-
-        # Convert absolute offsets to delta times
-        # Sort notes by start time just in case
-        sorted_notes = sorted(notes, key=lambda x: x['offset'])
-
-        events = []
-        for n in sorted_notes:
-            start_tick = int(n['offset'] * self.resolution)
-            duration_ticks = int(n['duration'] * self.resolution)
-            end_tick = start_tick + duration_ticks
-
-            # Note On
-            events.append({
-                'tick': start_tick,
-                'type': 'on',
-                'note': n['note'],
-                'velocity': n['velocity']
-            })
-
-            # Note Off
-            events.append({
-                'tick': end_tick,
-                'type': 'off',
-                'note': n['note'],
-                'velocity': 0
-            })
-
-        events.sort(key=lambda x: x['tick'])
-
-        last_tick = 0
-
-        for ev in events:
-            delta = ev['tick'] - last_tick
-            last_tick = ev['tick']
+        track_data.extend(track_name_event(track_name))
 
-            # Write variable length delta
-            track_data.extend(self.encode_variable_length(delta))
-
-            # Event Type
-            if ev['type'] == 'on':
-                status = 0x90 | (channel & 0x0F) # Note On + Channel
-                track_data.append(status)
-                track_data.append(ev['note'])
-                track_data.append(ev['velocity'])
-            else:
-                status = 0x80 | (channel & 0x0F) # Note Off + Channel
-                track_data.append(status)
-                track_data.append(ev['note'])
-                track_data.append(ev['velocity'])
+        # Note events (delta times, sorted by tick)
+        track_data.extend(encode_note_events(notes, self.resolution, channel, self.running_status,
+                                             self.zero_velocity_offs))
 
         # End of Track
-        track_data.extend(b'\x00\xFF\x2F\x00')
+        track_data.extend(END_OF_TRACK)
 
         self.tracks.append(track_data)
 
+    def add_encoded_track(self, events, track_name="Melody"):
+        """Adds a track from an already encoded body (delta + message events, e.g. splice_segments output)."""
+        self.tracks.append(bytearray(track_name_event(track_name) + bytes(events) + END_OF_TRACK))
+
     def encode_variable_length(self, val):
-        bytes_list = []
-        bytes_list.append(val & 0x7F)
-        val >>= 7
-        while val > 0:
-            bytes_list.append((val & 0x7F) | 0x80)
-            val >>= 7
-        return bytes(reversed(bytes_list))
+        return encode_variable_length(val)
 
+    @timed('midi.write_to_stream')
     def write_to_stream(self, stream):
+        tracks = self.tracks
+        conductor = conductor_track(self.tempo_map, self.time_signatures)
+        if conductor is not None:
+            tracks = [conductor] + tracks
+        if self.midi_format == 0:
+            tracks = [merge_tracks(tracks, self.running_status)]
+
         # Header Chunk
-        stream.write(b'MThd')
-        stream.write(struct.pack('>L', 6)) # Chunk size 6
-        stream.write(struct.pack('>H', 1)) # Format 1 (Multiple tracks)
-        stream.write(struct.pack('>H', len(self.tracks))) # Number of tracks
-        stream.write(struct.pack('>H', self.resolution))
+        write_header(stream, len(tracks), self.resolution, self.midi_format)
 
         # Track Chunks
-        for track_data in self.tracks:
+        for track_data in tracks:
             stream.write(b'MTrk')
             stream.write(struct.pack('>L', len(track_data)))
             stream.write(track_data)
@@ -101,3 +399,343 @@ class MidiWriter:
     def write_file(self, filename):
         with open(filename, 'wb') as f:
             self.write_to_stream(f)
+
+
+class StreamingMidiWriter:
+    """
+    Writes a format 1 MIDI file track by track while the notes are generated,
+    so memory stays bounded no matter how long the arrangement is.
+
+    Notes are consumed from any iterable (e.g. a generator) and must arrive in
+    non-decreasing 'offset' order. Encoded bytes are flushed every chunk_size
+    bytes. The MTrk length and the MThd track count are back-patched when the
+    stream is seekable; otherwise the tracks are spooled through a temp file.
+
+        with open('song.mid', 'wb') as f:
+            with StreamingMidiWriter(f) as writer:
+                writer.add_track(note_iter, track_name="Melody", channel=0)
+
+    tempo and time_signature (as for MidiWriter) write a conductor track first.
+    """
+    def __init__(self, stream, resolution=PPQ, chunk_size=64 * 1024, tempo=None, time_signature=None):
+        self.stream = stream
+        self.resolution = resolution
+        self.chunk_size = chunk_size
+        self.num_tracks = 0
+        self.closed = False
+
+        try:
+            seekable = stream.seekable()
+        except AttributeError:
+            seekable = False
+
+        if seekable:
+            self._out = stream
+            self._header_pos = stream.tell()
+            write_header(stream, 0, resolution) # Track count patched in close()
+        else:
+            self._out = tempfile.TemporaryFile()
+            self._header_pos = None
+
+        conductor = conductor_track({0: tempo} if tempo is not None else {},
+                                    {0: parse_time_signature(time_signature)} if time_signature is not None else {})
+        if conductor is not None:
+            self._out.write(b'MTrk' + struct.pack('>L', len(conductor)) + conductor)
+            self.num_tracks += 1
+
+    def add_track(self, notes, track_name="Melody", channel=None):
+        """
+        notes: NoteBuffer, or iterable of dicts {'note': int, 'duration': float (beats), 'velocity': int, 'offset': float},
+               in time order.
+        channel: MIDI channel (0-15); None uses each note's own channel.
+        """
+        out = self._out
+        out.write(b'MTrk')
+        length_pos = out.tell()
+        out.write(b'\x00\x00\x00\x00') # Patched once the track is complete
+        track_len = 0
+
+        chunk = bytearray(track_name_event(track_name))
+        pending_offs = [] # heap of (tick, seq, status, note)
+        last_tick = 0
+        last_start = 0
+
+        for seq, (start_tick, duration_ticks, note, velocity, note_channel) in enumerate(
+                iter_note_ticks(notes, self.resolution)):
+            if start_tick < last_start:
+                raise ValueError(f"Notes must be in time order (tick {start_tick} after tick {last_start})")
+            last_start = start_tick
+            if channel is not None:
+                note_channel = channel
+
+            # Note Offs due before (or at) this Note On
+            while pending_offs and pending_offs[0][0] <= start_tick:
+                tick, _, status, off_note = heapq.heappop(pending_offs)
+                chunk.extend(encode_variable_length(tick - last_tick))
+                chunk.extend((status, off_note, 0))
+                last_tick = tick
+
+            chunk.extend(encode_variable_length(start_tick - last_tick))
+            chunk.extend((0x90 | (note_channel & 0x0F), note, velocity))
+            last_tick = start_tick
+            heapq.heappush(pending_offs, (start_tick + duration_ticks, seq, 0x80 | (note_channel & 0x0F), note))
+
+            if len(chunk) >= self.chunk_size:
+                out.write(chunk)
+                track_len += len(chunk)
+                chunk = bytearray()
+
+        while pending_offs:
+            tick, _, status, off_note = heapq.heappop(pending_offs)
+            chunk.extend(encode_variable_length(tick - last_tick))
+            chunk.extend((status, off_note, 0))
+            last_tick = tick
+
+        chunk.extend(END_OF_TRACK)
+        out.write(chunk)
+        track_len += len(chunk)
+
+        # Back-patch the MTrk length
+        end_pos = out.tell()
+        out.seek(length_pos)
+        out.write(struct.pack('>L', track_len))
+        out.seek(end_pos)
+        self.num_tracks += 1
+
+    def close(self):
+        """Finalizes the header. The underlying stream is left open."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._header_pos is not None:
+            end_pos = self.stream.tell()
+            self.stream.seek(self._header_pos)
+            write_header(self.stream, self.num_tracks, self.resolution)
+            self.stream.seek(end_pos)
+        else:
+            write_header(self.stream, self.num_tracks, self.resolution)
+            self._out.seek(0)
+            shutil.copyfileobj(self._out, self.stream, self.chunk_size)
+            self._out.close()
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._header_pos is None:
+            self._out.close()
+
+
+class MidiTrackData:
+    """One parsed track: its name, notes (NoteBuffer, in file ticks) and meta events."""
+    def __init__(self, resolution):
+        self.name = ""
+        self.notes = NoteBuffer(resolution)
+        self.tempos = [] # (tick, microseconds per quarter note)
+        self.time_signatures = [] # (tick, numerator, denominator)
+        self.end_tick = 0
+
+class MidiReader:
+    """
+    Parses Standard MIDI Files (format 0 and 1) straight from bytes, a memoryview
+    or an mmap, without copying track data. Handles VLQ deltas, running status,
+    meta and sysex events, and returns each track's notes as a NoteBuffer, the
+    same representation MidiWriter consumes.
+
+        with MidiReader.open('beat.mid') as reader:
+            for track in reader.tracks():
+                print(track.name, len(track.notes))
+    """
+    def __init__(self, data):
+        self._mmap = None
+        self._file = None
+        # Validate before taking a buffer export, so a bad file leaves the mmap closable
+        if len(data) < 14 or data[0:4] != b'MThd':
+            raise ValueError("Not a MIDI file (missing MThd header)")
+        header_len, self.format, self.num_tracks, self.resolution = struct.unpack_from('>LHHH', data, 4)
+        if self.format not in (0, 1):
+            raise ValueError(f"Unsupported MIDI format {self.format}")
+        if self.resolution & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        self._first_chunk = 8 + header_len
+        self.data = memoryview(data)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-maps a file for parsing. Use as a context manager (or call close())."""
+        import mmap
+        f = open(path, 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise ValueError(f"Empty file: {path}")
+        try:
+            reader = cls(mm)
+        except Exception:
+            mm.close()
+            f.close()
+            raise
+        reader._mmap = mm
+        reader._file = f
+        return reader
+
+    def close(self):
+        try:
+            self.data.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass # A track view is still referenced (e.g. by a traceback); the map closes once it is freed
+        if self._file is not None:
+            self._file.close()
+        self._mmap = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def iter_track_chunks(self):
+        """Yields a zero-copy memoryview of each MTrk chunk body (other chunk types are skipped)."""
+        data = self.data
+        pos = self._first_chunk
+        while pos + 8 <= len(data):
+            chunk_type = data[pos:pos + 4]
+            (length,) = struct.unpack_from('>L', data, pos + 4)
+            body = data[pos + 8:pos + 8 + length]
+            if len(body) < length:
+                raise ValueError("Truncated MIDI chunk")
+            if chunk_type == b'MTrk':
+                yield body
+            pos += 8 + length
+
+    def tracks(self):
+        """Parses every track. Returns a list of MidiTrackData."""
+        return [self.parse_track(body) for body in self.iter_track_chunks()]
+
+    def notes(self):
+        """All notes of all tracks merged into one NoteBuffer (per-note channels preserved)."""
+        merged = NoteBuffer(self.resolution)
+        for track in self.tracks():
+            merged.extend(track.notes)
+        return merged
+
+    def parse_track(self, body):
+        track = MidiTrackData(self.resolution)
+        notes = track.notes
+        starts = notes.start
+        durations = notes.duration
+        # Bound appends: this loop runs once per event
+        add_pitch = notes.pitch.append
+        add_start = starts.append
+        add_duration = durations.append
+        add_velocity = notes.velocity.append
+        add_channel = notes.channel.append
+        open_notes = {} # (channel << 7 | note) -> buffer indexes of sounding notes, oldest first
+        end = len(body)
+        pos = 0
+        tick = 0
+        status = 0
+
+        while pos < end:
+            # Delta time (VLQ)
+            byte = body[pos]
+            pos += 1
+            delta = byte & 0x7F
+            while byte >= 0x80:
+                byte = body[pos]
+                pos += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+
+            byte = body[pos]
+            if byte >= 0x80:
+                status = byte
+                pos += 1
+            elif status < 0x80 or status >= 0xF0:
+                raise ValueError(f"Running status without a previous status at byte {pos}")
+            # else: running status, byte is the first data byte
+
+            kind = status >> 4
+            if kind == 0x9 or kind == 0x8:
+                note = body[pos]
+                velocity = body[pos + 1]
+                pos += 2
+                key = ((status & 0x0F) << 7) | note
+                if kind == 0x9 and velocity > 0:
+                    pending = open_notes.get(key)
+                    if pending is None:
+                        open_notes[key] = [len(starts)]
+                    else:
+                        pending.append(len(starts))
+                    add_pitch(note)
+                    add_start(tick)
+                    add_duration(0)
+                    add_velocity(velocity)
+                    add_channel(status & 0x0F)
+                else:
+                    pending = open_notes.get(key)
+                    if pending:
+                        idx = pending.pop(0)
+                        durations[idx] = tick - starts[idx]
+            elif status < 0xF0:
+                pos += _CHANNEL_DATA_LENGTHS[kind]
+            else:
+                # Meta (FF type len data) or sysex (F0/F7 len data); both cancel running status
+                meta_type = None
+                if status == 0xFF:
+                    meta_type = body[pos]
+                    pos += 1
+                length = 0
+                while True:
+                    byte = body[pos]
+                    pos += 1
+                    length = (length << 7) | (byte & 0x7F)
+                    if byte < 0x80:
+                        break
+                payload = body[pos:pos + length]
+                pos += length
+                status = 0
+                if meta_type == 0x2F: # End of Track
+                    break
+                elif meta_type == 0x03 and not track.name:
+                    track.name = bytes(payload).decode('latin1')
+                elif meta_type == 0x51 and length == 3:
+                    track.tempos.append((tick, (payload[0] << 16) | (payload[1] << 8) | payload[2]))
+                elif meta_type == 0x58 and length >= 2:
+                    track.time_signatures.append((tick, payload[0], 1 << payload[1]))
+
+        if pos > end:
+            raise ValueError("Truncated MIDI track")
+
+        # Notes never released end with the track
+        for pending in open_notes.values():
+            for idx in pending:
+                durations[idx] = tick - starts[idx]
+        track.end_tick = tick
+        return track
+
+
+def scan_midi_folder(folder):
+    """
+    Walks a folder of .mid/.midi files and parses each one.
+    Yields (path, tracks, error): tracks is a list of MidiTrackData, or None with the
+    exception if the file could not be parsed.
+    """
+    import os
+    for root, _, files in os.walk(folder):
+        for filename in sorted(files):
+            if not filename.lower().endswith(('.mid', '.midi')):
+                continue
+            path = os.path.join(root, filename)
+            try:
+                with MidiReader.open(path) as reader:
+                    yield path, reader.tracks(), None
+            except (ValueError, IndexError, struct.error, OSError) as e:
+                yield path, None, e
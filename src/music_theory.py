@@ -1,3 +1,6 @@
+from functools import lru_cache
+from types import MappingProxyType
+
 
 NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
@@ -35,40 +38,116 @@ def get_note_index(note_name):
         raise ValueError(f"Invalid note name: {note_name}")
     return NOTES.index(note_name)
 
-def get_scale_notes(root_note, scale_type, start_octave=3, end_octave=5):
-    """Returns a list of MIDI numbers for the scale across specified octaves."""
+def normalize_scale_type(scale_type):
+    """Returns the SCALES key for a scale name, defaulting to minor."""
+    scale_key = scale_type.lower().replace(' ', '_')
+    if scale_key not in SCALES:
+        scale_key = 'minor' # Default to minor for hip hop context
+    return scale_key
+
+def intervals_to_mask(intervals):
+    """Packs semitone intervals into a 12-bit pitch-class mask (bit n = pitch class n)."""
+    mask = 0
+    for interval in intervals:
+        mask |= 1 << (interval % 12)
+    return mask
+
+def rotate_mask(mask, semitones):
+    """Transposes a 12-bit pitch-class mask up by the given number of semitones."""
+    semitones %= 12
+    return ((mask << semitones) | (mask >> (12 - semitones))) & 0xFFF
+
+# Interval masks relative to the root, e.g. major -> 0b101010110101
+SCALE_MASKS = {name: intervals_to_mask(intervals) for name, intervals in SCALES.items()}
+
+# Tonic + 5th, plus the 3rd matching the scale quality (see is_stable_scale_degree)
+STABLE_MASK_MAJOR = intervals_to_mask([0, 4, 7])
+STABLE_MASK_MINOR = intervals_to_mask([0, 3, 7])
+
+def stable_mask(scale_key):
+    is_major = 'major' in scale_key and 'minor' not in scale_key # Simple check
+    return STABLE_MASK_MAJOR if is_major else STABLE_MASK_MINOR
+
+class ScaleTable:
+    """
+    Immutable lookup tables for one key/scale over a span of MIDI notes.
+
+    notes: sorted tuple of MIDI numbers in the scale
+    index_map: read-only {midi: position in notes}, O(1) index and membership
+    mask / stable: absolute 12-bit pitch-class sets of the scale and its stable tones
+    """
+    __slots__ = ('root_idx', 'scale_key', 'mask', 'stable', 'notes', 'index_map',
+                 'stable_notes', '_first_at_or_above')
+
+    def __init__(self, root_idx, scale_key, notes):
+        self.root_idx = root_idx
+        self.scale_key = scale_key
+        self.mask = rotate_mask(SCALE_MASKS[scale_key], root_idx)
+        self.stable = rotate_mask(stable_mask(scale_key), root_idx)
+        self.notes = tuple(notes)
+        self.index_map = MappingProxyType({n: i for i, n in enumerate(self.notes)})
+        self.stable_notes = tuple(n for n in self.notes if (self.stable >> (n % 12)) & 1)
+
+        # first_at_or_above[p] = position of the first scale note >= p (p in 0..128)
+        first = []
+        pos = 0
+        for pitch in range(129):
+            while pos < len(self.notes) and self.notes[pos] < pitch:
+                pos += 1
+            first.append(pos)
+        self._first_at_or_above = tuple(first)
+
+    def __len__(self):
+        return len(self.notes)
+
+    def __contains__(self, midi_note):
+        return midi_note in self.index_map
+
+    def index(self, midi_note, default=None):
+        """Position of midi_note in notes, or default if it is not in the table."""
+        return self.index_map.get(midi_note, default)
+
+    def pitch_range(self, low, high):
+        """Returns the sub-table of notes with low <= note < high."""
+        low = min(max(low, 0), 128)
+        high = min(max(high, low), 128)
+        first = self._first_at_or_above
+        return ScaleTable(self.root_idx, self.scale_key, self.notes[first[low]:first[high]])
+
+def _build_full_range_tables():
+    tables = {}
+    for root_idx in range(12):
+        for scale_key, mask in SCALE_MASKS.items():
+            abs_mask = rotate_mask(mask, root_idx)
+            notes = [n for n in range(128) if (abs_mask >> (n % 12)) & 1]
+            tables[(root_idx, scale_key)] = ScaleTable(root_idx, scale_key, notes)
+    return MappingProxyType(tables)
+
+# Every key x scale over the full MIDI range (0-127). Octave spans are O(1) slices of these.
+SCALE_TABLES = _build_full_range_tables()
+
+def get_scale_table(root_note, scale_type, start_octave=3, end_octave=5):
+    """Returns the shared, immutable ScaleTable for a key/scale across the specified octaves."""
     try:
         root_idx = get_note_index(root_note)
     except ValueError:
         # Default to C if invalid
         root_idx = 0
+    # Cached on the canonical key and scale, so spellings from callers can't grow the cache
+    return _scale_table(root_idx, normalize_scale_type(scale_type), start_octave, end_octave)
+
+@lru_cache(maxsize=4096)
+def _scale_table(root_idx, scale_key, start_octave, end_octave):
+    full = SCALE_TABLES[(root_idx, scale_key)]
+    # MIDI note 0 is C-1, so the root of octave o is root_idx + (o + 1) * 12 (C4 = 60).
+    # Each octave spans [root, root + 12).
+    low = root_idx + (start_octave + 1) * 12
+    high = root_idx + (end_octave + 2) * 12
+    return full.pitch_range(low, high)
 
-    scale_key = scale_type.lower().replace(' ', '_')
-    if scale_key not in SCALES:
-        scale_key = 'minor' # Default to minor for hip hop context
-
-    intervals = SCALES[scale_key]
-
-    midi_notes = []
-    # Loop through octaves
-    for octave in range(start_octave, end_octave + 1):
-        # MIDI note 0 is C-1. C4 is 60.
-        # C0 is 12.
-        # root_idx 0 (C) at octave 3 -> C3 -> 48?
-        # Standard: Middle C = C4 = 60.
-        # C(-1) = 0.
-        # C0 = 12
-        # C1 = 24
-        # C2 = 36
-        # C3 = 48
-        # C4 = 60
-        root_midi = root_idx + (octave + 1) * 12
-        for interval in intervals:
-            midi_note = root_midi + interval
-            if 0 <= midi_note <= 127:
-                midi_notes.append(midi_note)
-
-    return sorted(list(set(midi_notes)))
+def get_scale_notes(root_note, scale_type, start_octave=3, end_octave=5):
+    """Returns a list of MIDI numbers for the scale across specified octaves."""
+    return list(get_scale_table(root_note, scale_type, start_octave, end_octave).notes)
 
 def get_note_name(midi_number):
     """Converts MIDI number to Note Name (e.g., 60 -> C4)."""
@@ -94,16 +173,5 @@ def is_stable_scale_degree(midi_note, root_note_name, scale_type):
 
     # Stable degrees: 0 (Tonic), 7 (Dominant)
     # 3rd depends on scale (Major=4, Minor=3)
-
     scale_key = scale_type.lower().replace(' ', '_')
-    is_major = 'major' in scale_key and 'minor' not in scale_key # Simple check
-
-    if interval_from_root == 0 or interval_from_root == 7:
-        return True
-
-    if is_major and interval_from_root == 4:
-        return True
-    if not is_major and interval_from_root == 3:
-        return True
-
-    return False
+    return bool((stable_mask(scale_key) >> interval_from_root) & 1)
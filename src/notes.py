@@ -0,0 +1,149 @@
+from array import array
+from types import MappingProxyType
+from src.music_theory import get_note_name
+from src.timeline import PPQ, beats_to_ticks
+
+DEFAULT_RESOLUTION = PPQ # Ticks per quarter note (matches MidiWriter)
+
+def _column(typecode, values):
+    if hasattr(values, 'dtype'):
+        # NumPy input: one bulk copy instead of a Python int per element
+        import numpy as np
+        dtype = np.uint8 if typecode == 'B' else np.int32
+        return array(typecode, np.ascontiguousarray(values, dtype=dtype).tobytes())
+    return array(typecode, (int(v) for v in values))
+
+class NoteBuffer:
+    """
+    Compact struct-of-arrays note list: one typed column per field instead of a dict per note.
+
+    Columns (array.array): pitch, start (ticks), duration (ticks), velocity, channel.
+    Indexing and iteration give read-only views in the classic note format
+    {'note', 'name', 'duration', 'velocity', 'offset', 'channel'} (times in beats),
+    so code written for lists of dicts keeps reading them. Writes such as
+    notes[i]['velocity'] = v raise TypeError (they could never reach the columns);
+    change the columns, or copy with dict(note).
+    """
+    __slots__ = ('pitch', 'start', 'duration', 'velocity', 'channel', 'resolution')
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION):
+        self.pitch = array('B')
+        self.start = array('i')
+        self.duration = array('i')
+        self.velocity = array('B')
+        self.channel = array('B')
+        self.resolution = resolution
+
+    @classmethod
+    def from_dicts(cls, notes, resolution=DEFAULT_RESOLUTION, channel=0):
+        """Builds a buffer from dicts {'note', 'duration', 'velocity', 'offset'[, 'channel']}."""
+        if isinstance(notes, NoteBuffer):
+            return notes
+        buf = cls(resolution)
+        for n in notes:
+            buf.append(n['note'], n['offset'], n['duration'], n['velocity'], n.get('channel', channel))
+        return buf
+
+    @classmethod
+    def from_columns(cls, pitch, start, duration, velocity, channel=0, resolution=DEFAULT_RESOLUTION):
+        """Builds a buffer from equal-length sequences (lists or NumPy arrays); times in ticks."""
+        buf = cls(resolution)
+        buf.pitch = _column('B', pitch)
+        buf.start = _column('i', start)
+        buf.duration = _column('i', duration)
+        buf.velocity = _column('B', velocity)
+        if isinstance(channel, int):
+            buf.channel = array('B', [channel]) * len(buf.pitch)
+        else:
+            buf.channel = _column('B', channel)
+        return buf
+
+    def append(self, note, offset, duration, velocity, channel=0):
+        """Adds a note with offset/duration in beats (rounded to the nearest tick)."""
+        self.pitch.append(note)
+        self.start.append(beats_to_ticks(offset, self.resolution))
+        self.duration.append(beats_to_ticks(duration, self.resolution))
+        self.velocity.append(velocity)
+        self.channel.append(channel)
+
+    def append_ticks(self, note, start, duration, velocity, channel=0):
+        """Adds a note with start/duration already in ticks."""
+        self.pitch.append(note)
+        self.start.append(start)
+        self.duration.append(duration)
+        self.velocity.append(velocity)
+        self.channel.append(channel)
+
+    def extend(self, other):
+        """Appends all notes of another NoteBuffer (or list of note dicts)."""
+        other = NoteBuffer.from_dicts(other, self.resolution)
+        if other.resolution != self.resolution:
+            other = other.rescaled(self.resolution)
+        self.pitch.extend(other.pitch)
+        self.start.extend(other.start)
+        self.duration.extend(other.duration)
+        self.velocity.extend(other.velocity)
+        self.channel.extend(other.channel)
+
+    def rescaled(self, resolution):
+        """Returns a copy with ticks converted to another resolution."""
+        buf = NoteBuffer(resolution)
+        buf.pitch = array('B', self.pitch)
+        buf.start = array('i', (t * resolution // self.resolution for t in self.start))
+        buf.duration = array('i', (t * resolution // self.resolution for t in self.duration))
+        buf.velocity = array('B', self.velocity)
+        buf.channel = array('B', self.channel)
+        return buf
+
+    def iter_ticks(self):
+        """Yields (start, duration, pitch, velocity, channel) tuples without building dicts."""
+        return zip(self.start, self.duration, self.pitch, self.velocity, self.channel)
+
+    def as_numpy(self):
+        """Zero-copy NumPy views of the columns: (pitch, start, duration, velocity, channel)."""
+        import numpy as np
+        return tuple(np.frombuffer(col, dtype=np.uint8 if col.typecode == 'B' else np.int32)
+                     for col in (self.pitch, self.start, self.duration, self.velocity, self.channel))
+
+    def _note_dict(self, i):
+        res = self.resolution
+        return MappingProxyType({
+            'note': self.pitch[i],
+            'name': get_note_name(self.pitch[i]),
+            'duration': self.duration[i] / res,
+            'velocity': self.velocity[i],
+            'offset': self.start[i] / res,
+            'channel': self.channel[i],
+        })
+
+    def __len__(self):
+        return len(self.pitch)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            buf = NoteBuffer(self.resolution)
+            buf.pitch = self.pitch[i]
+            buf.start = self.start[i]
+            buf.duration = self.duration[i]
+            buf.velocity = self.velocity[i]
+            buf.channel = self.channel[i]
+            return buf
+        if i < 0:
+            i += len(self.pitch)
+        if not 0 <= i < len(self.pitch):
+            raise IndexError("NoteBuffer index out of range")
+        return self._note_dict(i)
+
+    def __iter__(self):
+        for i in range(len(self.pitch)):
+            yield self._note_dict(i)
+
+    def __eq__(self, other):
+        if not isinstance(other, NoteBuffer):
+            return NotImplemented
+        return (self.resolution == other.resolution and self.pitch == other.pitch
+                and self.start == other.start and self.duration == other.duration
+                and self.velocity == other.velocity and self.channel == other.channel)
+
+    def __repr__(self):
+        return f"NoteBuffer({len(self)} notes, resolution={self.resolution})"
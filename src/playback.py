@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import socket
+import sys
+import time
+
+from src.midi_utils import iter_note_ticks
+
+DEFAULT_RESOLUTION = 480
+SPIN_SECONDS = 0.002 # Busy-wait the last stretch before each deadline; asyncio.sleep alone is ~1 ms coarse
+LEAD_IN_SECONDS = 0.05 # Head start so the first events aren't late while the pipeline warms up
+
+class StreamSink:
+    """Writes MIDI bytes to a file object (stdout, a FIFO) and flushes after every write."""
+    def __init__(self, stream, owned=True):
+        self.stream = stream
+        self.owned = owned
+
+    def write(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def close(self):
+        if self.owned:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class SocketSink:
+    """Writes MIDI bytes to a connected stream socket (TCP with Nagle off, or UNIX)."""
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_sink(target):
+    """
+    Opens a playback sink from a target string:
+      'stdout' or '-'   standard output
+      'tcp:HOST:PORT'   TCP socket
+      'unix:PATH'       UNIX stream socket
+      anything else     a file path, e.g. a FIFO made with mkfifo
+    """
+    if target in ('stdout', '-'):
+        return StreamSink(sys.stdout.buffer, owned=False)
+    if target.startswith('tcp:'):
+        host, _, port = target[4:].rpartition(':')
+        if not host or not port.isdigit():
+            raise ValueError(f"Expected tcp:HOST:PORT, got {target!r}")
+        sock = socket.create_connection((host, int(port)))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return SocketSink(sock)
+    if target.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[5:])
+        return SocketSink(sock)
+    return StreamSink(open(target, 'wb', buffering=0))
+
+def iter_messages(tracks, resolution=DEFAULT_RESOLUTION):
+    """
+    Merges tracks into one time-ordered stream of (tick, bytes) with every raw MIDI
+    message due on that tick (Note Offs first, then Note Ons).
+    tracks: iterable of (notes, channel); notes is a NoteBuffer or an iterable of note
+    dicts in time order (e.g. a generator's iter_* output), channel None keeps the notes' own.
+    Lazy: only the sounding notes and one pending note per track are held.
+    """
+    def track_ticks(notes, channel):
+        for start, duration, note, velocity, note_channel in iter_note_ticks(notes, resolution):
+            yield start, duration, note, velocity, note_channel if channel is None else channel
+
+    merged = heapq.merge(*(track_ticks(notes, channel) for notes, channel in tracks), key=lambda e: e[0])
+    pending_offs = [] # heap of (tick, seq, status, note)
+    tick = None
+    data = bytearray()
+
+    for seq, (start, duration, note, velocity, channel) in enumerate(merged):
+        # Note Offs due before (or at) this Note On
+        while pending_offs and pending_offs[0][0] <= start:
+            off_tick, _, status, off_note = heapq.heappop(pending_offs)
+            if off_tick != tick:
+                if data:
+                    yield tick, bytes(data)
+                tick, data = off_tick, bytearray()
+            data.extend((status, off_note, 0))
+        if start != tick:
+            if data:
+                yield tick, bytes(data)
+            tick, data = start, bytearray()
+        data.extend((0x90 | (channel & 0x0F), note, velocity))
+        heapq.heappush(pending_offs, (start + duration, seq, 0x80 | (channel & 0x0F), note))
+
+    while pending_offs:
+        off_tick, _, status, off_note = heapq.heappop(pending_offs)
+        if off_tick != tick:
+            if data:
+                yield tick, bytes(data)
+            tick, data = off_tick, bytearray()
+        data.extend((status, off_note, 0))
+    if data:
+        yield tick, bytes(data)
+
+def jitter_report(samples):
+    """Timing error percentiles in milliseconds (positive = late) from a list of seconds."""
+    if not samples:
+        return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    pick = lambda q: round(ordered[min(last, int(q * len(ordered)))] * 1000, 3)
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': round(ordered[-1] * 1000, 3)}
+
+async def play(tracks, sink, tempo, resolution=DEFAULT_RESOLUTION, spin=SPIN_SECONDS, lead_in=LEAD_IN_SECONDS):
+    """
+    Sends tracks (see iter_messages) to a sink in real time at the given tempo.
+
+    Every message time is an absolute deadline on the monotonic clock, measured from one
+    start time, so lateness never accumulates into drift. The scheduler sleeps on the event
+    loop until `spin` seconds before each deadline, then busy-waits the rest.
+    If playback stops early (cancelled, sink error) the sounding notes get their Note Offs.
+
+    Returns {'messages', 'writes', 'seconds', 'jitter_ms': {'p50', 'p90', 'p99', 'max'}}.
+    """
+    clock = time.monotonic
+    seconds_per_tick = 60.0 / (tempo * resolution)
+    jitter = []
+    messages = 0
+    sounding = {} # (status & 0x0F, note) -> count, for the cleanup Note Offs
+    start = clock() + lead_in
+    try:
+        for tick, data in iter_messages(tracks, resolution):
+            deadline = start + tick * seconds_per_tick
+            delay = deadline - clock() - spin
+            if delay > 0:
+                await asyncio.sleep(delay)
+            while clock() < deadline:
+                pass
+            jitter.append(clock() - deadline)
+            sink.write(data)
+            messages += len(data) // 3
+            for i in range(0, len(data), 3):
+                key = (data[i] & 0x0F, data[i + 1])
+                if data[i] & 0xF0 == 0x90:
+                    sounding[key] = sounding.get(key, 0) + 1
+                elif sounding.get(key, 0) > 1:
+                    sounding[key] -= 1
+                else:
+                    sounding.pop(key, None)
+    finally:
+        if sounding:
+            try:
+                sink.write(b''.join(bytes((0x80 | channel, note, 0)) for channel, note in sounding))
+            except OSError:
+                pass
+
+    return {
+        'messages': messages,
+        'writes': len(jitter),
+        'seconds': round(clock() - start, 3),
+        'jitter_ms': jitter_report(jitter),
+    }
+
+def play_to(target, tracks, tempo, resolution=DEFAULT_RESOLUTION):
+    """Blocking helper: opens the sink named by target (see open_sink), plays, closes it."""
+    with open_sink(target) as sink:
+        return asyncio.run(play(tracks, sink, tempo, resolution))
@@ -0,0 +1,152 @@
+import functools
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Span instrumentation for the render pipeline (melody, chords, drums, MIDI encoding, base64).
+# Disabled by default: an instrumented call then costs one flag check. When enabled, every span
+# records its latency (and, with memory=True, its net tracemalloc allocation) into a rolling
+# window per stage; stats() summarizes the windows as percentiles.
+
+WINDOW = 2048 # Samples kept per stage
+
+class _State:
+    enabled = False
+    memory = False
+    started_tracing = False # Only stop tracemalloc if enable() started it
+
+_state = _State()
+_lock = threading.Lock()
+_stages = {} # name -> RollingHistogram
+
+class RollingHistogram:
+    """The last `window` samples of one stage plus a lifetime count."""
+    def __init__(self, window=WINDOW):
+        self.seconds = deque(maxlen=window)
+        self.alloc = deque(maxlen=window)
+        self.count = 0
+        # Worker threads add while get_stats summarizes, and a deque can't be iterated while it
+        # changes. One lock per stage, so spans of different stages don't contend.
+        self._lock = threading.Lock()
+
+    def add(self, seconds, alloc=None):
+        with self._lock:
+            self.seconds.append(seconds)
+            if alloc is not None:
+                self.alloc.append(alloc)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            ordered, alloc, count = list(self.seconds), list(self.alloc), self.count
+        ordered.sort()
+        if not ordered:
+            return {'count': count}
+        last = len(ordered) - 1
+        pick = lambda q: round(ordered[min(last, int(q * len(ordered)))] * 1000, 3)
+        summary = {
+            'count': count,
+            'p50_ms': pick(0.5),
+            'p95_ms': pick(0.95),
+            'p99_ms': pick(0.99),
+            'max_ms': round(ordered[-1] * 1000, 3),
+        }
+        if alloc:
+            alloc.sort()
+            summary['alloc_kb_p50'] = round(alloc[len(alloc) // 2] / 1024, 1)
+            summary['alloc_kb_max'] = round(alloc[-1] / 1024, 1)
+        return summary
+
+def enable(memory=False):
+    """Turns span recording on; memory=True also tracks net allocations per span (slower)."""
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state.started_tracing = True
+    _state.memory = memory
+    _state.enabled = True
+
+def disable():
+    _state.enabled = False
+    if _state.started_tracing:
+        tracemalloc.stop()
+        _state.started_tracing = False
+    _state.memory = False
+
+def is_enabled():
+    return _state.enabled
+
+def reset():
+    """Drops all recorded samples."""
+    with _lock:
+        _stages.clear()
+
+def record(name, seconds, alloc=None):
+    hist = _stages.get(name)
+    if hist is None:
+        with _lock:
+            hist = _stages.setdefault(name, RollingHistogram())
+    hist.add(seconds, alloc)
+
+class _Span:
+    __slots__ = ('name', 'start', 'mem')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.mem = tracemalloc.get_traced_memory()[0] if _state.memory else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        alloc = None
+        if self.mem is not None and tracemalloc.is_tracing():
+            alloc = max(0, tracemalloc.get_traced_memory()[0] - self.mem)
+        record(self.name, elapsed, alloc)
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def span(name):
+    """Context manager timing one stage: `with span('server.base64'): ...`"""
+    return _Span(name) if _state.enabled else _NULL_SPAN
+
+def timed(name):
+    """Decorator form of span() for a whole function or method."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def stats():
+    """{stage: {'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'[, 'alloc_kb_p50', 'alloc_kb_max']}}"""
+    with _lock:
+        stages = list(_stages.items())
+    return {name: hist.summary() for name, hist in sorted(stages)}
+
+def format_stats(summary=None):
+    """Plain-text table of stats() for the CLI."""
+    summary = stats() if summary is None else summary
+    lines = [f"{'Stage':<32} {'Count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'alloc KB':>9}"]
+    for name, s in summary.items():
+        if 'p50_ms' not in s:
+            continue
+        alloc = f"{s['alloc_kb_p50']:>9.1f}" if 'alloc_kb_p50' in s else f"{'-':>9}"
+        lines.append(f"{name:<32} {s['count']:>7} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} "
+                     f"{s['p99_ms']:>9.3f} {s['max_ms']:>9.3f} {alloc}")
+    return '\n'.join(lines)
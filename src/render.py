@@ -0,0 +1,15 @@
+from src.render_graph import RenderGraph
+
+def render_beat(key="C", scale="minor", tempo=140, bars=4, variation="B", add_chords=True, add_drums=True, seed=None,
+                style=None, time_signature='4/4', compact=False, midi_format=1, candidates=1, beam_width=0, markov_model=None):
+    """
+    Builds the beat and returns the raw MIDI file bytes. style names a preset from src/styles.py;
+    time_signature is e.g. '4/4' or '6/8'. compact and midi_format select the size-optimized
+    encoding and a single-track format 0 file (see MidiWriter). candidates > 1 picks the best
+    scoring of that many melodies, refined bar by bar when beam_width is set (see src/scoring.py).
+    markov_model is the path of a trained model (src/markov.py) to draw the melody from.
+    """
+    graph = RenderGraph(key, scale, tempo, bars, seed=seed, style=style, time_signature=time_signature,
+                        compact=compact, midi_format=midi_format, candidates=candidates, beam_width=beam_width,
+                        markov_model=markov_model)
+    return graph.to_midi((variation,), add_chords, add_drums)
@@ -0,0 +1,139 @@
+import io
+
+from src.generator import MelodyGenerator, derive_seed
+from src.markov import MarkovMelodyGenerator
+from src.accompaniment import ChordGenerator, DrumGenerator, CHORD_CHANNEL, DRUM_CHANNEL
+from src.midi_utils import MidiWriter, encode_note_events
+from src.profiling import timed
+from src.scoring import best_of_k, beam_search
+from src.timeline import PPQ, parse_time_signature, quarter_beats
+
+# (track name, channel) of the accompaniment parts, in file order after the melodies
+ACCOMPANIMENT = {
+    'chords': ("Chords", CHORD_CHANNEL),
+    'drums': ("Drums", DRUM_CHANNEL),
+}
+MELODY_CHANNEL = 0
+
+class RenderGraph:
+    """
+    The stages of one beat (each melody variation, the chord progression, the drum pattern and
+    the encoded bytes of every track), computed on first use and shared by every output built
+    from the graph. The variation files, a multi-track file and stems of the same beat all reuse
+    one chord and one drum part, generated and encoded once.
+
+    Scale tables and style samplers come from the process-wide caches (get_scale_table,
+    load_style), so the graph only holds what is specific to this beat.
+    """
+    def __init__(self, key="C", scale="minor", tempo=140, bars=4, seed=None, style=None, running_status=False,
+                 time_signature='4/4', compact=False, midi_format=1, candidates=1, beam_width=0, markov_model=None):
+        self.key = key
+        self.scale = scale
+        self.tempo = tempo
+        self.bars = bars
+        self.seed = seed
+        self.style = style
+        self.running_status = running_status or compact
+        self.compact = compact # Note offs as Note On velocity 0 (see MidiWriter)
+        self.midi_format = midi_format
+        # Melody search (src/scoring.py): the best of this many drawn melodies, refined bar by
+        # bar with a beam of beam_width prefixes when set
+        self.candidates = candidates
+        self.beam_width = beam_width
+        # A trained MarkovModel (or the path of one) draws the melodies instead (src/markov.py)
+        self.markov_model = markov_model
+        self.time_signature = parse_time_signature(time_signature)
+        self.resolution = PPQ
+        self._values = {}
+        self.built = [] # Stages in the order they were computed
+
+    def _stage(self, name, build):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        value = self._values[name] = build()
+        self.built.append(name)
+        return value
+
+    def melody(self, variation):
+        """NoteBuffer of one melody variation. Each variation has its own generator, so the
+        result doesn't depend on which other variations were built (or in which order).
+        With candidates > 1 it is the best scoring of that many melodies over the chords.
+        With a markov_model the melodies are drawn from it (the style then only shapes the
+        chords and drums)."""
+        def build():
+            # A seed per variation: the variations share no draws, so each has its own rhythm
+            seed = derive_seed(self.seed, f'melody:{variation}')
+            if self.markov_model is not None:
+                generator = MarkovMelodyGenerator(self.markov_model, self.key, self.scale, self.tempo,
+                                                  length_bars=self.bars, time_signature=self.time_signature, seed=seed)
+            else:
+                generator = MelodyGenerator(self.key, self.scale, self.tempo, length_bars=self.bars,
+                                            time_signature=self.time_signature, seed=seed, style=self.style)
+            if self.candidates <= 1:
+                return generator.generate_variation(variation)
+            if self.beam_width:
+                return beam_search(generator, variation, self.candidates, self.beam_width, self.chords())[1]
+            return best_of_k(generator, variation, self.candidates, chords=self.chords())[0][1]
+        return self._stage(('melody', variation), build)
+
+    def chords(self):
+        """NoteBuffer of the chord progression (whole note chords)."""
+        def build():
+            chord_gen = ChordGenerator(self.key, self.scale, seed=derive_seed(self.seed, 'chords'), style=self.style)
+            return chord_gen.progression_to_notes(chord_gen.generate_progression(self.bars),
+                                                  beats_per_bar=quarter_beats(*self.time_signature))
+        return self._stage('chords', build)
+
+    def drums(self):
+        """NoteBuffer of the drum pattern."""
+        def build():
+            drum_gen = DrumGenerator(self.tempo, seed=derive_seed(self.seed, 'drums'), style=self.style,
+                                     time_signature=self.time_signature)
+            return drum_gen.generate_pattern(self.bars)
+        return self._stage('drums', build)
+
+    def notes(self, part, variation=None):
+        """Notes of 'melody' (of a variation), 'chords' or 'drums'."""
+        if part == 'melody':
+            return self.melody(variation)
+        if part not in ACCOMPANIMENT:
+            raise ValueError(f"Unknown part: {part}")
+        return getattr(self, part)()
+
+    def track(self, part, variation=None):
+        """Encoded note events (track body without name and end of track) of one part."""
+        channel = MELODY_CHANNEL if part == 'melody' else ACCOMPANIMENT.get(part, (None, None))[1]
+        return self._stage(('track', part, variation), lambda: self._encode(self.notes(part, variation), channel))
+
+    @timed('midi.encode_track')
+    def _encode(self, notes, channel):
+        return encode_note_events(notes, self.resolution, channel, self.running_status, self.compact)
+
+    def writer(self, variations=('B',), add_chords=True, add_drums=True):
+        """
+        A MidiWriter with the tempo and time signature, a melody track per variation, then the
+        chords and drums tracks.
+        """
+        writer = MidiWriter(running_status=self.running_status, tempo=self.tempo, time_signature=self.time_signature,
+                            compact=self.compact, midi_format=self.midi_format)
+        for variation in variations:
+            writer.add_encoded_track(self.track('melody', variation), track_name=f"Melody Var {variation}")
+        for part, enabled in (('chords', add_chords), ('drums', add_drums)):
+            if enabled:
+                writer.add_encoded_track(self.track(part), track_name=ACCOMPANIMENT[part][0])
+        return writer
+
+    def to_midi(self, variations=('B',), add_chords=True, add_drums=True):
+        """
+        MIDI file bytes with the given melody variations (one track each) over the shared
+        accompaniment. ('A', 'B', 'C') puts every variation in one multi-track file; an empty
+        tuple with a single part enabled gives a stem.
+        """
+        buffer = io.BytesIO()
+        self.writer(variations, add_chords, add_drums).write_to_stream(buffer)
+        return buffer.getvalue()
+
+    def write_file(self, filename, variations=('B',), add_chords=True, add_drums=True):
+        self.writer(variations, add_chords, add_drums).write_file(filename)
@@ -0,0 +1,192 @@
+from functools import lru_cache
+import numpy as np
+
+from src.sampling import AliasSampler
+from src.timeline import PPQ, grid_ticks
+
+# Grid resolutions tried in order (units per beat): 16ths, 8th triplets, then shared grids
+GRIDS = (4, 3, 12, 24)
+# Enumeration stops keeping rhythms below this probability...
+MIN_PROBABILITY = 1e-9
+# ...and gives up on a meter with more rhythms than this, or that needs more search steps
+# (long bars): those are drawn note by note instead
+MAX_RHYTHMS = 100_000
+MAX_NODES = 500_000
+# Banks covering less probability mass are approximations (see RhythmBank.exact)
+EXACT_COVERAGE = 0.999
+
+def grid_units(durations):
+    """Smallest grid (units per beat) on which every duration (in beats) lies, or None."""
+    for units in GRIDS:
+        scaled = [d * units for d in durations]
+        if all(abs(s - round(s)) < 1e-3 and round(s) > 0 for s in scaled):
+            return units
+    return None
+
+def _enumerate(bar_units, parts, probs, min_probability, max_rhythms, max_nodes=MAX_NODES):
+    """
+    All bars generate_rhythm_pattern can produce: draws from parts until the bar is full,
+    the last one cut to fit. A bar (d1..dk) has probability p(d1)...p(dk-1) * P(draw >= dk).
+    Returns (rhythms, probabilities), or None if there are more than max_rhythms or the
+    search visits more than max_nodes partial bars.
+    """
+    tail = {}
+    for r in range(1, bar_units + 1):
+        tail[r] = sum(p for d, p in zip(parts, probs) if d >= r)
+
+    rhythms = []
+    weights = []
+    stack = [(0, 1.0, ())]
+    nodes = 0
+    while stack:
+        nodes += 1
+        if nodes > max_nodes:
+            return None
+        filled, p, seq = stack.pop()
+        remaining = bar_units - filled
+        q = p * tail[remaining]
+        if q >= min_probability:
+            rhythms.append(seq + (remaining,))
+            weights.append(q)
+            if len(rhythms) > max_rhythms:
+                return None
+        for d, pd in zip(parts, probs):
+            if d < remaining and p * pd >= min_probability:
+                stack.append((filled + d, p * pd, seq + (d,)))
+    return rhythms, weights
+
+class RhythmBank:
+    """
+    Indexed bank of every bar rhythm a duration table can produce for one meter,
+    with its sampling probability and features, so drawing a bar is one O(1) lookup.
+
+    Arrays (one row per rhythm):
+        durations: (n, bar_units) durations in grid units, 0-padded
+        length: notes per bar
+        probability: chance generate_rhythm_pattern builds this bar (renormalized)
+        density: notes per grid slot (1.0 = a note on every slot)
+        syncopation: share of beats (after the first) with no onset of their own
+                     that are held over from a note started off the beat
+    """
+    def __init__(self, durations, probability, beats_per_bar, units_per_beat, coverage=1.0):
+        self.durations = durations
+        self.beats_per_bar = beats_per_bar
+        self.units_per_beat = units_per_beat
+        self.coverage = coverage
+        self.length = (durations > 0).sum(axis=1)
+        self.probability = probability / probability.sum()
+
+        bar_units = durations.shape[1]
+        onsets = np.zeros((len(durations), bar_units + 1), dtype=bool)
+        starts = np.cumsum(durations, axis=1) - durations
+        rows = np.repeat(np.arange(len(durations)), durations.shape[1])
+        onsets[rows, np.where(durations > 0, starts, bar_units).ravel()] = True
+        onsets = onsets[:, :bar_units]
+        self.density = self.length / bar_units
+
+        # A beat is anticipated when it has no onset and the most recent onset was off the beat
+        last_onset = np.maximum.accumulate(np.where(onsets, np.arange(bar_units), 0), axis=1)
+        beat_pos = np.arange(units_per_beat, bar_units, units_per_beat)
+        if len(beat_pos):
+            held = ~onsets[:, beat_pos] & (last_onset[:, beat_pos] % units_per_beat != 0)
+            self.syncopation = held.sum(axis=1) / len(beat_pos)
+        else:
+            self.syncopation = np.zeros(len(durations))
+
+        self._sampler = None
+        self._queries = {}
+        self._patterns = {}
+
+    @property
+    def exact(self):
+        """True when the bank holds (nearly) all of the probability mass."""
+        return self.coverage >= EXACT_COVERAGE
+
+    def __len__(self):
+        return len(self.durations)
+
+    @property
+    def sampler(self):
+        if self._sampler is None:
+            self._sampler = AliasSampler(range(len(self)), self.probability)
+        return self._sampler
+
+    def pattern(self, i):
+        """Rhythm i as a list of durations in beats."""
+        return [t / PPQ for t in self.pattern_ticks(i)]
+
+    def pattern_ticks(self, i, resolution=PPQ):
+        """Rhythm i as a tuple of durations in ticks (exact: the grid divides the resolution)."""
+        key = (i, resolution)
+        pattern = self._patterns.get(key)
+        if pattern is None:
+            unit = grid_ticks(self.units_per_beat, resolution)
+            pattern = self._patterns[key] = tuple(d * unit for d in self.durations[i, :self.length[i]].tolist())
+        return pattern
+
+    def sample(self, rng):
+        """One weighted draw (random.Random) as a list of durations in beats."""
+        return self.pattern(self.sampler.draw(rng))
+
+    def sample_ticks(self, rng, resolution=PPQ):
+        """One weighted draw (random.Random) as a tuple of durations in ticks."""
+        return self.pattern_ticks(self.sampler.draw(rng), resolution)
+
+    def sample_indices(self, size, np_rng):
+        """Vectorized draws of rhythm indices (NumPy Generator)."""
+        return self.sampler.sample_indices(size, np_rng)
+
+    def query(self, density=None, syncopation=None):
+        """
+        Sub-bank of the rhythms whose features fall in the given (min, max) ranges,
+        e.g. bank.query(density=(0.6, 0.8)). Probabilities are renormalized; results are cached.
+        """
+        key = (density, syncopation)
+        sub = self._queries.get(key)
+        if sub is None:
+            keep = np.ones(len(self), dtype=bool)
+            for values, bounds in ((self.density, density), (self.syncopation, syncopation)):
+                if bounds is not None:
+                    keep &= (values >= bounds[0] - 1e-9) & (values <= bounds[1] + 1e-9)
+            if not keep.any():
+                raise ValueError(f"No rhythms with density={density}, syncopation={syncopation}")
+            mass = self.probability[keep].sum()
+            sub = RhythmBank(self.durations[keep], self.probability[keep], self.beats_per_bar,
+                             self.units_per_beat, self.coverage * mass)
+            self._queries[key] = sub
+        return sub
+
+    def __repr__(self):
+        return (f"RhythmBank({len(self)} rhythms, {self.beats_per_bar} beats, "
+                f"{self.units_per_beat} units/beat, coverage={self.coverage:.4f})")
+
+@lru_cache(maxsize=64)
+def _build(durations, weights, beats_per_bar):
+    units_per_beat = grid_units(durations)
+    if units_per_beat is None:
+        raise ValueError(f"Durations {durations} do not fit a 16th or triplet grid")
+    bar_units = int(round(beats_per_bar * units_per_beat))
+    if bar_units <= 0 or abs(bar_units - beats_per_bar * units_per_beat) > 1e-6:
+        raise ValueError(f"{beats_per_bar} beats is not a whole number of grid units")
+    parts = [int(round(d * units_per_beat)) for d in durations]
+    total = sum(weights)
+    probs = [w / total for w in weights]
+
+    result = _enumerate(bar_units, parts, probs, MIN_PROBABILITY, MAX_RHYTHMS)
+    if result is None:
+        return None
+    rhythms, weights = result
+
+    matrix = np.zeros((len(rhythms), bar_units), dtype=np.int32)
+    for i, rhythm in enumerate(rhythms):
+        matrix[i, :len(rhythm)] = rhythm
+    probability = np.asarray(weights)
+    return RhythmBank(matrix, probability, beats_per_bar, units_per_beat, coverage=float(probability.sum()))
+
+def get_rhythm_bank(durations, weights, beats_per_bar=4):
+    """
+    Shared bank of bar rhythms for a duration table (beats) and weights, built once per process.
+    beats_per_bar must be a whole number of grid units. Returns None when the bar has too many
+    rhythms to index (see MAX_RHYTHMS); callers then draw it note by note.
+    """
+    return _build(tuple(float(d) for d in durations), tuple(float(w) for w in weights), beats_per_bar)
@@ -0,0 +1,162 @@
+from functools import lru_cache
+
+class AliasSampler:
+    """
+    Weighted sampler using Vose's alias method: O(n) setup, then O(1) per draw
+    (one uniform number) instead of rebuilding cumulative weights like random.choices.
+
+    Instances are immutable and shared; draw with any random.Random (draw/draw_many)
+    or in bulk with a NumPy Generator (sample).
+    """
+    __slots__ = ('values', 'prob', 'alias', 'n', '_np_tables')
+
+    def __init__(self, values, weights):
+        values = tuple(values)
+        weights = [float(w) for w in weights]
+        if len(values) != len(weights) or not values:
+            raise ValueError("values and weights must be non-empty and the same length")
+        total = sum(weights)
+        if total <= 0 or min(weights) < 0:
+            raise ValueError("weights must be non-negative with a positive sum")
+
+        n = len(values)
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to rounding
+
+        self.values = values
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+        self.n = n
+        self._np_tables = None
+
+    def draw(self, rng):
+        """One weighted draw using a random.Random (or anything with .random())."""
+        x = rng.random() * self.n
+        i = int(x)
+        if x - i < self.prob[i]:
+            return self.values[i]
+        return self.values[self.alias[i]]
+
+    def draw_many(self, k, rng):
+        """k draws as a list, using a random.Random."""
+        draw = self.draw
+        return [draw(rng) for _ in range(k)]
+
+    def sample_indices(self, size, np_rng):
+        """Vectorized draws of value indices (NumPy array of the given shape)."""
+        import numpy as np
+        if self._np_tables is None:
+            self._np_tables = (np.asarray(self.prob), np.asarray(self.alias))
+        prob, alias = self._np_tables
+        x = np_rng.random(size) * self.n
+        i = x.astype(np.int64)
+        return np.where(x - i < prob[i], i, alias[i])
+
+    def sample(self, size, np_rng):
+        """Vectorized draws of values (NumPy array of the given shape)."""
+        import numpy as np
+        return np.asarray(self.values)[self.sample_indices(size, np_rng)]
+
+    def probability(self, value):
+        """Probability of drawing value (for checks and tests)."""
+        total = 0.0
+        for i in range(self.n):
+            if self.values[i] == value:
+                total += self.prob[i]
+            if self.values[self.alias[i]] == value:
+                total += 1.0 - self.prob[i]
+        return total / self.n
+
+@lru_cache(maxsize=None)
+def _compiled(values, weights):
+    return AliasSampler(values, weights)
+
+def get_sampler(values, weights):
+    """Returns the shared compiled sampler for a (values, weights) table."""
+    return _compiled(tuple(values), tuple(float(w) for w in weights))
+
+# Step counts up to this are enumerated into one AliasSampler (2 ** steps outcomes); longer
+# patterns (e.g. 32nd-note hats) flip one coin per step instead, up to MAX_BERNOULLI_STEPS
+ENUMERATE_MAX_STEPS = 12
+MAX_BERNOULLI_STEPS = 32
+
+class _HitMasks:
+    """Read-only sequence of the 2 ** steps hit masks: mask i hits step k when bit k of i is set."""
+    __slots__ = ('steps',)
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def __len__(self):
+        return 1 << self.steps
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return tuple(bool(i >> k & 1) for k in range(self.steps))
+
+class BernoulliSampler:
+    """
+    Independent hit probabilities sampled one coin per step, with the same interface and
+    outcome indexing as the enumerated sampler from bernoulli_sampler (values, draw,
+    draw_many, sample_indices, probability).
+    """
+    __slots__ = ('probabilities', 'values', 'n')
+
+    def __init__(self, probabilities):
+        self.probabilities = tuple(probabilities)
+        self.values = _HitMasks(len(self.probabilities))
+        self.n = len(self.values)
+
+    def draw(self, rng):
+        return tuple(rng.random() < p for p in self.probabilities)
+
+    def draw_many(self, k, rng):
+        draw = self.draw
+        return [draw(rng) for _ in range(k)]
+
+    def sample_indices(self, size, np_rng):
+        import numpy as np
+        shape = (size,) if isinstance(size, int) else tuple(size)
+        hits = np_rng.random(shape + (len(self.probabilities),)) < np.asarray(self.probabilities)
+        return (hits.astype(np.int64) << np.arange(len(self.probabilities))).sum(axis=-1)
+
+    def probability(self, value):
+        total = 1.0
+        for hit, p in zip(value, self.probabilities):
+            total *= p if hit else 1.0 - p
+        return total
+
+def bernoulli_sampler(probabilities):
+    """
+    Compiles independent hit probabilities (e.g. one per drum step) into a single sampler
+    over all hit combinations, so a whole pattern of coin flips costs one draw.
+    Values are tuples of booleans. Up to ENUMERATE_MAX_STEPS steps the 2 ** len combinations
+    are enumerated; longer patterns get a BernoulliSampler (one coin per step).
+    """
+    probabilities = tuple(float(p) for p in probabilities)
+    if len(probabilities) > MAX_BERNOULLI_STEPS:
+        raise ValueError(f"At most {MAX_BERNOULLI_STEPS} steps per pattern (got {len(probabilities)})")
+    if len(probabilities) > ENUMERATE_MAX_STEPS:
+        return BernoulliSampler(probabilities)
+    combos = []
+    weights = []
+    for mask in range(1 << len(probabilities)):
+        hits = tuple(bool(mask >> k & 1) for k in range(len(probabilities)))
+        w = 1.0
+        for hit, p in zip(hits, probabilities):
+            w *= p if hit else 1.0 - p
+        combos.append(hits)
+        weights.append(w)
+    return get_sampler(combos, weights)
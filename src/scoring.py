@@ -0,0 +1,209 @@
+import numpy as np
+
+from src.notes import NoteBuffer, DEFAULT_RESOLUTION
+from src.profiling import timed
+
+# Best-of-K melody search. generate_batch draws K melodies at once as (K, notes) arrays, every
+# metric below is computed for all of them in one pass, and the top scorers are returned.
+# beam_search then rebuilds the melody bar by bar from the best candidates' bars, keeping the
+# beam_width highest scoring prefixes after each bar (scored over a sliding phrase window).
+#
+# Each metric is a score in [0, 1]; the total is their weighted mean (DEFAULT_WEIGHTS).
+#   stepwise    - share of melodic intervals that are a scale step
+#   range       - 1 while the melody spans TARGET_RANGE semitones, less the further outside
+#   stable      - share of bar downbeats (and the last note) that land on a stable tone
+#   density     - 1 while notes per beat are within TARGET_DENSITY
+#   chord_tones - duration-weighted share of notes in the chord of their bar (needs chords)
+#   repetition  - share of interval pairs that recur somewhere else in the melody (motifs)
+DEFAULT_WEIGHTS = {
+    'stepwise': 1.0,
+    'range': 1.0,
+    'stable': 1.0,
+    'density': 0.5,
+    'chord_tones': 1.5,
+    'repetition': 1.0,
+}
+TARGET_RANGE = (7, 14) # Semitones: a fifth to a ninth
+TARGET_DENSITY = (1.0, 3.0) # Sounding notes per beat
+SLOTS_PER_BEAT = 4 # generate_batch rhythms are on the 16th grid
+WINDOW_BARS = 4 # Bars beam_search scores per step (a phrase)
+
+def _band(values, low, high, width):
+    """1 inside [low, high], falling linearly to 0 at `width` outside."""
+    below = np.clip((low - values) / width, 0, 1)
+    above = np.clip((values - high) / width, 0, 1)
+    return 1.0 - np.maximum(below, above)
+
+def chord_pitch_classes(chords, bar_ticks, bars):
+    """(bars, 12) bool: the pitch classes sounding in each bar of a chord NoteBuffer."""
+    table = np.zeros((bars, 12), dtype=bool)
+    pitch, start, _, _, _ = chords.as_numpy()
+    bar = start // bar_ticks
+    keep = bar < bars
+    table[bar[keep], pitch[keep] % 12] = True
+    return table
+
+class MelodyScorer:
+    """
+    Vectorized melody metrics for one MelodyGenerator's key, scale and meter.
+    chords: NoteBuffer of the progression the melody plays over (enables 'chord_tones').
+    weights: overrides of DEFAULT_WEIGHTS (0 drops a metric).
+    """
+    def __init__(self, generator, chords=None, weights=None):
+        self.beats_per_bar = generator.beats_per_bar
+        self.bars = generator.length_bars
+        stable = set(generator.stable_notes)
+        self.stable = np.array([n in stable for n in generator.scale_notes], dtype=bool)
+        self.num_scale = len(generator.scale_notes)
+        self.chords = None
+        if chords is not None:
+            self.chords = chord_pitch_classes(chords, generator.bar_ticks, self.bars)
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        if self.chords is None:
+            self.weights['chord_tones'] = 0.0
+
+    def metrics(self, pitch, scale_index, offset, duration, mask, beats=None):
+        """
+        Every metric for n melodies given as (n, slots) arrays (offset and duration in beats,
+        mask marks sounding notes, in time order within a row). beats: length of the melodies
+        (default: the generator's). Returns {name: (n,) array}.
+        """
+        beats = beats or self.bars * self.beats_per_bar
+        n, width = pitch.shape
+        # Sounding notes first in each row, so neighbours are consecutive notes
+        order = np.argsort(~mask, axis=1, kind='stable')
+        pitch = np.take_along_axis(pitch, order, axis=1)
+        index = np.take_along_axis(scale_index, order, axis=1)
+        offset = np.take_along_axis(offset, order, axis=1)
+        duration = np.take_along_axis(duration, order, axis=1)
+        count = mask.sum(axis=1)
+        valid = np.arange(width)[None, :] < count[:, None]
+
+        steps = np.diff(index, axis=1)
+        step_valid = valid[:, 1:]
+        num_steps = np.maximum(step_valid.sum(axis=1), 1)
+        stepwise = ((np.abs(steps) == 1) & step_valid).sum(axis=1) / num_steps
+
+        high = np.where(valid, pitch, -1).max(axis=1, initial=-1)
+        low = np.where(valid, pitch, 128).min(axis=1, initial=128)
+        span = np.where(count > 0, high - low, 0)
+        pitch_range = _band(span, *TARGET_RANGE, 12.0)
+
+        # Landings: notes on a bar downbeat, and the last note
+        landing = valid & ((offset % self.beats_per_bar == 0) | (np.arange(width)[None, :] == count[:, None] - 1))
+        stable = (landing & self.stable[index]).sum(axis=1) / np.maximum(landing.sum(axis=1), 1)
+
+        density = _band(count / max(beats, 1), *TARGET_DENSITY, 1.0) # 0 bars: no notes, not NaN
+
+        if self.chords is not None:
+            bar = np.clip((offset // self.beats_per_bar).astype(np.int64), 0, len(self.chords) - 1)
+            weight = np.where(valid, duration, 0.0)
+            chord_tones = (weight * self.chords[bar, pitch % 12]).sum(axis=1) / np.maximum(weight.sum(axis=1), 1e-9)
+        else:
+            chord_tones = np.zeros(n)
+
+        # Interval pairs as one code each; invalid pairs get distinct negative codes
+        if width >= 3:
+            span_codes = 2 * self.num_scale + 1
+            codes = (steps[:, :-1] + self.num_scale) * span_codes + (steps[:, 1:] + self.num_scale)
+            pair_valid = valid[:, 2:]
+            codes = np.where(pair_valid, codes, -1 - np.arange(width - 2)[None, :])
+            ordered = np.sort(codes, axis=1)
+            same = ordered[:, 1:] == ordered[:, :-1]
+            repeated = np.zeros(ordered.shape, dtype=bool)
+            repeated[:, 1:] |= same
+            repeated[:, :-1] |= same
+            repetition = (repeated & (ordered >= 0)).sum(axis=1) / np.maximum(pair_valid.sum(axis=1), 1)
+        else:
+            repetition = np.zeros(n)
+
+        return {'stepwise': stepwise, 'range': pitch_range, 'stable': stable, 'density': density,
+                'chord_tones': chord_tones, 'repetition': repetition}
+
+    def total(self, metrics):
+        """Weighted mean of a metrics() dict: (n,) scores in [0, 1]."""
+        weight_sum = sum(self.weights.values()) or 1.0
+        return sum(metrics[name] * w for name, w in self.weights.items() if w) / weight_sum
+
+    @timed('melody.score')
+    def score(self, batch):
+        """(n,) total scores of a MelodyBatch."""
+        return self.total(self.metrics(batch.pitch, batch.scale_index, batch.offset, batch.duration, batch.mask))
+
+@timed('melody.best_of_k')
+def best_of_k(generator, variation='A', candidates=64, top=1, chords=None, weights=None, seed=None):
+    """
+    Draws `candidates` melodies with generator.generate_batch and returns the `top` best as
+    [(score, NoteBuffer)], best first. The batch comes from the generator's RNG unless a seed
+    is given, so a seeded generator always picks the same melodies.
+    """
+    batch = generator.generate_batch(candidates, variation, seed=seed)
+    scores = MelodyScorer(generator, chords, weights).score(batch)
+    best = np.argsort(-scores, kind='stable')[:top]
+    return [(float(scores[i]), batch.melody(i)) for i in best]
+
+def _bar_grid(batch, slots_per_bar, bars):
+    """(pitch, scale_index, duration, velocity, mask), each (n, bars, slots_per_bar): every
+    sounding note of the batch in the 16th slot it starts on."""
+    n = len(batch)
+    rows, cols = np.nonzero(batch.mask)
+    slots = np.rint(batch.offset[rows, cols] * SLOTS_PER_BEAT).astype(np.int64)
+    grids = []
+    for values, dtype in ((batch.pitch, np.int64), (batch.scale_index, np.int64),
+                          (batch.duration, np.float64), (batch.velocity, np.int64)):
+        grid = np.zeros((n, bars * slots_per_bar), dtype=dtype)
+        grid[rows, slots] = values[rows, cols]
+        grids.append(grid.reshape(n, bars, slots_per_bar))
+    mask = np.zeros((n, bars * slots_per_bar), dtype=bool)
+    mask[rows, slots] = True
+    grids.append(mask.reshape(n, bars, slots_per_bar))
+    return grids
+
+@timed('melody.beam_search')
+def beam_search(generator, variation='A', candidates=64, beam_width=8, chords=None, weights=None, seed=None):
+    """
+    Refines best_of_k bar by bar. Each beam (a melody prefix) is extended by the next bar of
+    each of the best 4 * beam_width candidates and every extension is scored at once, over its
+    last WINDOW_BARS bars so a step costs the same however long the melody is. Beams keep the
+    sum of their window scores; the beam_width best survive each bar, and the finished beams
+    are ranked by their full score. Returns (score, NoteBuffer) of the best melody.
+    """
+    batch = generator.generate_batch(candidates, variation, seed=seed)
+    scorer = MelodyScorer(generator, chords, weights)
+    pool = np.argsort(-scorer.score(batch), kind='stable')[:4 * beam_width]
+
+    bars = generator.length_bars
+    slots_per_bar = int(generator.beats_per_bar * SLOTS_PER_BEAT)
+    pitch, index, duration, velocity, mask = _bar_grid(batch, slots_per_bar, bars)
+    slot_offsets = np.arange(bars * slots_per_bar) / SLOTS_PER_BEAT
+
+    def rows(choices, first_bar, last_bar):
+        # The chosen candidates' notes over bars first_bar..last_bar, as (beams, slots) arrays
+        used = np.arange(first_bar, last_bar + 1)
+        width = len(used) * slots_per_bar
+        take = lambda grid: grid[choices[:, first_bar:last_bar + 1], used].reshape(len(choices), width)
+        offsets = np.broadcast_to(slot_offsets[first_bar * slots_per_bar:(last_bar + 1) * slots_per_bar],
+                                  (len(choices), width))
+        return (take(pitch), take(index), offsets, take(duration), take(mask)), len(used) * generator.beats_per_bar
+
+    beams = np.zeros((1, 0), dtype=np.int64) # Candidate chosen for each bar so far
+    totals = np.zeros(1)
+    for bar in range(bars):
+        expanded = np.concatenate((np.repeat(beams, len(pool), axis=0),
+                                   np.tile(pool, len(beams))[:, None]), axis=1)
+        window, beats = rows(expanded, max(0, bar - WINDOW_BARS + 1), bar)
+        scores = np.repeat(totals, len(pool)) + scorer.total(scorer.metrics(*window, beats=beats))
+        keep = np.argsort(-scores, kind='stable')[:beam_width]
+        beams, totals = expanded[keep], scores[keep]
+
+    full, _ = rows(beams, 0, bars - 1)
+    scores = scorer.total(scorer.metrics(*full))
+    best = int(np.argmax(scores))
+    pitch_row, _, offsets, duration_row, mask_row = (column[best] for column in full)
+    velocity_row = velocity[beams[best], np.arange(bars)].reshape(-1)
+    return float(scores[best]), NoteBuffer.from_columns(
+        pitch_row[mask_row],
+        np.rint(offsets[mask_row] * DEFAULT_RESOLUTION).astype(np.int64),
+        np.rint(duration_row[mask_row] * DEFAULT_RESOLUTION).astype(np.int64),
+        velocity_row[mask_row],
+    )
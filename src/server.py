@@ -1,5 +1,6 @@
-from mcp.server.fastmcp import FastMCP
-import io
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+import asyncio
 import base64
 import os
 import sys
@@ -7,18 +8,188 @@ import sys
 # Allow imports from project root when running directly
 sys.path.append(os.getcwd())
 
-from src.generator import MelodyGenerator
-from src.midi_utils import MidiWriter
-from src.accompaniment import ChordGenerator, DrumGenerator
+from src.music_theory import get_note_index, normalize_scale_type
+from src.cache import ResultCache
+from src.timeline import parse_time_signature
+from src import profiling
+# Aliased: generate_beat's `delivery` argument would shadow the module
+from src import delivery as delivery_mod
 
-# Initialize MCP Server
-mcp = FastMCP("Beat Starter Composer")
+# The MCP SDK (about a second to import) and the generator stack are loaded on first use:
+# importing this module for its tools stays cheap, and the server builds in create_server().
+SERVER_NAME = "Beat Starter Composer"
+TOOLS = [] # Functions registered as MCP tools by create_server()
+RESOURCES = [] # (uri template, mime type, function) registered as MCP resources
+_server = None
 
-@mcp.tool()
-def generate_beat(key: str = "C", scale: str = "minor", tempo: int = 140, bars: int = 4, variation: str = "B", add_chords: bool = True, add_drums: bool = True) -> str:
+def tool(func):
+    """Marks a function as an MCP tool."""
+    TOOLS.append(func)
+    return func
+
+def resource(uri, mime_type=None):
+    """Marks a function as an MCP resource (or resource template) at uri."""
+    def register(func):
+        RESOURCES.append((uri, mime_type, func))
+        return func
+    return register
+
+def create_server():
+    """The FastMCP server with every tool registered (built once)."""
+    global _server
+    if _server is None:
+        from mcp.server.fastmcp import FastMCP
+        _server = FastMCP(SERVER_NAME)
+        for func in TOOLS:
+            _server.tool()(func)
+        for uri, mime_type, func in RESOURCES:
+            _server.resource(uri, mime_type=mime_type)(func)
+    return _server
+
+def __getattr__(name):
+    # `server.mcp` (e.g. for `mcp run src/server.py`) builds the server on first access
+    if name == 'mcp':
+        return create_server()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Seeded results are deterministic, so identical requests are served from here
+RESULT_CACHE = ResultCache(max_bytes=64 * 1024 * 1024)
+
+# Rendering is CPU-bound, so it runs on a worker pool and the event loop stays free.
+# BEAT_WORKER_MODE: 'thread' (default, low overhead) or 'process' (true parallelism).
+# BEAT_WORKERS: pool size (default: CPU count).
+# Both are read when the pool is first needed (get_executor), so a bad value fails the
+# first render with a clear message instead of the import.
+MAX_BATCH_SIZE = 64
+# Melody search limits per request (see src/scoring.py), to keep a call interactive
+MAX_CANDIDATES = 4096
+MAX_BEAM_WIDTH = 32
+MAX_CANDIDATE_BARS = 4096 * 64 # candidates x bars (the batch holds every candidate's notes)
+# BEAT_PROFILE: '1' (default) records per-stage latencies for get_stats, 'memory' adds
+# tracemalloc allocation sizes, '0' turns instrumentation off.
+PROFILE_MODE = os.environ.get('BEAT_PROFILE', '1')
+
+_executor = None
+
+def _env_workers():
+    """BEAT_WORKERS as a pool size (None: CPU count)."""
+    value = os.environ.get('BEAT_WORKERS', '').strip()
+    try:
+        workers = int(value or '0')
+    except ValueError:
+        raise ValueError(f"BEAT_WORKERS must be a whole number of workers (got {value!r})") from None
+    if workers < 0:
+        raise ValueError(f"BEAT_WORKERS must not be negative (got {value!r})")
+    return workers or None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        configure_workers(os.environ.get('BEAT_WORKER_MODE', 'thread'), _env_workers())
+    return _executor
+
+def configure_workers(mode='thread', workers=None):
+    """(Re)creates the render worker pool. mode is 'thread' or 'process'."""
+    global _executor
+    if mode not in ('thread', 'process'):
+        raise ValueError(f"Unknown worker mode: {mode}")
+    old = _executor
+    workers = workers or os.cpu_count() or 1
+    if mode == 'process':
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='beat-render')
+    if old is not None:
+        old.shutdown(wait=False)
+
+@dataclass
+class BeatRequest:
+    """Parameters of one beat (see generate_beat)."""
+    key: str = "C"
+    scale: str = "minor"
+    tempo: int = 140
+    bars: int = 4
+    variation: str = "B"
+    add_chords: bool = True
+    add_drums: bool = True
+    seed: int | None = None
+    style: str = "default"
+    time_signature: str = "4/4"
+    compact: bool = False
+    midi_format: int = 1
+    candidates: int = 1
+    beam_width: int = 0
+
+def _cache_key(key, scale, tempo, bars, variation, add_chords, add_drums, seed, style, time_signature, compact,
+               midi_format, candidates, beam_width):
+    """Canonical request key: enharmonic keys and scale spellings that render identically share an entry."""
+    try:
+        root_idx = get_note_index(key)
+    except ValueError:
+        root_idx = 0
+    from src.styles import style_version
+    # The preset file's version too, so an edited preset isn't served from old results
+    return (root_idx, normalize_scale_type(scale), tempo, bars, variation, bool(add_chords), bool(add_drums), seed, style,
+            style_version(style), time_signature, bool(compact), midi_format, candidates, beam_width if candidates > 1 else 0)
+
+def _check_search(params):
+    """Rejects requests that are invalid or too costly before they reach a worker."""
+    parse_time_signature(params['time_signature'])
+    # Clients pick bundled presets by name; paths (accepted by the CLI) are not allowed here
+    style = params['style']
+    if style is not None and (not isinstance(style, str) or os.path.basename(style) != style
+                              or style.startswith('.') or style.endswith('.json')):
+        raise ValueError(f"Unknown style preset: {style!r}")
+    if not 1 <= params['candidates'] <= MAX_CANDIDATES:
+        raise ValueError(f"candidates must be between 1 and {MAX_CANDIDATES} (got {params['candidates']})")
+    if not 0 <= params['beam_width'] <= MAX_BEAM_WIDTH:
+        raise ValueError(f"beam_width must be between 0 and {MAX_BEAM_WIDTH} (got {params['beam_width']})")
+    if params['candidates'] > 1 and params['candidates'] * params['bars'] > MAX_CANDIDATE_BARS:
+        raise ValueError(f"candidates x bars must be at most {MAX_CANDIDATE_BARS} "
+                         f"(got {params['candidates']} x {params['bars']})")
+
+def render_beat_b64(params):
+    """Renders one beat (params as in generate_beat) to a base64 string. Runs on a worker."""
+    from src.render import render_beat
+    with profiling.span('server.render'):
+        midi_bytes = render_beat(**params)
+
+    # Encode to Base64
+    with profiling.span('server.base64'):
+        return base64.b64encode(midi_bytes).decode('utf-8')
+
+async def _generate(params):
+    """Serves a request from cache, or renders it on the worker pool without blocking the event loop."""
+    with profiling.span('server.generate_beat'):
+        cache_key = None
+        if params['seed'] is not None:
+            cache_key = _cache_key(**params)
+            cached = RESULT_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+
+        loop = asyncio.get_running_loop()
+        b64_string = await loop.run_in_executor(get_executor(), render_beat_b64, params)
+
+        if cache_key is not None:
+            RESULT_CACHE.put(cache_key, b64_string)
+
+        return b64_string
+
+async def _deliver(params, mode):
+    """Renders a request to a file in the output directory on the worker pool (see src/delivery.py)."""
+    if mode not in delivery_mod.DELIVERY_MODES:
+        raise ValueError(f"Unknown delivery mode: {mode} (expected one of {', '.join(delivery_mod.DELIVERY_MODES)})")
+    loop = asyncio.get_running_loop()
+    # The directory is passed along so process workers write where this process reads
+    return await loop.run_in_executor(get_executor(), delivery_mod.deliver, params, mode, delivery_mod.OUTPUT_DIR)
+
+@tool
+async def generate_beat(key: str = "C", scale: str = "minor", tempo: int = 140, bars: int = 4, variation: str = "B", add_chords: bool = True, add_drums: bool = True, seed: int | None = None, style: str = "default", time_signature: str = "4/4", compact: bool = False, midi_format: int = 1, candidates: int = 1, beam_width: int = 0, delivery: str = "base64") -> str | dict:
     """
     Generates a MIDI beat starter with optional chords and drums.
-    Returns a base64 encoded MIDI string.
+    Returns a base64 encoded MIDI string, or for the other delivery modes a dict with the
+    file's path, resource URI (beat://files/<name>), size in bytes and render time in ms.
 
     Args:
         key: The musical key (e.g., "C", "F#").
@@ -28,47 +199,90 @@ def generate_beat(key: str = "C", scale: str = "minor", tempo: int = 140, bars:
         variation: Melody style ('A' for Smooth, 'B' for Trap, 'C' for Motivic).
         add_chords: Whether to include a backing chord progression.
         add_drums: Whether to include a drum pattern.
+        seed: Optional random seed. The same seed and arguments always return the same beat
+              (served from cache when possible).
+        style: Style preset with rhythm, step and drum probabilities ('default', 'lofi', ...),
+               by name; file paths are not accepted.
+        time_signature: Meter of the beat ('4/4', '3/4', '6/8', ...). The numerator must be 1-32
+                        and the denominator a power of two up to 32.
+        compact: Size-optimized encoding (running status, note offs as zero-velocity note ons),
+                 about a quarter smaller. Any MIDI reader plays it the same.
+        midi_format: 1 (a track per part) or 0 (all parts merged into one track; smaller for
+                     short beats, needed by some hardware players).
+        candidates: Draw this many melodies and keep the best scoring one (stepwise motion,
+                    range, stable landings, density, chord tones, motif repetition). Up to
+                    MAX_CANDIDATES; a few hundred cost milliseconds.
+        beam_width: With candidates > 1, also refine the melody bar by bar keeping this many
+                    best partial melodies (slower; 8 is a good start).
+        delivery: 'base64' (inline MIDI), 'file' (written to BEAT_OUTPUT_DIR), 'zip' (all three
+                  variations plus melody / chord / drum stems in one archive; variation is ignored)
+                  or 'chunks' (like 'file', fetched piecewise with read_beat_chunk). Use a file
+                  mode for long beats to keep responses small.
     """
+    params = asdict(BeatRequest(key=key, scale=scale, tempo=tempo, bars=bars, variation=variation,
+                                add_chords=add_chords, add_drums=add_drums, seed=seed, style=style,
+                                time_signature=time_signature, compact=compact, midi_format=midi_format,
+                                candidates=candidates, beam_width=beam_width))
+    _check_search(params)
+    if delivery == 'base64':
+        return await _generate(params)
+    return await _deliver(params, delivery)
 
-    # 1. Generate Melody
-    generator = MelodyGenerator(key, scale, tempo, length_bars=bars)
-    melody = generator.generate_variation(variation)
-
-    writer = MidiWriter()
-
-    # Track 1: Melody (Channel 0)
-    writer.add_track(melody, track_name=f"Melody Var {variation}", channel=0)
-
-    # Track 2: Chords (Channel 1)
-    if add_chords:
-        chord_gen = ChordGenerator(key, scale)
-        progression_notes = chord_gen.generate_progression(bars)
-        chord_events = []
-        for bar_idx, notes in enumerate(progression_notes):
-            for n in notes:
-                chord_events.append({
-                    'note': n,
-                    'duration': 4.0, # Whole note chords
-                    'velocity': 80,
-                    'offset': bar_idx * 4.0
-                })
-        writer.add_track(chord_events, track_name="Chords", channel=1)
-
-    # Track 3: Drums (Channel 9)
-    if add_drums:
-        drum_gen = DrumGenerator(tempo)
-        drum_events = drum_gen.generate_pattern(bars)
-        writer.add_track(drum_events, track_name="Drums", channel=9)
-
-    # Write to Memory Buffer
-    buffer = io.BytesIO()
-    writer.write_to_stream(buffer)
-    midi_bytes = buffer.getvalue()
+@tool
+def read_beat_chunk(name: str, index: int) -> dict:
+    """
+    Returns one chunk of a beat delivered with delivery='chunks' (or 'file' / 'zip'):
+    {'index', 'chunks', 'data'} where data is base64. Concatenate the decoded chunks 0..chunks-1.
 
-    # Encode to Base64
-    b64_string = base64.b64encode(midi_bytes).decode('utf-8')
+    Args:
+        name: File name from the generate_beat response.
+        index: Chunk number, starting at 0.
+    """
+    return delivery_mod.read_chunk(name, index)
+
+@resource(delivery_mod.RESOURCE_PREFIX + "{name}", mime_type="application/octet-stream")
+def beat_file(name: str) -> bytes:
+    """A MIDI file or zip bundle written by generate_beat."""
+    return delivery_mod.read_file(name)
+
+@tool
+async def generate_beats(requests: list[BeatRequest]) -> list[str]:
+    """
+    Generates several beats in one call (e.g. 10-20 variations to choose from).
+    Each request takes the same fields as generate_beat; omitted fields use its defaults.
+    Returns base64 encoded MIDI strings in request order.
+    """
+    if len(requests) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} beats per call (got {len(requests)})")
+    params = [asdict(r if isinstance(r, BeatRequest) else BeatRequest(**r)) for r in requests]
+    for p in params:
+        _check_search(p)
+    return list(await asyncio.gather(*(_generate(p) for p in params)))
+
+@tool
+def get_cache_stats() -> dict:
+    """
+    Returns hit/miss counters and size of the generate_beat result cache.
+    """
+    return RESULT_CACHE.stats()
 
-    return b64_string
+@tool
+def get_stats(reset: bool = False) -> dict:
+    """
+    Returns per-stage latency percentiles of recent renders: p50/p95/p99/max in ms and a call
+    count for each stage (server.generate_beat, server.render, server.base64, server.deliver.<mode>,
+    melody.*, chords.*, drums.*, midi.*), plus allocation sizes when the server runs with BEAT_PROFILE=memory.
+    With BEAT_WORKER_MODE=process, stages inside the workers are not visible here.
+
+    Args:
+        reset: Clear the recorded samples after reading them.
+    """
+    result = {'enabled': profiling.is_enabled(), 'stages': profiling.stats()}
+    if reset:
+        profiling.reset()
+    return result
 
 if __name__ == "__main__":
-    mcp.run()
+    if PROFILE_MODE != '0':
+        profiling.enable(memory=PROFILE_MODE == 'memory')
+    create_server().run()
@@ -0,0 +1,137 @@
+import io
+
+from src.generator import MelodyGenerator, derive_seed
+from src.accompaniment import ChordGenerator, DrumGenerator, CHORD_CHANNEL, DRUM_CHANNEL
+from src.midi_utils import MidiWriter, encode_segment, splice_segments
+from src.notes import NoteBuffer
+from src.timeline import parse_time_signature, quarter_beats, bar_ticks
+
+# Section types: length, melody variation and which parts play
+DEFAULT_SECTIONS = {
+    'intro': {'bars': 8, 'variation': 'A', 'chords': True, 'drums': False},
+    'verse': {'bars': 16, 'variation': 'B', 'chords': True, 'drums': True},
+    'hook': {'bars': 8, 'variation': 'C', 'chords': True, 'drums': True},
+    'bridge': {'bars': 8, 'variation': 'A', 'chords': True, 'drums': False},
+    'outro': {'bars': 8, 'variation': 'A', 'chords': True, 'drums': False},
+}
+
+# 96 bars: a bit under 3 minutes at 140 BPM
+DEFAULT_FORM = ['intro', 'verse', 'hook', 'verse', 'hook', 'bridge', 'verse', 'hook', 'outro']
+
+# (track name, channel, part)
+TRACKS = [
+    ("Melody", 0, 'melody'),
+    ("Chords", CHORD_CHANNEL, 'chords'),
+    ("Drums", DRUM_CHANNEL, 'drums'),
+]
+
+class Song:
+    """
+    A full song as named sections repeated by reference (e.g. verse / hook / verse / hook).
+
+    Each unique section is generated once, and encoded once per track; the MIDI export
+    splices the encoded bytes at section boundaries, so a long song costs about as much
+    as its unique material.
+
+    sections: overrides merged over DEFAULT_SECTIONS, e.g. {'verse': {'bars': 8}}
+    form: list of section names in play order (default DEFAULT_FORM)
+    time_signature: meter of every section, e.g. '4/4' or '6/8'
+    """
+    def __init__(self, key='C', scale='minor', tempo=140, form=None, sections=None, seed=None, style=None,
+                 time_signature='4/4'):
+        self.key = key
+        self.scale = scale
+        self.tempo = tempo
+        self.seed = seed
+        self.style = style
+        self.time_signature = parse_time_signature(time_signature)
+        self.sections = {name: dict(spec) for name, spec in DEFAULT_SECTIONS.items()}
+        for name, spec in (sections or {}).items():
+            self.sections.setdefault(name, {'bars': 8, 'variation': 'A', 'chords': True, 'drums': True})
+            self.sections[name].update(spec)
+        self.form = list(form or DEFAULT_FORM)
+        unknown = [name for name in self.form if name not in self.sections]
+        if unknown:
+            raise ValueError(f"Unknown section(s) in form: {', '.join(unknown)}")
+        self._parts = {}
+        self._segments = {}
+
+    @property
+    def total_bars(self):
+        return sum(self.sections[name]['bars'] for name in self.form)
+
+    def timeline(self):
+        """(section name, start bar) for every section in play order."""
+        placements = []
+        bar = 0
+        for name in self.form:
+            placements.append((name, bar))
+            bar += self.sections[name]['bars']
+        return placements
+
+    def section_parts(self, name):
+        """{'melody', 'chords', 'drums'} -> NoteBuffer for one section (times relative to its start)."""
+        parts = self._parts.get(name)
+        if parts is not None:
+            return parts
+        spec = self.sections[name]
+        bars = spec['bars']
+        seed = derive_seed(self.seed, f"section:{name}")
+        parts = {}
+
+        melody_gen = MelodyGenerator(self.key, self.scale, self.tempo, length_bars=bars,
+                                     time_signature=self.time_signature, seed=derive_seed(seed, 'melody'),
+                                     style=self.style)
+        parts['melody'] = melody_gen.generate_variation(spec['variation'])
+
+        parts['chords'] = NoteBuffer()
+        if spec['chords']:
+            chord_gen = ChordGenerator(self.key, self.scale, seed=derive_seed(seed, 'chords'), style=self.style)
+            parts['chords'] = chord_gen.progression_to_notes(chord_gen.generate_progression(bars),
+                                                             beats_per_bar=quarter_beats(*self.time_signature))
+
+        parts['drums'] = NoteBuffer()
+        if spec['drums']:
+            drum_gen = DrumGenerator(self.tempo, seed=derive_seed(seed, 'drums'), style=self.style,
+                                     time_signature=self.time_signature)
+            # A fill leads out of every drum section
+            parts['drums'] = drum_gen.generate_pattern(bars, fill_every=bars)
+
+        self._parts[name] = parts
+        return parts
+
+    def section_segment(self, name, part, channel, resolution=480, running_status=False):
+        """The encoded bytes of one part of a section, encoded once and reused on every repeat."""
+        key = (name, part, channel, resolution, running_status)
+        segment = self._segments.get(key)
+        if segment is None:
+            segment = encode_segment(self.section_parts(name)[part], resolution, channel, running_status)
+            self._segments[key] = segment
+        return segment
+
+    def to_notes(self, part):
+        """One part of the whole song as a single NoteBuffer (expanded; for inspection and tests)."""
+        notes = NoteBuffer()
+        for name, start_bar in self.timeline():
+            section = self.section_parts(name)[part]
+            offset = start_bar * bar_ticks(*self.time_signature, section.resolution)
+            for start, duration, pitch, velocity, channel in section.iter_ticks():
+                notes.append_ticks(pitch, start + offset, duration, velocity, channel)
+        return notes
+
+    def write_to_stream(self, stream, running_status=False):
+        writer = MidiWriter(running_status=running_status, tempo=self.tempo, time_signature=self.time_signature)
+        ticks_per_bar = bar_ticks(*self.time_signature, writer.resolution)
+        for track_name, channel, part in TRACKS:
+            placements = [(start_bar * ticks_per_bar,
+                           self.section_segment(name, part, channel, writer.resolution, running_status))
+                          for name, start_bar in self.timeline()]
+            if any(len(segment) for _, segment in placements):
+                writer.add_encoded_track(splice_segments(placements), track_name=track_name)
+        writer.write_to_stream(stream)
+
+    def to_midi(self, running_status=False):
+        """Returns the song as MIDI file bytes."""
+        buffer = io.BytesIO()
+        self.write_to_stream(buffer, running_status)
+        return buffer.getvalue()
@@ -0,0 +1,142 @@
+import copy
+import json
+import os
+from functools import lru_cache
+
+from src.sampling import get_sampler, bernoulli_sampler
+from src.rhythm_bank import get_rhythm_bank
+
+STYLE_DIR = os.path.join(os.path.dirname(__file__), 'style_presets')
+
+# Built-in style parameters. Presets (JSON files in STYLE_DIR, or any .json path)
+# only need to list the values they change; everything else falls back to these.
+DEFAULT_STYLE = {
+    # Rhythm tables for generate_rhythm_pattern(style=...), durations in beats
+    'rhythm': {
+        # 16th grid, emphasizing syncopation
+        'trap': {'durations': [0.25, 0.5, 1.0, 1.5], 'weights': [30, 30, 30, 10]},
+        # 16th, 8th, dotted 8th, quarter
+        'default': {'durations': [0.25, 0.5, 0.75, 1.0], 'weights': [10, 40, 10, 40]},
+        # 8th-note triplet grid: triplet 8th, triplet quarter, quarter, triplet half
+        'triplet': {'durations': [1 / 3, 2 / 3, 1.0, 4 / 3], 'weights': [30, 40, 20, 10]},
+    },
+    # Scale-step tables per variation for apply_voice_leading (unknown variations use C)
+    'voice_leading': {
+        'A': {'steps': [-1, 1, 0], 'weights': [4, 4, 1]}, # Smooth
+        'B': {'steps': [-2, 2, 0, -3, 3, 7, -7], 'weights': [2, 2, 3, 1, 1, 0.5, 0.5]}, # Aggressive/Trap (7 is roughly a fifth)
+        'C': {'steps': [-1, 1, -2, 2, 0], 'weights': [3, 3, 1, 1, 1]}, # Balanced/Motivic
+    },
+    'motif': {'steps': [-2, -1, 0, 1, 2, 3, -3], 'weights': [1, 4, 2, 4, 1, 0.5, 0.5]},
+    # Chord shape for ChordGenerator (see src/voicings.py CHORD_TYPES) and whether
+    # to voice-lead between chords (False keeps every chord in root position)
+    'chords': {'type': 'triad', 'voice_leading': False},
+    'drums': {
+        'hat_steps': 8, # 8th-note hi-hats per bar
+        'hat_roll_probability': 0.15, # Chance of a 32nd-note roll on each hat
+        'kick_spots': [1.5, 2.5, 3.0, 3.5], # Syncopated kicks on top of beat 1
+        'kick_probability': 0.4,
+        'fill_every': None, # Snare fill every n bars
+        'variety': None, # Distinct bars to arrange (None: every bar drawn fresh)
+    },
+}
+
+def _merge(base, override):
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+class StylePreset:
+    """
+    Style parameters compiled into alias samplers (see src.sampling).
+    Compiled once per preset and shared by every generator using it.
+    """
+    def __init__(self, params, name='custom'):
+        self.name = name
+        self.params = params
+        self.rhythm = {k: get_sampler(t['durations'], t['weights']) for k, t in params['rhythm'].items()}
+        self.voice_leading = {k: get_sampler(t['steps'], t['weights']) for k, t in params['voice_leading'].items()}
+        self.motif = get_sampler(params['motif']['steps'], params['motif']['weights'])
+
+        drums = params['drums']
+        self.kick_spots = tuple(drums['kick_spots'])
+        # Whole-bar masks: one draw decides every roll (or every extra kick) in a bar
+        self.hat_rolls = bernoulli_sampler([drums['hat_roll_probability']] * drums['hat_steps'])
+        self.kicks = bernoulli_sampler([drums['kick_probability']] * len(self.kick_spots))
+        self._banks = {}
+
+    def rhythm_sampler(self, style):
+        return self.rhythm.get(style) or self.rhythm['default']
+
+    def rhythm_bank(self, style, beats_per_bar):
+        """Indexed bank of whole-bar rhythms for a rhythm style (see src/rhythm_bank.py), or None
+        when the bar is too long to index."""
+        key = (style, beats_per_bar)
+        if key not in self._banks:
+            table = self.params['rhythm'].get(style) or self.params['rhythm']['default']
+            self._banks[key] = get_rhythm_bank(table['durations'], table['weights'], beats_per_bar)
+        return self._banks[key]
+
+    def step_sampler(self, variation):
+        return self.voice_leading.get(variation) or self.voice_leading['C']
+
+    def __repr__(self):
+        return f"StylePreset({self.name!r})"
+
+def _preset_path(name):
+    """JSON file of a named or file preset (None for the built-in default)."""
+    if name == 'default':
+        return None
+    if name.endswith('.json'):
+        return name
+    if os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError(f"Unknown style preset: {name}")
+    return os.path.join(STYLE_DIR, f"{name}.json")
+
+def style_version(style=None):
+    """
+    Modification time (ns) of a preset's JSON file, so caches of rendered output can tell an
+    edited preset apart. None for the built-in default, dicts and presets that don't exist.
+    """
+    if not (style is None or isinstance(style, str)):
+        return None
+    path = _preset_path(style or 'default')
+    try:
+        return os.stat(path).st_mtime_ns if path else None
+    except OSError:
+        return None
+
+@lru_cache(maxsize=None)
+def _load_named(name, version):
+    # version (style_version) is only part of the cache key: an edited file is compiled again
+    path = _preset_path(name)
+    if path is None:
+        return StylePreset(DEFAULT_STYLE, 'default')
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown style preset: {name}")
+    with open(path) as f:
+        override = json.load(f)
+    return StylePreset(_merge(DEFAULT_STYLE, override), os.path.splitext(os.path.basename(path))[0])
+
+def load_style(style=None):
+    """
+    Returns a compiled StylePreset from a preset name (a JSON file in STYLE_DIR),
+    a path to a .json file, a dict of overrides, or an existing StylePreset.
+    Named and file presets are compiled once per process (again after the file changes).
+    """
+    if isinstance(style, StylePreset):
+        return style
+    if isinstance(style, dict):
+        return StylePreset(_merge(DEFAULT_STYLE, style))
+    name = style or 'default'
+    return _load_named(name, style_version(name))
+
+def list_styles():
+    """Names of the available presets."""
+    names = ['default']
+    if os.path.isdir(STYLE_DIR):
+        names += sorted(os.path.splitext(f)[0] for f in os.listdir(STYLE_DIR) if f.endswith('.json'))
+    return names
@@ -2,6 +2,7 @@ import unittest
 import os
 from src.midi_utils import MidiWriter
 from src.accompaniment import ChordGenerator, DrumGenerator
+from src.voicings import chord_voicing, voice_progression, VOICING_RANGE
 
 class TestAccompaniment(unittest.TestCase):
     def test_chord_generation(self):
@@ -16,6 +17,34 @@ class TestAccompaniment(unittest.TestCase):
             for note in chord_notes:
                 self.assertTrue(40 <= note <= 80)
 
+    def test_chord_voicings(self):
+        gen = ChordGenerator('C', 'minor')
+        self.assertEqual(gen.get_chord_notes(1), [48, 51, 55]) # C minor triad
+        self.assertEqual(gen.get_chord_notes(1, chord_type='seventh'), [48, 51, 55, 58])
+        self.assertEqual(gen.get_chord_notes(1, chord_type='sus4'), [48, 53, 55])
+        self.assertEqual(gen.get_chord_notes(1, inversion=1), [51, 55, 60])
+        self.assertEqual(gen.get_chord_notes(1, octave_offset=1), [60, 63, 67])
+        # Voicings are shared: enharmonic keys hit the same cache entry
+        self.assertIs(chord_voicing('F#', 'minor', 2, 'ninth'), chord_voicing('Gb', 'Minor', 2, 'ninth'))
+        with self.assertRaises(ValueError):
+            gen.get_chord_notes(1, chord_type='thirteenth')
+
+    def test_voice_leading(self):
+        degrees = [1, 6, 7, 1] * 8
+        plain = voice_progression('C', 'minor', degrees, 'seventh', voice_leading=False)
+        led = voice_progression('C', 'minor', degrees, 'seventh')
+        self.assertEqual(led[0], plain[0])
+        movement = lambda chords: sum(sum(abs(a - b) for a, b in zip(x, y)) for x, y in zip(chords, chords[1:]))
+        self.assertLess(movement(led), movement(plain))
+        for chord, root_position in zip(led, plain):
+            # Same pitch classes, just inverted / moved by octaves, inside the range
+            self.assertEqual({n % 12 for n in chord}, {n % 12 for n in root_position})
+            self.assertTrue(VOICING_RANGE[0] <= min(chord) and max(chord) <= VOICING_RANGE[1])
+
+        gen = ChordGenerator('C', 'minor', seed=1, style='lofi')
+        self.assertEqual((gen.chord_type, gen.voice_leading), ('seventh', True))
+        self.assertTrue(all(len(chord) == 4 for chord in gen.generate_progression(16)))
+
     def test_drum_generation(self):
         gen = DrumGenerator(140)
         pattern = gen.generate_pattern(length_bars=1)
@@ -26,6 +55,32 @@ class TestAccompaniment(unittest.TestCase):
         self.assertIn(38, notes) # Snare
         self.assertIn(42, notes) # Hi-hat
 
+    def test_drum_arrangement(self):
+        gen = DrumGenerator(140, seed=4)
+        arrangement = gen.generate_arrangement(64, fill_every=8, variety=4)
+        self.assertEqual(len(arrangement), 64)
+        # 4 distinct bars, each with and without a fill at most
+        self.assertLessEqual(len(arrangement.templates), 8)
+
+        notes = arrangement.to_notes()
+        self.assertEqual(len(notes), arrangement.event_count())
+        self.assertEqual(list(notes.start), sorted(notes.start))
+        self.assertEqual(set(notes.channel), {9})
+        # Fill bars end with a snare run on the last beat; other bars don't
+        bar = 4 * notes.resolution
+        for i in (6, 7):
+            in_bar = [(s - i * bar, p) for s, p in zip(notes.start, notes.pitch) if i * bar <= s < (i + 1) * bar]
+            last_beat = [p for s, p in in_bar if s >= 3 * notes.resolution]
+            self.assertEqual(last_beat == [38] * 4, i == 7)
+
+    def test_drum_bars_share_templates(self):
+        pattern = DrumGenerator(140, seed=2).generate_arrangement(256)
+        # Identical hit masks collapse into one template
+        self.assertLess(len(pattern.templates), 256)
+        notes = pattern.to_notes()
+        self.assertEqual(sum(1 for n in notes if n['note'] == 38), 256) # One snare per bar
+        self.assertEqual(notes, DrumGenerator(140, seed=2).generate_pattern(256))
+
 class TestMultitrackMidi(unittest.TestCase):
     def test_write_multitrack(self):
         writer = MidiWriter()
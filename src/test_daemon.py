@@ -0,0 +1,123 @@
+import unittest
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+from src import daemon
+from src import main as cli
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestImportBudget(unittest.TestCase):
+    def test_entry_points_defer_heavy_imports(self):
+        code = ("import sys, src.main, src.daemon, src.server; "
+                "print(sorted(m for m in ('numpy', 'mcp', 'pydantic') if m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=REPO_ROOT, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.socket = os.path.join(self.tmp.name, 'beat.sock')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def start_daemon(self):
+        proc = subprocess.Popen([sys.executable, 'src/daemon.py', '--socket', self.socket], cwd=REPO_ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            sock = daemon._connect(self.socket)
+            if sock is not None:
+                sock.close()
+                return proc
+            time.sleep(0.05)
+        proc.kill()
+        self.fail("daemon did not start")
+
+    def test_socket_is_private(self):
+        env = {k: v for k, v in os.environ.items() if k not in ('XDG_RUNTIME_DIR', 'BEAT_DAEMON_SOCKET')}
+        with mock.patch.dict(os.environ, dict(env, TMPDIR=self.tmp.name), clear=True):
+            directory = os.path.dirname(daemon.default_socket_path())
+        self.assertEqual(os.path.dirname(directory), self.tmp.name)
+        daemon._private_directory(directory)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+        os.chmod(directory, 0o777) # Others could swap the socket
+        with self.assertRaises(RuntimeError):
+            daemon._private_directory(directory)
+
+        proc = self.start_daemon()
+        try:
+            self.assertEqual(os.stat(self.socket).st_mode & 0o777, 0o600)
+        finally:
+            daemon.stop(self.socket)
+            proc.wait(10)
+
+    @unittest.skipUnless(hasattr(os, 'getuid') and os.getuid() == 0, "needs root to create another user's socket")
+    def test_ignores_socket_of_another_user(self):
+        import socket
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with listener:
+            listener.bind(self.socket)
+            listener.listen(1)
+            os.chown(self.socket, 65534, 65534)
+            self.assertIsNone(daemon._connect(self.socket))
+            self.assertIsNone(daemon.forward(['--bars', '1'], self.socket))
+
+    def test_no_daemon_runs_in_process(self):
+        self.assertIsNone(daemon.forward(['--bars', '1'], self.socket))
+        self.assertFalse(daemon.stop(self.socket))
+
+    def test_forwarded_call_matches_in_process(self):
+        argv = ['--bars', '2', '--seed', '5', '--chords', '--drums', '--output', 'beat']
+        local_dir = os.path.join(self.tmp.name, 'local')
+        remote_dir = os.path.join(self.tmp.name, 'remote')
+        os.makedirs(local_dir)
+        os.makedirs(remote_dir)
+        cwd = os.getcwd()
+
+        proc = self.start_daemon()
+        try:
+            local, remote = io.StringIO(), io.StringIO()
+            try:
+                os.chdir(local_dir)
+                with contextlib.redirect_stdout(local):
+                    cli.main(argv, use_daemon=False)
+                # Relative paths resolve against the caller's directory, not the daemon's
+                os.chdir(remote_dir)
+                with contextlib.redirect_stdout(remote):
+                    self.assertEqual(daemon.forward(argv, self.socket), 0)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(remote.getvalue(), local.getvalue())
+            for var in 'ABC':
+                name = f"beat_var_{var}.mid"
+                with open(os.path.join(local_dir, name), 'rb') as a, open(os.path.join(remote_dir, name), 'rb') as b:
+                    self.assertEqual(a.read(), b.read())
+
+            # Argument errors come back as the exit code, with the usage message on stderr
+            errors = io.StringIO()
+            with contextlib.redirect_stderr(errors):
+                self.assertEqual(daemon.forward(['--bars', 'many'], self.socket), 2)
+            self.assertIn('invalid int value', errors.getvalue())
+
+            # Malformed requests are answered, and the daemon keeps serving (stop below)
+            for request in ({'cwd': remote_dir}, ['--bars', '1'], {'argv': '--bars 1'}, {'argv': [1]}):
+                sock = daemon._connect(self.socket)
+                with sock:
+                    daemon._send(sock, request)
+                    with sock.makefile('r', encoding='utf-8') as replies:
+                        self.assertEqual(json.loads(replies.readlines()[-1]), {'exit': 2})
+        finally:
+            self.assertTrue(daemon.stop(self.socket))
+            proc.wait(10)
+        self.assertFalse(os.path.exists(self.socket))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from src.catalog import build_jobs, render_catalog
+from src.generator import derive_seed
+from src.render_graph import RenderGraph
+from src.markov import (train_markov_model, load_markov_model, MarkovModel, MarkovMelodyGenerator, NUM_INTERVALS,
+                        MAX_INTERVAL, MAX_ORDER)
+
+class TestMarkovModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        corpus = os.path.join(cls.tmp.name, 'corpus')
+        # Smooth (stepwise) melodies only, with drums that must be ignored
+        jobs = build_jobs(30, keys=['C', 'G'], scales=['major'], variations=['A'], add_chords=False, seed=4)
+        render_catalog(jobs, corpus, workers=1)
+        cls.model = train_markov_model(corpus, order=2)
+        cls.path = os.path.join(cls.tmp.name, 'model.npz')
+        cls.model.save(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_learns_stepwise_motion(self):
+        self.assertEqual(self.model.interval_cdf.shape, (NUM_INTERVALS ** 2, NUM_INTERVALS))
+        # After two repeated notes, small intervals dominate
+        ctx = MAX_INTERVAL * NUM_INTERVALS + MAX_INTERVAL
+        probs = np.diff(np.concatenate(([0.0], self.model.interval_cdf[ctx])))
+        self.assertGreater(probs[MAX_INTERVAL - 4:MAX_INTERVAL + 5].sum(), 0.9)
+
+    def test_memory_mapped_load(self):
+        mapped = load_markov_model(self.path)
+        self.assertIs(mapped, load_markov_model(self.path)) # Shared per process
+        self.assertFalse(mapped.interval_cdf.flags.writeable)
+        loaded = load_markov_model(self.path, mmap=False)
+        np.testing.assert_array_equal(mapped.interval_cdf, self.model.interval_cdf)
+        np.testing.assert_array_equal(mapped.rhythm_cdf, loaded.rhythm_cdf)
+
+        # A retrained model at the same path is loaded again, not served from the cache
+        path = os.path.join(self.tmp.name, 'retrained.npz')
+        self.model.save(path)
+        first = load_markov_model(path)
+        retrained = os.path.join(self.tmp.name, 'order1.npz')
+        train_markov_model(os.path.join(self.tmp.name, 'corpus'), order=1).save(retrained)
+        os.utime(retrained, ns=(0, os.stat(path).st_mtime_ns + 1))
+        os.replace(retrained, path)
+        self.assertEqual(load_markov_model(path).order, 1)
+        self.assertEqual(first.order, 2)
+
+    def test_order_is_bounded(self):
+        with self.assertRaises(ValueError):
+            train_markov_model(os.path.join(self.tmp.name, 'corpus'), order=MAX_ORDER + 1)
+        # Tables that don't match the stored order are refused on load
+        path = os.path.join(self.tmp.name, 'mismatch.npz')
+        MarkovModel(3, self.model.interval_cdf, self.model.rhythm_cdf).save(path)
+        for mmap in (True, False):
+            with self.assertRaises(ValueError):
+                load_markov_model(path, mmap=mmap)
+
+    def test_generation(self):
+        gen = MarkovMelodyGenerator(self.path, 'D', 'minor', 140, length_bars=4, seed=1)
+        melody = gen.generate_variation()
+        self.assertAlmostEqual(sum(n['duration'] for n in melody), 16.0)
+        for note in melody:
+            self.assertIn(note['note'], gen.scale_notes)
+        self.assertIn(melody[-1]['note'], gen.stable_notes)
+        self.assertEqual(melody, MarkovMelodyGenerator(self.path, 'D', 'minor', 140, seed=1).generate_variation())
+
+        batch = gen.generate_batch(20)
+        for i in range(len(batch)):
+            self.assertAlmostEqual(sum(n['duration'] for n in batch.melody(i)), 16.0)
+
+    def test_render_graph(self):
+        graph = RenderGraph('D', 'minor', bars=4, seed=3, markov_model=self.path)
+        expected = MarkovMelodyGenerator(self.path, 'D', 'minor', 140, seed=derive_seed(3, 'melody:A'))
+        self.assertEqual(graph.melody('A'), expected.generate_variation())
+        self.assertNotEqual(graph.melody('A'), graph.melody('B')) # A draw per variation
+        self.assertNotEqual(graph.melody('A'), RenderGraph('D', 'minor', bars=4, seed=3).melody('A'))
+
+        best = RenderGraph('D', 'minor', bars=4, seed=3, markov_model=self.path, candidates=32).melody('A')
+        for note in best:
+            self.assertIn(note['note'], expected.scale_notes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,22 @@
 import unittest
+import asyncio
 import base64
 import io
 import os
-from src.server import generate_beat
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from src.server import generate_beat, generate_beats, get_cache_stats, get_stats, configure_workers, RESULT_CACHE
+from src.server import read_beat_chunk, beat_file, _env_workers
+from src import delivery, profiling
+from src.cache import ResultCache
 
 class TestMCPServer(unittest.TestCase):
     def test_generate_beat_tool(self):
         # Simulate calling the tool
-        b64_output = generate_beat(
+        b64_output = asyncio.run(generate_beat(
             key="C",
             scale="phrygian",
             tempo=140,
@@ -15,7 +24,7 @@ class TestMCPServer(unittest.TestCase):
             variation="B",
             add_chords=True,
             add_drums=True
-        )
+        ))
 
         # Verify it returns a string
         self.assertIsInstance(b64_output, str)
@@ -34,5 +43,218 @@ class TestMCPServer(unittest.TestCase):
         # with open("test_mcp_output.mid", "wb") as f:
         #     f.write(midi_bytes)
 
+    def test_compact_output(self):
+        full = base64.b64decode(asyncio.run(generate_beat(bars=16, seed=5)))
+        compact = base64.b64decode(asyncio.run(generate_beat(bars=16, seed=5, compact=True)))
+        single = base64.b64decode(asyncio.run(generate_beat(bars=16, seed=5, compact=True, midi_format=0)))
+        self.assertLess(len(compact), len(full) * 0.85)
+        self.assertEqual(single[8:12], b'\x00\x00\x00\x01') # Format 0, one track
+        self.assertLess(len(single), len(full))
+
+    def test_rejects_style_paths(self):
+        for style in ('../../etc/preset', '/tmp/preset.json', 'lofi.json', '..'):
+            with self.assertRaises(ValueError):
+                asyncio.run(generate_beat(seed=1, style=style))
+        with self.assertRaises(ValueError):
+            asyncio.run(generate_beats([{'style': '../x'}]))
+
+    def test_rejects_huge_time_signature(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(generate_beat(seed=1, time_signature='300/4'))
+
+    def test_seeded_generation_is_cached(self):
+        RESULT_CACHE.clear()
+        first = asyncio.run(generate_beat(key="F#", scale="phrygian", bars=4, seed=42))
+        self.assertEqual(get_cache_stats()['misses'], 1)
+
+        # Retry is identical and served from cache; enharmonic spelling shares the entry
+        self.assertEqual(asyncio.run(generate_beat(key="F#", scale="phrygian", bars=4, seed=42)), first)
+        self.assertEqual(asyncio.run(generate_beat(key="Gb", scale="Phrygian", bars=4, seed=42)), first)
+        stats = get_cache_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['entries'], 1)
+
+        # A different seed renders a different beat
+        self.assertNotEqual(asyncio.run(generate_beat(key="F#", scale="phrygian", bars=4, seed=43)), first)
+
+        # Same output when rendered from scratch
+        RESULT_CACHE.clear()
+        self.assertEqual(asyncio.run(generate_beat(key="F#", scale="phrygian", bars=4, seed=42)), first)
+
+    def test_generate_beats_batch(self):
+        requests = [{'key': 'C', 'variation': v, 'seed': i} for i, v in enumerate('ABCABCABCA')]
+        results = asyncio.run(generate_beats(requests))
+        self.assertEqual(len(results), 10)
+        for b64_output in results:
+            self.assertEqual(base64.b64decode(b64_output)[0:4], b'MThd')
+        # Same as one-at-a-time calls, in request order
+        self.assertEqual(results[3], asyncio.run(generate_beat(key='C', variation='A', seed=3)))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(generate_beats([{'key': 'C'}] * 65))
+
+    def test_process_workers(self):
+        RESULT_CACHE.clear()
+        try:
+            configure_workers('process', 2)
+            results = asyncio.run(generate_beats([{'seed': 1}, {'seed': 2, 'bars': 8}]))
+        finally:
+            configure_workers('thread')
+        RESULT_CACHE.clear()
+        self.assertEqual(results[0], asyncio.run(generate_beat(seed=1)))
+
+    def test_worker_count_setting(self):
+        # A bad BEAT_WORKERS doesn't break the import, only creating the pool, with a clear message
+        env = dict(os.environ, BEAT_WORKERS='four')
+        subprocess.run([sys.executable, '-c', 'import src.server'], env=env, check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        saved = os.environ.get('BEAT_WORKERS')
+        try:
+            os.environ['BEAT_WORKERS'] = 'four'
+            with self.assertRaisesRegex(ValueError, 'BEAT_WORKERS'):
+                _env_workers()
+            os.environ['BEAT_WORKERS'] = '3'
+            self.assertEqual(_env_workers(), 3)
+            del os.environ['BEAT_WORKERS']
+            self.assertIsNone(_env_workers())
+        finally:
+            if saved is not None:
+                os.environ['BEAT_WORKERS'] = saved
+
+    def test_stage_stats(self):
+        profiling.reset()
+        profiling.enable()
+        try:
+            asyncio.run(generate_beats([{'bars': 4}, {'bars': 8}, {'bars': 16}]))
+            stats = get_stats(reset=True)
+        finally:
+            profiling.disable()
+        self.assertTrue(stats['enabled'])
+        stages = stats['stages']
+        for stage in ('server.generate_beat', 'server.render', 'server.base64', 'melody.generate_variation',
+                      'chords.generate_progression', 'drums.generate_pattern', 'midi.encode_track'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['server.render']['count'], 3)
+        self.assertEqual(stages['midi.encode_track']['count'], 9)
+        hist = stages['server.generate_beat']
+        self.assertTrue(0 < hist['p50_ms'] <= hist['p95_ms'] <= hist['p99_ms'] <= hist['max_ms'])
+        self.assertGreaterEqual(hist['p50_ms'], stages['server.render']['p50_ms'])
+        self.assertEqual(get_stats()['stages'], {})
+
+class TestDelivery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = (delivery.OUTPUT_DIR, delivery.CHUNK_BYTES)
+        self.saved_default = delivery.DEFAULT_OUTPUT_DIR
+        delivery.OUTPUT_DIR = self.tmp.name
+
+    def tearDown(self):
+        delivery.OUTPUT_DIR, delivery.CHUNK_BYTES = self.saved
+        delivery.DEFAULT_OUTPUT_DIR = self.saved_default
+        self.tmp.cleanup()
+
+    def test_file_delivery(self):
+        inline = base64.b64decode(asyncio.run(generate_beat(bars=8, seed=7)))
+        result = asyncio.run(generate_beat(bars=8, seed=7, delivery='file'))
+        self.assertEqual(result['path'], os.path.join(self.tmp.name, result['name']))
+        self.assertEqual(result['uri'], 'beat://files/' + result['name'])
+        self.assertEqual(result['bytes'], len(inline))
+        self.assertFalse(result['cached'])
+        self.assertGreater(result['ms'], 0)
+        self.assertEqual(beat_file(result['name']), inline)
+
+        # A seeded repeat reuses the file; unseeded requests never collide
+        self.assertTrue(asyncio.run(generate_beat(bars=8, seed=7, delivery='file'))['cached'])
+        self.assertNotEqual(asyncio.run(generate_beat(delivery='file'))['name'],
+                            asyncio.run(generate_beat(delivery='file'))['name'])
+
+        with self.assertRaises(ValueError):
+            beat_file('../' + result['name'])
+        with self.assertRaises(ValueError):
+            asyncio.run(generate_beat(delivery='email'))
+
+    def test_zip_bundle(self):
+        result = asyncio.run(generate_beat(bars=4, seed=3, delivery='zip'))
+        self.assertEqual(result['files'], ['beat_var_A.mid', 'beat_var_B.mid', 'beat_var_C.mid', 'stems/melody_A.mid',
+                                           'stems/melody_B.mid', 'stems/melody_C.mid', 'stems/chords.mid', 'stems/drums.mid'])
+        with zipfile.ZipFile(result['path']) as bundle:
+            for var in 'ABC':
+                inline = asyncio.run(generate_beat(bars=4, seed=3, variation=var))
+                self.assertEqual(bundle.read(f"beat_var_{var}.mid"), base64.b64decode(inline))
+            for stem in ('melody_A', 'chords', 'drums'):
+                self.assertEqual(bundle.read(f"stems/{stem}.mid")[0:4], b'MThd')
+
+        # Without chords there is no chord stem
+        result = asyncio.run(generate_beat(bars=4, seed=3, add_chords=False, delivery='zip'))
+        self.assertNotIn('stems/chords.mid', result['files'])
+
+    def test_chunked_delivery(self):
+        delivery.CHUNK_BYTES = 1000
+        result = asyncio.run(generate_beat(bars=32, seed=5, delivery='chunks'))
+        self.assertEqual(result['chunks'], -(-result['bytes'] // 1000))
+        self.assertGreater(result['chunks'], 2)
+        data = b''
+        for index in range(result['chunks']):
+            chunk = read_beat_chunk(result['name'], index)
+            self.assertEqual(chunk['chunks'], result['chunks'])
+            data += base64.b64decode(chunk['data'])
+        self.assertEqual(data, base64.b64decode(asyncio.run(generate_beat(bars=32, seed=5))))
+        with self.assertRaises(ValueError):
+            read_beat_chunk(result['name'], result['chunks'])
+
+    def test_private_output_directory(self):
+        self.assertIn(str(os.getuid()), os.path.basename(self.saved_default))
+        private = os.path.join(self.tmp.name, 'private')
+        delivery.DEFAULT_OUTPUT_DIR = delivery.OUTPUT_DIR = private
+        result = asyncio.run(generate_beat(bars=4, seed=2, delivery='file'))
+        self.assertEqual(os.path.dirname(result['path']), private)
+        self.assertEqual(os.stat(private).st_mode & 0o777, 0o700)
+        os.chmod(private, 0o777) # Others could plant files that seeded requests would serve
+        with self.assertRaises(RuntimeError):
+            asyncio.run(generate_beat(bars=4, seed=3, delivery='file'))
+
+    def test_sweep(self):
+        now = time.time()
+        for name, age, size in (('beat-old.mid', 7200, 10), ('beat-a.mid', 30, 600), ('beat-b.mid', 20, 600),
+                                ('beat-c.mid', 10, 600), ('notes.txt', 7200, 10)):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            os.utime(path, (now - age, now - age))
+        # Expired first, then least recently used until under the size cap
+        self.assertEqual(delivery.sweep(self.tmp.name, max_age=3600, max_bytes=1500), 2)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['beat-b.mid', 'beat-c.mid', 'notes.txt'])
+
+        # A read keeps a file alive
+        read_beat_chunk('beat-b.mid', 0)
+        self.assertEqual(delivery.sweep(self.tmp.name, max_age=5), 1)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['beat-b.mid', 'notes.txt'])
+
+    def test_seeded_name_follows_style_file(self):
+        path = os.path.join(self.tmp.name, 'mine.json')
+        with open(path, 'w') as f:
+            f.write('{}')
+        params = {'seed': 1, 'style': path}
+        name = delivery.file_name(params, '.mid')
+        self.assertEqual(delivery.file_name(params, '.mid'), name)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1)) # Edited
+        self.assertNotEqual(delivery.file_name(params, '.mid'), name)
+
+class TestResultCache(unittest.TestCase):
+    def test_byte_budget_eviction(self):
+        cache = ResultCache(max_bytes=10)
+        cache.put('a', b'12345')
+        cache.put('b', b'12345')
+        self.assertEqual(cache.get('a'), b'12345') # 'a' is now most recent
+        cache.put('c', b'123')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), b'123')
+        cache.put('huge', b'x' * 11) # Larger than the budget, not stored
+        self.assertIsNone(cache.get('huge'))
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['bytes'], 10)
+
 if __name__ == '__main__':
     unittest.main()
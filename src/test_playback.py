@@ -0,0 +1,104 @@
+import unittest
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+from src.accompaniment import DrumGenerator
+from src.generator import MelodyGenerator
+from src.playback import iter_messages, jitter_report, open_sink, play, play_to
+
+class Receiver:
+    """Local socket server that records every chunk it receives with its arrival time."""
+    def __init__(self, family=socket.AF_INET, address=('127.0.0.1', 0)):
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        self.server.bind(address)
+        self.server.listen(1)
+        self.address = self.server.getsockname()
+        self.chunks = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        conn, _ = self.server.accept()
+        with conn:
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                self.chunks.append((time.monotonic(), data))
+        self.server.close()
+
+    def data(self):
+        self.thread.join(5)
+        return b''.join(data for _, data in self.chunks)
+
+def note_ons(data):
+    return sum(1 for i in range(0, len(data), 3) if data[i] & 0xF0 == 0x90)
+
+class TestMessages(unittest.TestCase):
+    def test_merge_orders_offs_before_ons(self):
+        melody = [{'note': 60, 'duration': 1.0, 'velocity': 100, 'offset': 0.0},
+                  {'note': 62, 'duration': 1.0, 'velocity': 90, 'offset': 1.0}]
+        drums = [{'note': 36, 'duration': 0.5, 'velocity': 120, 'offset': 1.0}]
+        messages = list(iter_messages([(melody, 0), (drums, 9)]))
+        self.assertEqual(messages, [
+            (0, bytes([0x90, 60, 100])),
+            (480, bytes([0x80, 60, 0, 0x90, 62, 90, 0x99, 36, 120])),
+            (720, bytes([0x89, 36, 0])),
+            (960, bytes([0x80, 62, 0])),
+        ])
+
+    def test_jitter_report(self):
+        report = jitter_report([i / 1000 for i in range(100)])
+        self.assertEqual((report['p50'], report['p99'], report['max']), (50.0, 99.0, 99.0))
+        self.assertEqual(jitter_report([])['max'], 0.0)
+
+class TestPlayback(unittest.TestCase):
+    def tracks(self, bars=2):
+        # Trap melody plus hi-hat rolls on every other 8th
+        melody = MelodyGenerator('C', 'minor', 170, length_bars=bars, seed=1).iter_variation('B')
+        drums = DrumGenerator(170, seed=1, style={'drums': {'hat_roll_probability': 0.5}}).iter_pattern(bars)
+        return [(melody, 0), (drums, 9)]
+
+    def test_plays_to_tcp_socket_on_time(self):
+        receiver = Receiver()
+        tempo = 340 # 2 bars of 32nd-note rolls in under a second and a half
+        stats = play_to(f"tcp:127.0.0.1:{receiver.address[1]}", self.tracks(), tempo)
+        data = receiver.data()
+
+        expected = list(iter_messages(self.tracks()))
+        self.assertEqual(data, b''.join(chunk for _, chunk in expected))
+        self.assertEqual(stats['messages'], len(data) // 3)
+        self.assertEqual(stats['writes'], len(expected))
+        # No drift: the last message goes out when the timeline says
+        last = expected[-1][0] * 60.0 / (tempo * 480)
+        self.assertAlmostEqual(stats['seconds'], last, delta=0.05)
+        self.assertLess(stats['jitter_ms']['p50'], 5.0)
+
+    def test_unix_socket_and_cancel(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'midi.sock')
+            receiver = Receiver(socket.AF_UNIX, path)
+
+            async def cancel_midway(sink):
+                task = asyncio.create_task(play(self.tracks(16), sink, 140))
+                await asyncio.sleep(0.3)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            with open_sink(f"unix:{path}") as sink:
+                asyncio.run(cancel_midway(sink))
+            data = receiver.data()
+        # Stopped early, but every note that started also got its Note Off
+        self.assertGreater(note_ons(data), 0)
+        self.assertEqual(note_ons(data) * 2, len(data) // 3)
+
+    def test_bad_target(self):
+        with self.assertRaises(ValueError):
+            open_sink('tcp:nohost')
+
+if __name__ == '__main__':
+    unittest.main()
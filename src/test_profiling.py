@@ -0,0 +1,61 @@
+import unittest
+import threading
+from src import profiling
+
+class TestProfiling(unittest.TestCase):
+    def tearDown(self):
+        profiling.disable()
+        profiling.reset()
+
+    def test_disabled_records_nothing(self):
+        profiling.reset()
+        work = profiling.timed('test.work')(lambda x: x * 2)
+        self.assertEqual(work(21), 42)
+        with profiling.span('test.block'):
+            pass
+        self.assertEqual(profiling.stats(), {})
+
+    def test_rolling_percentiles(self):
+        hist = profiling.RollingHistogram(window=100)
+        for ms in range(1, 201):
+            hist.add(ms / 1000)
+        summary = hist.summary()
+        # Only the last 100 samples (101..200 ms) count, but the lifetime count is kept
+        self.assertEqual(summary['count'], 200)
+        self.assertEqual((summary['p50_ms'], summary['p95_ms'], summary['p99_ms'], summary['max_ms']),
+                         (151.0, 196.0, 200.0, 200.0))
+
+    def test_summary_while_recording(self):
+        # Summaries are taken while worker threads record into the same stage
+        hist = profiling.RollingHistogram(window=64)
+        done = threading.Event()
+        def record():
+            while not done.is_set():
+                hist.add(0.001, 1024)
+        workers = [threading.Thread(target=record) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        try:
+            for _ in range(500):
+                hist.summary()
+        finally:
+            done.set()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(hist.summary()['p50_ms'], 1.0)
+
+    def test_spans_and_memory(self):
+        profiling.enable(memory=True)
+        work = profiling.timed('test.alloc')(lambda n: [0] * n)
+        for _ in range(5):
+            work(100000)
+        with profiling.span('test.block'):
+            pass
+        stats = profiling.stats()
+        self.assertEqual(stats['test.alloc']['count'], 5)
+        self.assertGreater(stats['test.alloc']['alloc_kb_p50'], 700) # 100k pointers
+        self.assertEqual(stats['test.block']['count'], 1)
+        self.assertIn('test.alloc', profiling.format_stats())
+
+if __name__ == '__main__':
+    unittest.main()
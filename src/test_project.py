@@ -1,8 +1,17 @@
 import unittest
+import io
 import os
-from src.music_theory import get_scale_notes, is_stable_scale_degree
+import struct
+import tempfile
+import tracemalloc
+from src.music_theory import get_scale_notes, get_scale_table, is_stable_scale_degree, SCALE_MASKS
 from src.generator import MelodyGenerator
-from src.midi_utils import MidiWriter
+from src.midi_utils import (MidiWriter, StreamingMidiWriter, MidiReader, encode_note_events_python, encode_note_events_numpy,
+                             merge_tracks)
+from src.accompaniment import DrumGenerator
+from src.notes import NoteBuffer
+from src.catalog import build_jobs, render_catalog, job_filename
+from benchmarks.suite import run_suite, compare_results
 
 class TestMusicTheory(unittest.TestCase):
     def test_scale_generation(self):
@@ -21,6 +30,24 @@ class TestMusicTheory(unittest.TestCase):
         self.assertTrue(is_stable_scale_degree(67, 'C', 'major')) # G4
         self.assertFalse(is_stable_scale_degree(62, 'C', 'major')) # D4
 
+    def test_scale_table(self):
+        # Major: 0, 2, 4, 5, 7, 9, 11
+        self.assertEqual(SCALE_MASKS['major'], 0b101010110101)
+        table = get_scale_table('D', 'major', 3, 4)
+        self.assertEqual(list(table.notes), get_scale_notes('D', 'major', 3, 4))
+        self.assertEqual(table.index(50), 0) # D3
+        self.assertIn(54, table) # F#3
+        self.assertNotIn(53, table) # F3
+        self.assertIsNone(table.index(53))
+        self.assertEqual(table.stable_notes[:3], (50, 54, 57)) # D, F#, A
+        # Shared and read-only
+        self.assertIs(table, get_scale_table('D', 'major', 3, 4))
+        # Spellings share one entry; unknown ones fall back to C / minor without new entries
+        self.assertIs(get_scale_table('d', 'Major', 3, 4), table)
+        self.assertIs(get_scale_table('Ebb', 'no such scale'), get_scale_table('C', 'minor'))
+        with self.assertRaises(TypeError):
+            table.index_map[53] = 1
+
 class TestGenerator(unittest.TestCase):
     def test_initialization(self):
         gen = MelodyGenerator('C', 'minor', 140)
@@ -36,6 +63,26 @@ class TestGenerator(unittest.TestCase):
         # Should be roughly 16 beats for 4 bars of 4/4
         self.assertAlmostEqual(total_duration, 16.0, delta=0.1)
 
+    def test_batch_generation(self):
+        gen = MelodyGenerator('C', 'minor', 140, length_bars=4)
+        for var in ['A', 'B', 'C']:
+            batch = gen.generate_batch(50, var, seed=7)
+            self.assertEqual(len(batch), 50)
+            for i in range(len(batch)):
+                melody = batch.melody(i)
+                self.assertTrue(len(melody) > 0)
+                for note in melody:
+                    self.assertIn(note['note'], gen.scale_notes)
+                # Phrase end resolves to a stable tone
+                self.assertIn(melody[-1]['note'], gen.stable_notes)
+                if var != 'B': # B leaves rests
+                    self.assertAlmostEqual(sum(n['duration'] for n in melody), 16.0)
+
+        # Same seed, same batch
+        a = gen.generate_batch(10, 'B', seed=3)
+        b = gen.generate_batch(10, 'B', seed=3)
+        self.assertEqual(a.melody(4), b.melody(4))
+
 class TestMidiWriter(unittest.TestCase):
     def test_write_file(self):
         writer = MidiWriter()
@@ -47,5 +94,249 @@ class TestMidiWriter(unittest.TestCase):
         self.assertGreater(os.path.getsize(filename), 0)
         os.remove(filename)
 
+class TestCatalog(unittest.TestCase):
+    def test_jobs_cover_grid_deterministically(self):
+        jobs = build_jobs(8, keys=['C', 'F#'], scales=['minor'], tempos=[140, 150], seed=1)
+        self.assertEqual(len({(j['key'], j['tempo'], j['variation']) for j in jobs}), 8)
+        self.assertEqual(jobs, build_jobs(8, keys=['C', 'F#'], scales=['minor'], tempos=[140, 150], seed=1))
+        self.assertEqual(len({j['seed'] for j in jobs}), 8)
+        self.assertEqual(job_filename(jobs[3]), '00003_C_minor_150bpm_var_A.mid')
+
+    def test_jobs_carry_render_options(self):
+        jobs = build_jobs(2, keys=['C'], scales=['minor'], seed=2, style='lofi', time_signature='6/8', candidates=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            render_catalog(jobs, tmp, workers=1)
+            with open(os.path.join(tmp, job_filename(jobs[0])), 'rb') as f:
+                conductor = MidiReader(f.read()).tracks()[0]
+        self.assertEqual(conductor.time_signatures, [(0, 6, 8)])
+        self.assertEqual((jobs[1]['style'], jobs[1]['candidates']), ('lofi', 8))
+
+    def test_parallel_render_matches_serial(self):
+        jobs = build_jobs(6, keys=['D'], scales=['phrygian'], seed=5)
+        with tempfile.TemporaryDirectory() as serial_dir, tempfile.TemporaryDirectory() as parallel_dir:
+            serial = render_catalog(jobs, serial_dir, workers=1)
+            parallel = render_catalog(jobs, parallel_dir, workers=2)
+            self.assertEqual(serial['files'], 6)
+            self.assertEqual(serial['bytes'], parallel['bytes'])
+            for job in jobs:
+                with open(os.path.join(serial_dir, job_filename(job)), 'rb') as a, \
+                     open(os.path.join(parallel_dir, job_filename(job)), 'rb') as b:
+                    data = a.read()
+                    self.assertEqual(data[0:4], b'MThd')
+                    self.assertEqual(data, b.read())
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_run_and_compare(self):
+        results = run_suite([4], cases=['chords'], min_time=0.01, report=None)
+        entry = results['results']['chords.generate_progression@4']
+        self.assertGreater(entry['ops_per_sec'], 0)
+        self.assertGreater(entry['peak_bytes'], 0)
+        self.assertEqual(compare_results(results, results), [])
+
+        slower = {'results': {'chords.generate_progression@4': {
+            'ops_per_sec': entry['ops_per_sec'] * 0.5, 'peak_bytes': entry['peak_bytes']}}}
+        self.assertEqual(len(compare_results(results, slower, threshold=0.25)), 1)
+        self.assertEqual(compare_results(results, slower, threshold=0.6), [])
+
+    def test_event_loop_is_closed(self):
+        from benchmarks import suite
+        results = run_suite([4], cases=['server'], min_time=0.01, report=None)
+        self.assertIn('server.generate_beat@4', results['results'])
+        self.assertIsNone(suite._loop) # The shared loop was closed, not leaked
+
+class TestTrackEncoder(unittest.TestCase):
+    def test_vectorized_matches_reference(self):
+        drums = DrumGenerator(140, seed=3).generate_pattern(16)
+        # Zero-length and overlapping notes on several channels
+        drums.append_ticks(40, 960, 0, 100, 0)
+        drums.append_ticks(41, 960, 0, 100, 1)
+        drums.append_ticks(60, 0, 100000, 100, 2)
+        for channel in [None, 9]:
+            for running_status, zero_velocity_offs in [(False, False), (True, False), (True, True)]:
+                self.assertEqual(
+                    encode_note_events_numpy(*drums.as_numpy(), channel=channel, running_status=running_status,
+                                             zero_velocity_offs=zero_velocity_offs),
+                    encode_note_events_python(drums, drums.resolution, channel, running_status, zero_velocity_offs))
+
+    def test_running_status_is_smaller(self):
+        drums = DrumGenerator(140, seed=3).generate_pattern(4)
+        full = MidiWriter()
+        full.add_track(drums, channel=9)
+        running = MidiWriter(running_status=True)
+        running.add_track(drums, channel=9)
+        self.assertLess(len(running.tracks[0]), len(full.tracks[0]))
+        # Zero-velocity note offs keep the whole track in one run of Note On status
+        compact = MidiWriter(compact=True)
+        compact.add_track(drums, channel=9)
+        self.assertLess(len(compact.tracks[0]), len(running.tracks[0]) * 0.85)
+        self.assertEqual(compact.tracks[0].count(0x99), 1)
+
+class TestMidiReader(unittest.TestCase):
+    def test_round_trip(self):
+        melody = MelodyGenerator('C', 'minor', 140, length_bars=4, seed=2).generate_variation('B')
+        drums = DrumGenerator(140, seed=2).generate_pattern(4)
+        for running_status in [False, True]:
+            writer = MidiWriter(running_status=running_status)
+            writer.add_track(melody, track_name="Melody", channel=0)
+            writer.add_track(drums, track_name="Drums", channel=9)
+            stream = io.BytesIO()
+            writer.write_to_stream(stream)
+
+            reader = MidiReader(stream.getvalue())
+            self.assertEqual((reader.format, reader.num_tracks, reader.resolution), (1, 2, 480))
+            tracks = reader.tracks()
+            self.assertEqual([t.name for t in tracks], ["Melody", "Drums"])
+            self.assertEqual(tracks[0].notes, melody)
+            self.assertEqual(tracks[1].notes, drums)
+
+            # Re-encoding what was read gives the same file
+            again = MidiWriter(running_status=running_status)
+            for track in tracks:
+                again.add_track(track.notes, track_name=track.name)
+            self.assertEqual(again.tracks, writer.tracks)
+
+    def test_compact_and_format_0(self):
+        melody = MelodyGenerator('C', 'minor', 140, length_bars=8, seed=2).generate_variation('B')
+        drums = DrumGenerator(140, seed=2).generate_pattern(8)
+        files = {}
+        for compact, midi_format in [(False, 1), (True, 1), (False, 0), (True, 0)]:
+            writer = MidiWriter(tempo=150, time_signature='4/4', compact=compact, midi_format=midi_format)
+            writer.add_track(melody, track_name="Melody", channel=0)
+            writer.add_track(drums, track_name="Drums", channel=9)
+            stream = io.BytesIO()
+            writer.write_to_stream(stream)
+            files[compact, midi_format] = data = stream.getvalue()
+
+            reader = MidiReader(data)
+            self.assertEqual((reader.format, reader.num_tracks), (midi_format, 3 if midi_format else 1))
+            tracks = reader.tracks()
+            self.assertEqual((tracks[0].tempos, tracks[0].time_signatures), ([(0, 400000)], [(0, 4, 4)]))
+            # Same notes whichever way they were packed
+            self.assertEqual(sorted(reader.notes().iter_ticks()),
+                             sorted([n[:4] + (0,) for n in melody.iter_ticks()] + [n[:4] + (9,) for n in drums.iter_ticks()]))
+        self.assertLess(len(files[True, 1]), len(files[False, 1]))
+        self.assertLess(len(files[True, 0]), len(files[False, 0]))
+
+    def test_merge_keeps_meta_events(self):
+        tempo = b'\x00\xFF\x51\x03\x07\xA1\x20\x00\xFF\x2F\x00'
+        notes = b'\x00\xFF\x03\x01X\x00\xF0\x02\x7E\xF7\x00\x91\x3C\x64\x60\x3C\x00\x10\xFF\x2F\x00'
+        self.assertEqual(bytes(merge_tracks([tempo, notes], running_status=True)),
+                         b'\x00\xFF\x51\x03\x07\xA1\x20\x00\xF0\x02\x7E\xF7\x00\x91\x3C\x64\x60\x3C\x00'
+                         b'\x10\xFF\x2F\x00')
+
+    def test_meta_events_and_running_status(self):
+        track = (b'\x00\xFF\x51\x03\x07\xA1\x20' # Tempo 500000 (120 BPM)
+                 b'\x00\xFF\x58\x04\x03\x02\x18\x08' # 3/4
+                 b'\x00\xF0\x02\x7E\xF7' # Sysex
+                 b'\x00\x91\x3C\x64' # Note On ch 1
+                 b'\x83\x60\x3C\x00' # Running status, velocity 0 = Note Off after 480 ticks
+                 b'\x00\xC1\x05' # Program change (1 data byte)
+                 b'\x00\xFF\x2F\x00')
+        data = b'MThd' + struct.pack('>LHHH', 6, 0, 1, 96) + b'MTrk' + struct.pack('>L', len(track)) + track
+        with tempfile.NamedTemporaryFile(suffix='.mid', delete=False) as f:
+            f.write(data)
+        try:
+            with MidiReader.open(f.name) as reader:
+                parsed = reader.tracks()[0]
+        finally:
+            os.remove(f.name)
+        self.assertEqual(parsed.tempos, [(0, 500000)])
+        self.assertEqual(parsed.time_signatures, [(0, 3, 4)])
+        self.assertEqual(len(parsed.notes), 1)
+        self.assertEqual(parsed.notes[0]['channel'], 1)
+        self.assertEqual(parsed.notes[0]['duration'], 5.0) # 480 ticks at 96 per beat
+        self.assertEqual(parsed.end_tick, 480)
+
+    def test_rejects_invalid(self):
+        with self.assertRaises(ValueError):
+            MidiReader(b'RIFF' + b'\x00' * 20)
+        with self.assertRaises(ValueError):
+            MidiReader(b'MThd' + struct.pack('>LHHH', 6, 2, 1, 480))
+
+class TestNoteBuffer(unittest.TestCase):
+    def test_dict_view(self):
+        notes = [{'note': 60, 'duration': 1.0, 'velocity': 100, 'offset': 0.0},
+                 {'note': 64, 'duration': 0.25, 'velocity': 90, 'offset': 1.5, 'channel': 9}]
+        buf = NoteBuffer.from_dicts(notes)
+        self.assertEqual(len(buf), 2)
+        self.assertEqual(list(buf.start), [0, 720])
+        self.assertEqual(buf[-1]['name'], 'E4')
+        self.assertEqual(buf[1]['duration'], 0.25)
+        self.assertEqual(buf[1]['channel'], 9)
+        self.assertEqual([n['offset'] for n in buf], [0.0, 1.5])
+        self.assertEqual(len(buf[1:]), 1)
+        # The views are read-only, so writes meant for the old list of dicts fail loudly
+        with self.assertRaises(TypeError):
+            buf[0]['velocity'] = 10
+        self.assertEqual(dict(buf[0], velocity=10)['velocity'], 10)
+
+        pitch, start, duration, velocity, channel = buf.as_numpy()
+        self.assertEqual(start.tolist(), [0, 720])
+
+    def test_writer_accepts_buffer_and_dicts(self):
+        notes = [{'note': 60, 'duration': 1.0, 'velocity': 100, 'offset': 0.0},
+                 {'note': 62, 'duration': 0.5, 'velocity': 80, 'offset': 1.0}]
+        from_dicts = MidiWriter()
+        from_dicts.add_track(notes, channel=3)
+        from_buffer = MidiWriter()
+        from_buffer.add_track(NoteBuffer.from_dicts(notes, resolution=960), channel=3)
+        self.assertEqual(from_dicts.tracks, from_buffer.tracks)
+
+class TestStreamingMidiWriter(unittest.TestCase):
+    def test_matches_midi_writer(self):
+        gen = MelodyGenerator('C', 'minor', 140, length_bars=8, seed=1)
+        melody = gen.generate_variation('B')
+
+        writer = MidiWriter()
+        writer.add_track(melody, track_name="Melody", channel=0)
+        writer.add_track(melody, track_name="Copy", channel=2)
+        expected = io.BytesIO()
+        writer.write_to_stream(expected)
+
+        # Seekable: lengths and track count back-patched in place
+        seekable = io.BytesIO()
+        with StreamingMidiWriter(seekable, chunk_size=16) as stream_writer:
+            stream_writer.add_track(iter(melody), track_name="Melody", channel=0)
+            stream_writer.add_track(iter(melody), track_name="Copy", channel=2)
+        self.assertEqual(seekable.getvalue(), expected.getvalue())
+
+        # Non-seekable: spooled through a temp file
+        class Pipe(io.BytesIO):
+            def seekable(self):
+                return False
+        pipe = Pipe()
+        with StreamingMidiWriter(pipe) as stream_writer:
+            stream_writer.add_track(iter(melody), track_name="Melody", channel=0)
+            stream_writer.add_track(iter(melody), track_name="Copy", channel=2)
+        self.assertEqual(pipe.getvalue(), expected.getvalue())
+
+    def test_rejects_unordered_notes(self):
+        notes = [{'note': 60, 'duration': 1.0, 'velocity': 100, 'offset': 1.0},
+                 {'note': 62, 'duration': 1.0, 'velocity': 100, 'offset': 0.0}]
+        with self.assertRaises(ValueError):
+            StreamingMidiWriter(io.BytesIO()).add_track(notes)
+
+    def test_long_render_constant_memory(self):
+        bars = 10000
+        def kicks():
+            for i in range(bars * 4):
+                yield {'note': 36, 'duration': 1.0, 'velocity': 120, 'offset': float(i)}
+
+        with tempfile.TemporaryFile() as f:
+            tracemalloc.start()
+            with StreamingMidiWriter(f) as writer:
+                writer.add_track(kicks(), track_name="Drums", channel=9)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            f.seek(0)
+            data = f.read()
+        self.assertEqual(data[0:4], b'MThd')
+        self.assertEqual(struct.unpack('>H', data[10:12])[0], 1)
+        self.assertEqual(struct.unpack('>L', data[18:22])[0], len(data) - 22)
+        # ~360 KB of track data, but memory stays at roughly one chunk
+        self.assertGreater(len(data), 300000)
+        self.assertLess(peak, 256 * 1024)
+
 if __name__ == '__main__':
     unittest.main()
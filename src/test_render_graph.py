@@ -0,0 +1,57 @@
+import unittest
+import contextlib
+import io
+import os
+import tempfile
+from src.midi_utils import MidiReader
+from src.render import render_beat
+from src.render_graph import RenderGraph
+from src import main as cli
+
+class TestRenderGraph(unittest.TestCase):
+    def test_stages_are_built_once(self):
+        graph = RenderGraph('F#', 'phrygian', 150, 8, seed=11)
+        files = [graph.to_midi((var,)) for var in 'ABC']
+        combined = graph.to_midi(('A', 'B', 'C'))
+        self.assertEqual(len(graph.built), len(set(graph.built)))
+        self.assertEqual(graph.built.count('chords'), 1)
+        self.assertEqual(graph.built.count(('track', 'drums', None)), 1)
+
+        # Same bytes as rendering each variation on its own
+        for var, data in zip('ABC', files):
+            self.assertEqual(data, render_beat('F#', 'phrygian', 150, 8, var, seed=11))
+
+        # One file: a melody track per variation, then the shared chords and drums
+        conductor, *tracks = MidiReader(combined).tracks()
+        self.assertEqual(conductor.tempos, [(0, 400000)]) # 150 BPM
+        self.assertEqual(len(tracks), 5)
+        for data, track in zip(files, tracks):
+            melody = MidiReader(data).tracks()[1]
+            self.assertEqual(list(track.notes.iter_ticks()), list(melody.notes.iter_ticks()))
+
+    def test_seeded_variations_have_their_own_rhythm(self):
+        for seed in (1, 2, 7):
+            graph = RenderGraph(bars=4, seed=seed)
+            starts = [tuple(graph.melody(var).start) for var in 'ABC']
+            self.assertEqual(len(set(starts)), 3, msg=f"seed {seed}")
+
+    def test_unseeded_variations_share_accompaniment(self):
+        graph = RenderGraph(bars=4)
+        files = [MidiReader(graph.to_midi((var,))).tracks() for var in 'ABC']
+        for part in (2, 3): # Chords, drums (after the conductor and melody tracks)
+            self.assertEqual(list(files[0][part].notes.iter_ticks()), list(files[2][part].notes.iter_ticks()))
+
+        # Stems: a single part without melody
+        self.assertEqual(len(MidiReader(graph.to_midi((), add_chords=False)).tracks()), 2)
+
+    def test_cli_single_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, 'beat')
+            with contextlib.redirect_stdout(io.StringIO()):
+                cli.main(['--seed', '3', '--chords', '--drums', '--output', base, '--single-file'], use_daemon=False)
+            self.assertEqual(os.listdir(tmp), ['beat_all.mid'])
+            with open(base + '_all.mid', 'rb') as f:
+                self.assertEqual(f.read(), RenderGraph(seed=3).to_midi(('A', 'B', 'C')))
+
+if __name__ == '__main__':
+    unittest.main()
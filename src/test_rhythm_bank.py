@@ -0,0 +1,71 @@
+import unittest
+import random
+import numpy as np
+from src.rhythm_bank import get_rhythm_bank, grid_units
+from src.generator import MelodyGenerator
+
+TRAP = ([0.25, 0.5, 1.0, 1.5], [30, 30, 30, 10])
+
+class TestRhythmBank(unittest.TestCase):
+    def test_bank_holds_every_bar(self):
+        bank = get_rhythm_bank(*TRAP, beats_per_bar=4)
+        self.assertTrue(bank.exact)
+        self.assertIs(bank, get_rhythm_bank(*TRAP, beats_per_bar=4))
+        self.assertAlmostEqual(bank.probability.sum(), 1.0)
+        # Every rhythm fills the bar exactly, and no rhythm appears twice
+        self.assertTrue(np.all(bank.durations.sum(axis=1) == 16))
+        self.assertEqual(len({tuple(row) for row in bank.durations.tolist()}), len(bank))
+
+        # Four quarter notes: p(1.0)^3 * P(draw >= 1.0)
+        idx = next(i for i in range(len(bank)) if bank.pattern(i) == [1.0] * 4)
+        self.assertAlmostEqual(bank.probability[idx], 0.3 ** 3 * 0.4)
+        self.assertEqual(bank.density[idx], 0.25)
+        self.assertEqual(bank.syncopation[idx], 0.0)
+
+    def test_features_and_queries(self):
+        bank = get_rhythm_bank(*TRAP, beats_per_bar=4)
+        # Dotted quarters push beats 2 and 3 off the grid: beat 2 is held over from 1.5
+        idx = next(i for i in range(len(bank)) if bank.pattern(i) == [1.5, 1.5, 1.0])
+        self.assertAlmostEqual(bank.syncopation[idx], 1 / 3)
+
+        busy = bank.query(density=(0.6, 0.8))
+        self.assertTrue(np.all((busy.density >= 0.6) & (busy.density <= 0.8)))
+        self.assertIs(busy, bank.query(density=(0.6, 0.8)))
+        rng = random.Random(0)
+        for _ in range(20):
+            self.assertTrue(9 <= len(busy.sample(rng)) <= 13)
+        with self.assertRaises(ValueError):
+            bank.query(density=(2.0, 3.0))
+
+    def test_triplet_grid(self):
+        self.assertEqual(grid_units([0.25, 0.5]), 4)
+        self.assertEqual(grid_units([1 / 3, 1.0]), 3)
+        self.assertEqual(grid_units([0.25, 1 / 3]), 12)
+        bank = get_rhythm_bank([1 / 3, 2 / 3, 1.0], [1, 1, 1], beats_per_bar=3)
+        self.assertEqual(bank.units_per_beat, 3)
+        self.assertTrue(np.all(bank.durations.sum(axis=1) == 9))
+
+    def test_generator_uses_bank(self):
+        gen = MelodyGenerator('C', 'minor', 140, seed=5)
+        counts = {}
+        for _ in range(20000):
+            key = tuple(gen.generate_rhythm_pattern(4))
+            counts[key] = counts.get(key, 0) + 1
+        # Matches the draw-until-full distribution
+        self.assertAlmostEqual(counts[(1.0, 1.0, 1.0, 1.0)] / 20000, 0.3 ** 3 * 0.4, delta=0.004)
+
+        sparse = gen.generate_rhythm_pattern(4, density='low')
+        self.assertLessEqual(len(sparse), 4)
+        self.assertAlmostEqual(sum(gen.generate_rhythm_pattern(4, style='triplet')), 4.0)
+        # Lengths off the grid still work note by note
+        self.assertAlmostEqual(sum(gen.generate_rhythm_pattern(2.1)), 2.1)
+
+    def test_long_bars_are_not_indexed(self):
+        # Too many rhythms to enumerate: no bank, and the generator draws note by note
+        self.assertIsNone(get_rhythm_bank(*TRAP, beats_per_bar=16))
+        gen = MelodyGenerator('C', 'minor', 140, time_signature='16/4', seed=1)
+        self.assertIsNone(gen.get_rhythm_bank())
+        self.assertAlmostEqual(sum(gen.generate_rhythm_pattern(16)), 16.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import asyncio
+import numpy as np
+from src.generator import MelodyGenerator
+from src.accompaniment import ChordGenerator
+from src.render_graph import RenderGraph
+from src.scoring import MelodyScorer, best_of_k, beam_search, chord_pitch_classes
+from src.server import generate_beat
+
+def as_rows(*melodies):
+    """(pitch, scale_index, offset, duration, mask) rows for melodies given as [(scale_index, offset, duration)]."""
+    gen = MelodyGenerator('C', 'major', 120, length_bars=1)
+    width = max(len(m) for m in melodies)
+    index = np.zeros((len(melodies), width), dtype=np.int64)
+    offset = np.zeros((len(melodies), width))
+    duration = np.zeros((len(melodies), width))
+    mask = np.zeros((len(melodies), width), dtype=bool)
+    for i, melody in enumerate(melodies):
+        for j, (idx, start, dur) in enumerate(melody):
+            index[i, j], offset[i, j], duration[i, j], mask[i, j] = idx, start, dur, True
+    pitch = np.asarray(gen.scale_notes)[index]
+    return gen, (pitch, index, offset, duration, mask)
+
+class TestMelodyScorer(unittest.TestCase):
+    def test_metrics(self):
+        gen, rows = as_rows(
+            [(7, 0, 1), (8, 1, 1), (9, 2, 1), (8, 3, 1)], # Scale steps, ends off a stable tone
+            [(7, 0, 1), (11, 1, 1), (4, 2, 1), (7, 3, 1)], # Leaps, lands on stable tones
+        )
+        metrics = MelodyScorer(gen).metrics(*rows)
+        self.assertEqual(list(metrics['stepwise']), [1.0, 0.0])
+        self.assertEqual(metrics['stable'][1], 1.0)
+        self.assertLess(metrics['stable'][0], 1.0)
+        self.assertEqual(list(metrics['density']), [1.0, 1.0])
+        self.assertEqual(metrics['repetition'][0], 0.0)
+
+        # Padding and rests don't count: the same notes spread over more slots score the same
+        _, padded = as_rows([(7, 0, 1), (8, 1, 1), (9, 2, 1), (8, 3, 1), (0, 0, 0)])
+        padded[4][0, 4] = False
+        for name, values in MelodyScorer(gen).metrics(*padded).items():
+            self.assertAlmostEqual(values[0], metrics[name][0], msg=name)
+
+    def test_chord_tones(self):
+        gen = MelodyGenerator('C', 'major', 120, length_bars=2)
+        chords = ChordGenerator('C', 'major').progression_to_notes([[60, 64, 67], [65, 69, 72]])
+        table = chord_pitch_classes(chords, gen.bar_ticks, 2)
+        self.assertEqual([list(np.nonzero(bar)[0]) for bar in table], [[0, 4, 7], [0, 5, 9]])
+
+        index = gen.scale_index
+        notes = [[64, 67, 65, 69], [65, 62, 64, 71]] # Chord tones in both bars / in neither
+        pitch = np.array(notes)
+        scale_index = np.vectorize(index.get)(pitch)
+        offset = np.tile([0.0, 2.0, 4.0, 6.0], (2, 1))
+        metrics = MelodyScorer(gen, chords).metrics(pitch, scale_index, offset, np.full((2, 4), 2.0),
+                                                    np.ones((2, 4), dtype=bool))
+        self.assertEqual(list(metrics['chord_tones']), [1.0, 0.0])
+
+class TestSearch(unittest.TestCase):
+    def test_best_of_k(self):
+        chords = RenderGraph(bars=4, seed=1).chords()
+        gen = MelodyGenerator('C', 'minor', 140, seed=5)
+        results = best_of_k(gen, 'A', candidates=256, top=5, chords=chords)
+        scores = [score for score, _ in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        # Better than a typical draw, and reproducible from the generator seed
+        batch = MelodyGenerator('C', 'minor', 140, seed=9).generate_batch(256, 'A')
+        typical = np.median(MelodyScorer(gen, chords).score(batch))
+        self.assertGreater(scores[0], typical)
+        again = best_of_k(MelodyGenerator('C', 'minor', 140, seed=5), 'A', candidates=256, top=5, chords=chords)
+        self.assertEqual(again[0][1], results[0][1])
+
+    def test_beam_search(self):
+        chords = RenderGraph(bars=4, seed=1).chords()
+        for variation in 'ABC':
+            score, melody = beam_search(MelodyGenerator('C', 'minor', 140, seed=3), variation, 128, 4, chords)
+            self.assertTrue(0 < score <= 1)
+            self.assertTrue(all(start % 120 == 0 for start in melody.start)) # 16th grid
+            self.assertLessEqual(melody.start[-1] + melody.duration[-1], 4 * 1920)
+            self.assertEqual(list(melody.start), sorted(melody.start))
+            again = beam_search(MelodyGenerator('C', 'minor', 140, seed=3), variation, 128, 4, chords)
+            self.assertEqual(again[1], melody)
+
+    def test_zero_bars(self):
+        gen = MelodyGenerator('C', 'minor', 140, length_bars=0, seed=1)
+        with np.errstate(all='raise'):
+            (score, melody), = best_of_k(gen, 'A', candidates=8)
+            self.assertEqual(len(melody), 0)
+            self.assertFalse(np.isnan(score))
+            self.assertEqual(len(beam_search(gen, 'A', 8, 2)[1]), 0)
+
+    def test_render_with_candidates(self):
+        graph = RenderGraph(bars=4, seed=2, candidates=64)
+        graph.to_midi(('A',))
+        self.assertEqual(graph.built[:2], ['chords', ('melody', 'A')]) # Scored against the chords
+        self.assertNotEqual(graph.melody('A'), RenderGraph(bars=4, seed=2).melody('A'))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(generate_beat(seed=1, candidates=0))
+        with self.assertRaises(ValueError):
+            asyncio.run(generate_beat(seed=1, candidates=8, beam_width=1000))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import contextlib
+import io
+import os
+import tempfile
+from src.midi_utils import MidiWriter, MidiReader, encode_segment, splice_segments, encode_note_events
+from src.notes import NoteBuffer
+from src.song import Song, TRACKS
+from src import main as cli
+
+class TestSegments(unittest.TestCase):
+    def test_splice_matches_single_encode(self):
+        a = NoteBuffer.from_dicts([{'note': 60, 'offset': 0.5, 'duration': 1.0, 'velocity': 90},
+                                   {'note': 62, 'offset': 2.0, 'duration': 2.0, 'velocity': 100}])
+        b = NoteBuffer.from_dicts([{'note': 64, 'offset': 0.0, 'duration': 4.0, 'velocity': 80}])
+        seg_a, seg_b = encode_segment(a, 480), encode_segment(b, 480)
+        self.assertEqual((seg_a.first_tick, seg_a.last_tick), (240, 1920))
+
+        # a, b, a laid out back to back in 4-beat sections
+        whole = NoteBuffer()
+        for i, section in enumerate([a, b, a]):
+            for start, duration, pitch, velocity, channel in section.iter_ticks():
+                whole.append_ticks(pitch, start + i * 1920, duration, velocity, channel)
+        spliced = splice_segments([(0, seg_a), (1920, seg_b), (3840, seg_a), (5760, encode_segment([], 480))])
+        self.assertEqual(spliced, encode_note_events(whole, 480))
+
+        with self.assertRaises(ValueError):
+            splice_segments([(0, seg_a), (960, seg_b)])
+
+class TestSong(unittest.TestCase):
+    def test_song_export(self):
+        song = Song('D', 'minor', 140, seed=7)
+        self.assertEqual(song.total_bars, 96)
+        data = song.to_midi()
+
+        # Splicing gives exactly what encoding the expanded song would
+        writer = MidiWriter(tempo=140, time_signature='4/4')
+        for track_name, channel, part in TRACKS:
+            writer.add_track(song.to_notes(part), track_name=track_name, channel=channel)
+        stream = io.BytesIO()
+        writer.write_to_stream(stream)
+        self.assertEqual(data, stream.getvalue())
+
+        # Each unique section is generated and encoded once
+        self.assertEqual(set(song._parts), set(song.form))
+        self.assertEqual(len(song._segments), len(set(song.form)) * len(TRACKS))
+        self.assertEqual(song.to_midi(), data)
+        self.assertEqual(Song('D', 'minor', 140, seed=7).to_midi(), data)
+
+    def test_running_status_restarts_at_splices(self):
+        song = Song(form=['hook', 'hook', 'verse'], sections={'verse': {'bars': 4}}, seed=1)
+        compact = song.to_midi(running_status=True)
+        self.assertLess(len(compact), len(song.to_midi()))
+        conductor, *tracks = MidiReader(compact).tracks()
+        self.assertEqual((conductor.tempos, conductor.time_signatures), ([(0, 428571)], [(0, 4, 4)]))
+        self.assertEqual([t.name for t in tracks], ["Melody", "Chords", "Drums"])
+        self.assertEqual(tracks[2].notes, song.to_notes('drums'))
+
+    def test_time_signature(self):
+        song = Song(form=['intro', 'verse'], sections={'intro': {'bars': 2}, 'verse': {'bars': 2}}, seed=4,
+                    time_signature='6/8')
+        conductor, *tracks = MidiReader(song.to_midi()).tracks()
+        self.assertEqual(conductor.time_signatures, [(0, 6, 8)])
+        # Sections are laid out in 6/8 bars (1440 ticks) and every part stays inside its bars
+        self.assertEqual(tracks[1].notes, song.to_notes('chords'))
+        chord_starts = sorted({start for start, *_ in song.to_notes('chords').iter_ticks()})
+        self.assertEqual(chord_starts, [0, 1440, 2880, 4320])
+        for part in ('melody', 'drums'):
+            self.assertLessEqual(max(s + d for s, d, *_ in song.to_notes(part).iter_ticks()), 4 * 1440)
+
+    def test_cli_options(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, 'demo')
+            with contextlib.redirect_stdout(io.StringIO()):
+                cli.main(['--song', 'hook', '--seed', '1', '--time-signature', '6/8', '--output', base], use_daemon=False)
+            with open(base + '_song.mid', 'rb') as f:
+                self.assertEqual(MidiReader(f.read()).tracks()[0].time_signatures, [(0, 6, 8)])
+
+        # Options song mode has no use for are refused, not silently dropped
+        for extra in (['--candidates', '8'], ['--markov-model', 'model.npz'], ['--compact']):
+            with self.assertRaises(SystemExit) as raised, contextlib.redirect_stderr(io.StringIO()):
+                cli.main(['--song'] + extra, use_daemon=False)
+            self.assertEqual(raised.exception.code, 2)
+
+    def test_custom_sections(self):
+        song = Song(form=['intro', 'drop'], sections={'drop': {'bars': 4, 'variation': 'B', 'chords': False}}, seed=2)
+        self.assertEqual(song.timeline(), [('intro', 0), ('drop', 8)])
+        self.assertEqual(len(song.to_notes('chords')), len(song.section_parts('intro')['chords']))
+        with self.assertRaises(ValueError):
+            Song(form=['verse', 'chorus'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import itertools
+import tempfile
+import tracemalloc
+from src.generator import MelodyGenerator
+from src.accompaniment import ChordGenerator, DrumGenerator
+from src.midi_utils import StreamingMidiWriter, MidiReader
+from src.notes import NoteBuffer
+from src.transforms import pipeline, transpose, quantize, swing, humanize_velocity, remap_channels
+
+class TestIterators(unittest.TestCase):
+    def test_iter_variation_matches_generate_variation(self):
+        for bars in (1, 4, 8):
+            for var in 'ABC':
+                lazy = MelodyGenerator('C', 'minor', 140, length_bars=bars, seed=3).iter_variation(var)
+                eager = MelodyGenerator('C', 'minor', 140, length_bars=bars, seed=3).generate_variation(var)
+                self.assertEqual(NoteBuffer.from_dicts(lazy), eager)
+
+    def test_iter_progression_matches(self):
+        gen = ChordGenerator('D', 'minor', seed=5, style='lofi')
+        eager = gen.progression_to_notes(gen.generate_progression(8))
+        lazy = NoteBuffer.from_dicts(ChordGenerator('D', 'minor', seed=5, style='lofi').iter_notes(8))
+        self.assertEqual(lazy, eager)
+
+    def test_iter_pattern(self):
+        notes = list(DrumGenerator(140, seed=1).iter_pattern(40, fill_every=8))
+        self.assertEqual([n['offset'] for n in notes], sorted(n['offset'] for n in notes))
+        self.assertEqual(sum(1 for n in notes if n['note'] == 38 and n['offset'] % 4 == 2), 40) # Backbeat in every bar
+        self.assertEqual({n['channel'] for n in notes}, {9})
+        # Fills land on absolute bar numbers, across block boundaries
+        fill_bars = {int(n['offset'] // 4) for n in notes if n['note'] == 38 and n['offset'] % 4 >= 3}
+        self.assertEqual(fill_bars, {7, 15, 23, 31, 39})
+        self.assertEqual(notes, list(DrumGenerator(140, seed=1).iter_pattern(40, fill_every=8)))
+
+    def test_streaming_memory_is_flat(self):
+        def peak(bars):
+            gen = MelodyGenerator('C', 'minor', 140, length_bars=bars, seed=1)
+            with tempfile.TemporaryFile() as f:
+                tracemalloc.start()
+                with StreamingMidiWriter(f, chunk_size=4096) as writer:
+                    writer.add_track(gen.iter_variation('B'), channel=0)
+                    writer.add_track(DrumGenerator(140, seed=1).iter_pattern(bars), channel=9)
+                result = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return result
+        peak(500) # Warm the process-wide rhythm bank and bar layout caches
+        # ~600 KB of notes as NoteBuffers; a few chunks when streamed
+        self.assertLess(peak(500), 128 * 1024)
+
+class TestTransforms(unittest.TestCase):
+    def setUp(self):
+        self.events = [
+            {'note': 60, 'name': 'C4', 'duration': 0.5, 'velocity': 100, 'offset': 0.0, 'channel': 0},
+            {'note': 62, 'name': 'D4', 'duration': 0.5, 'velocity': 100, 'offset': 0.5, 'channel': 0},
+            {'note': 64, 'name': 'E4', 'duration': 0.25, 'velocity': 100, 'offset': 1.1, 'channel': 2},
+        ]
+
+    def test_stages(self):
+        up = list(transpose(12)(self.events))
+        self.assertEqual([(e['note'], e['name']) for e in up], [(72, 'C5'), (74, 'D5'), (76, 'E5')])
+        self.assertEqual(self.events[0]['note'], 60) # Inputs are not modified
+        with self.assertRaises(ValueError):
+            list(transpose(80)(self.events))
+
+        self.assertEqual([e['offset'] for e in quantize(0.25)(self.events)], [0.0, 0.5, 1.0])
+        self.assertAlmostEqual(list(quantize(0.25, strength=0.5)(self.events))[2]['offset'], 1.05)
+
+        swung = list(swing(2 / 3)(self.events))
+        self.assertAlmostEqual(swung[1]['offset'], 2 / 3) # Off-beat 8th pushed to the triplet
+        self.assertAlmostEqual(swung[0]['duration'], 2 / 3)
+        self.assertAlmostEqual(swung[1]['offset'] + swung[1]['duration'], 1.0)
+
+        self.assertEqual([e['channel'] for e in remap_channels({0: 3})(self.events)], [3, 3, 2])
+        self.assertEqual({e['channel'] for e in remap_channels(5)(self.events)}, {5})
+
+        stage = humanize_velocity(10, seed=1)
+        velocities = [e['velocity'] for e in stage(self.events)]
+        self.assertTrue(all(90 <= v <= 110 for v in velocities))
+        self.assertEqual(velocities, [e['velocity'] for e in stage(self.events)])
+
+    def test_pipeline_is_lazy(self):
+        gen = MelodyGenerator('C', 'minor', 140, length_bars=100000, seed=2)
+        events = pipeline(gen.iter_variation('A'), transpose(-12), quantize(0.5), swing(0.6),
+                          humanize_velocity(5, seed=3), remap_channels(4))
+        # Only the first few of ~100k bars' worth of notes get generated
+        first = list(itertools.islice(events, 8))
+        offsets = [e['offset'] for e in first]
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertEqual({e['channel'] for e in first}, {4})
+
+    def test_pipeline_to_midi(self):
+        gen = MelodyGenerator('F', 'minor', 140, length_bars=8, seed=4)
+        events = pipeline(gen.iter_variation('C'), transpose(2), remap_channels(1))
+        with tempfile.TemporaryFile() as f:
+            with StreamingMidiWriter(f) as writer:
+                writer.add_track(events)
+            f.seek(0)
+            notes = MidiReader(f.read()).notes()
+        expected = MelodyGenerator('F', 'minor', 140, length_bars=8, seed=4).generate_variation('C')
+        self.assertEqual(list(notes.pitch), [p + 2 for p in expected.pitch])
+        self.assertEqual(set(notes.channel), {1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import json
+import os
+import random
+import tempfile
+import numpy as np
+from src.sampling import AliasSampler, get_sampler, bernoulli_sampler
+from src.styles import load_style, list_styles, StylePreset
+from src.generator import MelodyGenerator
+from src.accompaniment import DrumGenerator
+
+class TestAliasSampler(unittest.TestCase):
+    def test_exact_probabilities(self):
+        sampler = AliasSampler([-2, 2, 0, -3, 3, 7, -7], [2, 2, 3, 1, 1, 0.5, 0.5])
+        for value, weight in zip(sampler.values, [2, 2, 3, 1, 1, 0.5, 0.5]):
+            self.assertAlmostEqual(sampler.probability(value), weight / 10)
+
+    def test_draw_distribution(self):
+        sampler = AliasSampler(['a', 'b', 'c'], [1, 2, 7])
+        rng = random.Random(0)
+        draws = sampler.draw_many(20000, rng)
+        self.assertAlmostEqual(draws.count('c') / 20000, 0.7, delta=0.02)
+        self.assertAlmostEqual(draws.count('a') / 20000, 0.1, delta=0.02)
+
+        bulk = sampler.sample((100, 200), np.random.default_rng(0))
+        self.assertEqual(bulk.shape, (100, 200))
+        self.assertAlmostEqual(np.mean(bulk == 'b'), 0.2, delta=0.02)
+
+    def test_shared_and_validated(self):
+        self.assertIs(get_sampler([1, 2], [1, 3]), get_sampler((1, 2), (1.0, 3.0)))
+        with self.assertRaises(ValueError):
+            AliasSampler([1, 2], [1])
+        with self.assertRaises(ValueError):
+            AliasSampler([1, 2], [0, 0])
+
+    def test_bernoulli_masks(self):
+        sampler = bernoulli_sampler([0.4] * 4)
+        self.assertEqual(len(sampler.values), 16)
+        self.assertAlmostEqual(sampler.probability((False,) * 4), 0.6 ** 4)
+        hits = np.array(sampler.draw_many(20000, random.Random(1)))
+        np.testing.assert_allclose(hits.mean(axis=0), 0.4, atol=0.02)
+
+        # Long patterns flip a coin per step, with the same mask indexing
+        long = bernoulli_sampler([0.25] * 32)
+        self.assertEqual(len(long.values), 1 << 32)
+        indices = long.sample_indices(5000, np.random.default_rng(1))
+        masks = np.array([long.values[int(i)] for i in indices[:500]])
+        np.testing.assert_allclose(masks.mean(axis=0), 0.25, atol=0.08)
+        self.assertAlmostEqual(long.probability((False,) * 32), 0.75 ** 32)
+        with self.assertRaises(ValueError):
+            bernoulli_sampler([0.5] * 33)
+
+        # 32nd-note hats render
+        drums = DrumGenerator(140, seed=1, style={'drums': {'hat_steps': 32}}).generate_pattern(4)
+        self.assertTrue(all(start < 4 * 1920 for start in drums.start))
+
+class TestStylePresets(unittest.TestCase):
+    def test_default_and_named_presets(self):
+        default = load_style()
+        self.assertIs(default, load_style('default'))
+        self.assertIn('lofi', list_styles())
+        lofi = load_style('lofi')
+        self.assertEqual(lofi.kick_spots, (1.5, 2.5, 3.5))
+        # Values the preset does not set fall back to the defaults
+        self.assertIs(lofi.voice_leading['A'], default.voice_leading['A'])
+        with self.assertRaises(ValueError):
+            load_style('no-such-style')
+        # Preset names stay inside the preset directory
+        with self.assertRaises(ValueError):
+            load_style('../style_presets/lofi')
+
+    def test_json_preset_drives_generators(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'quarters.json')
+            with open(path, 'w') as f:
+                json.dump({'rhythm': {'trap': {'durations': [1.0], 'weights': [1]}},
+                           'drums': {'hat_roll_probability': 0.0, 'kick_probability': 0.0}}, f)
+            style = load_style(path)
+            self.assertIs(load_style(path), style) # Compiled once
+
+            # An edited preset is compiled again
+            with open(path, 'w') as f:
+                json.dump({'drums': {'kick_probability': 1.0}}, f)
+            info = os.stat(path)
+            os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 1))
+            edited = load_style(path)
+            self.assertEqual(edited.params['drums']['kick_probability'], 1.0)
+            self.assertEqual(style.params['drums']['kick_probability'], 0.0)
+
+        gen = MelodyGenerator('C', 'minor', 140, seed=1, style=style)
+        self.assertEqual(set(n['duration'] for n in gen.generate_variation('A')), {1.0})
+        batch = gen.generate_batch(5, 'A', seed=2)
+        self.assertTrue(np.all(batch.duration[batch.mask] == 1.0))
+
+        drums = DrumGenerator(140, seed=1, style=style).generate_pattern(2)
+        self.assertEqual([n['note'] for n in drums].count(36), 2) # Only the downbeat kicks
+        self.assertEqual([n['note'] for n in drums].count(42), 16) # No rolls
+
+    def test_dict_overrides(self):
+        style = load_style({'voice_leading': {'A': {'steps': [0], 'weights': [1]}}})
+        self.assertIsInstance(style, StylePreset)
+        gen = MelodyGenerator('C', 'major', 120, seed=3, style=style)
+        # Always repeating the start note (only end-of-phrase snapping may move it)
+        self.assertLessEqual(len(set(n['note'] for n in gen.generate_variation('A'))), 2)
+
+if __name__ == '__main__':
+    unittest.main()
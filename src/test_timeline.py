@@ -0,0 +1,92 @@
+import unittest
+import io
+import struct
+from src.timeline import beats_to_ticks, bar_ticks, parse_time_signature, quarter_beats, tempo_to_mpq, metronome_clocks
+from src.generator import MelodyGenerator
+from src.accompaniment import DrumGenerator
+from src.drums import KICK, SNARE
+from src.midi_utils import MidiWriter, StreamingMidiWriter, MidiReader
+from src.render import render_beat
+
+TRIPLETS = {'rhythm': {'trap': {'durations': [1 / 3, 2 / 3, 1.0], 'weights': [1, 1, 1]}}}
+
+class TestTimeline(unittest.TestCase):
+    def test_meters(self):
+        self.assertEqual(beats_to_ticks(7 / 3), 1120) # int() would truncate to 1119
+        self.assertEqual(parse_time_signature('6/8'), (6, 8))
+        self.assertEqual(parse_time_signature((3, 4)), (3, 4))
+        self.assertEqual([bar_ticks(4, 4), bar_ticks(6, 8), bar_ticks(7, 8)], [1920, 1440, 1680])
+        self.assertEqual([quarter_beats(4, 4), quarter_beats(6, 8), quarter_beats(7, 8)], [4, 3, 3.5])
+        self.assertEqual([metronome_clocks(4, 4), metronome_clocks(6, 8), metronome_clocks(3, 8)], [24, 36, 12])
+        self.assertEqual(tempo_to_mpq(120), 500000)
+        for bad in ('4/3', 'waltz', '0/4', '33/4', '300/4', '4/64'):
+            with self.assertRaises(ValueError):
+                parse_time_signature(bad)
+
+    def test_triplet_melody_stays_on_grid(self):
+        gen = MelodyGenerator('C', 'minor', 140, length_bars=64, seed=4, style=TRIPLETS)
+        melody = gen.generate_variation('A')
+        self.assertTrue(all(start % 160 == 0 and duration % 160 == 0 for start, duration, *_ in melody.iter_ticks()))
+        self.assertEqual(melody.start[-1] + melody.duration[-1], 64 * 1920)
+        # The lazy path yields the same ticks
+        lazy = MelodyGenerator('C', 'minor', 140, length_bars=64, seed=4, style=TRIPLETS).iter_variation('A')
+        self.assertEqual([beats_to_ticks(n['offset']) for n in lazy], list(melody.start))
+
+        # Off-grid durations are drawn note by note and still fill the bar exactly
+        gen = MelodyGenerator('C', 'minor', 140, seed=1, style={'rhythm': {'trap': {'durations': [0.3, 0.7], 'weights': [1, 1]}}})
+        self.assertEqual(sum(gen.generate_rhythm_ticks(4)), 1920)
+
+    def test_drums_follow_time_signature(self):
+        for meter, snare_tick in (('4/4', 960), ('3/4', 480), ('6/8', 720), ('7/8', 720)):
+            drums = DrumGenerator(140, seed=2, time_signature=meter)
+            bar = drums.bar_ticks
+            notes = drums.generate_pattern(8, fill_every=4)
+            for bar_idx in range(8):
+                hits = [(start - bar_idx * bar, note) for start, _, note, _, _ in notes.iter_ticks()
+                        if bar_idx * bar <= start < (bar_idx + 1) * bar]
+                self.assertIn((0, KICK), hits)
+                self.assertIn((snare_tick, SNARE), hits, meter)
+            self.assertLess(max(notes.start), 8 * bar)
+            self.assertEqual(notes, DrumGenerator(140, seed=2, time_signature=meter).generate_pattern(8, fill_every=4))
+
+    def test_melody_in_compound_meter(self):
+        data = render_beat(bars=4, seed=3, time_signature='6/8')
+        conductor, melody, chords, drums = MidiReader(data).tracks()
+        self.assertEqual(conductor.time_signatures, [(0, 6, 8)])
+        self.assertEqual(melody.notes.start[-1] + melody.notes.duration[-1], 4 * 1440)
+        self.assertEqual(list(chords.notes.start[::3]), [0, 1440, 2880, 4320])
+
+class TestConductorTrack(unittest.TestCase):
+    def test_tempo_map_and_time_signatures(self):
+        writer = MidiWriter(tempo=120, time_signature='4/4')
+        writer.set_tempo(90, tick=1920)
+        writer.set_time_signature('6/8', tick=3840)
+        writer.add_track(DrumGenerator(140, seed=1).generate_pattern(2), track_name="Drums", channel=9)
+        stream = io.BytesIO()
+        writer.write_to_stream(stream)
+        data = stream.getvalue()
+        # 6/8 counts in dotted quarters (36 clocks per click)
+        self.assertIn(b'\xFF\x58\x04\x06\x03\x24\x08', data)
+
+        reader = MidiReader(data)
+        self.assertEqual(reader.num_tracks, 2)
+        conductor, drums = reader.tracks()
+        self.assertEqual(conductor.tempos, [(0, 500000), (1920, 666667)])
+        self.assertEqual(conductor.time_signatures, [(0, 4, 4), (3840, 6, 8)])
+        self.assertEqual(len(conductor.notes), 0)
+        self.assertEqual(drums.name, "Drums")
+
+        with self.assertRaises(ValueError):
+            writer.set_tempo(0)
+
+    def test_streaming_writer(self):
+        stream = io.BytesIO()
+        with StreamingMidiWriter(stream, tempo=150, time_signature='3/4') as writer:
+            writer.add_track(DrumGenerator(150, seed=1, time_signature='3/4').iter_pattern(4), track_name="Drums")
+        reader = MidiReader(stream.getvalue())
+        self.assertEqual(struct.unpack('>H', stream.getvalue()[10:12])[0], 2)
+        conductor = reader.tracks()[0]
+        self.assertEqual((conductor.tempos, conductor.time_signatures), ([(0, 400000)], [(0, 3, 4)]))
+
+if __name__ == '__main__':
+    unittest.main()
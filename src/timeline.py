@@ -0,0 +1,71 @@
+# Integer tick timeline shared by the generators, the encoders and the MIDI writer.
+# Notes are stored and encoded as whole ticks at PPQ ticks per quarter note; beats (floats)
+# only appear at the edges (style tables, note dicts), and are converted with rounding, never
+# truncation, so 1/3 of a beat is exactly 160 ticks however many triplets precede it.
+PPQ = 480
+# The grid of every generated onset: 24 units per beat holds 16ths (6 units), 8th triplets (8),
+# 16th triplets (4) and 32nds (3) exactly, at 20 ticks per unit.
+GRID_UNITS_PER_BEAT = 24
+GRID_TICKS = PPQ // GRID_UNITS_PER_BEAT
+# Largest accepted time signature numerator and denominator (e.g. 32/32)
+MAX_NUMERATOR = 32
+MAX_DENOMINATOR = 32
+
+def beats_to_ticks(beats, resolution=PPQ):
+    """Nearest whole tick for a time in beats (quarter notes)."""
+    return int(round(beats * resolution))
+
+def grid_ticks(units_per_beat, resolution=PPQ):
+    """Ticks per unit of a grid with units_per_beat units per beat (must divide the resolution)."""
+    if units_per_beat <= 0 or resolution % units_per_beat:
+        raise ValueError(f"{units_per_beat} units per beat do not fit {resolution} ticks per beat")
+    return resolution // units_per_beat
+
+def parse_time_signature(time_signature):
+    """
+    (numerator, denominator) from '6/8' or a pair. The numerator is 1..MAX_NUMERATOR and the
+    denominator a power of two up to MAX_DENOMINATOR.
+    """
+    if isinstance(time_signature, str):
+        try:
+            numerator, denominator = (int(part) for part in time_signature.split('/'))
+        except ValueError:
+            raise ValueError(f"Invalid time signature: {time_signature!r} (expected e.g. '4/4')")
+    else:
+        numerator, denominator = time_signature
+    if not (0 < numerator <= MAX_NUMERATOR and 0 < denominator <= MAX_DENOMINATOR) or denominator & (denominator - 1):
+        raise ValueError(f"Invalid time signature: {numerator}/{denominator} (numerator 1-{MAX_NUMERATOR}, "
+                         f"denominator a power of two up to {MAX_DENOMINATOR})")
+    return numerator, denominator
+
+def bar_ticks(numerator, denominator, resolution=PPQ):
+    """Ticks per bar of a meter, e.g. 1920 for 4/4 and 1440 for 6/8 at 480 PPQ."""
+    ticks = numerator * resolution * 4
+    if ticks % denominator:
+        raise ValueError(f"{numerator}/{denominator} bars are not a whole number of ticks at {resolution} PPQ")
+    return ticks // denominator
+
+def quarter_beats(numerator, denominator):
+    """Length of a bar in beats (quarter notes): an int when whole (4/4 -> 4, 6/8 -> 3), else a float (7/8 -> 3.5)."""
+    beats = numerator * 4 / denominator
+    return int(beats) if beats.is_integer() else beats
+
+def beat_unit_ticks(denominator, resolution=PPQ):
+    """Ticks of the note value the time signature counts in (a quarter for x/4, an eighth for x/8)."""
+    return resolution * 4 // denominator
+
+def tempo_to_mpq(bpm):
+    """Microseconds per quarter note for a tempo in BPM (what the MIDI tempo meta event stores)."""
+    if bpm <= 0:
+        raise ValueError(f"Tempo must be positive (got {bpm})")
+    mpq = int(round(60_000_000 / bpm))
+    if mpq >= 1 << 24:
+        raise ValueError(f"Tempo {bpm} BPM is too slow for a MIDI tempo event")
+    return mpq
+
+def metronome_clocks(numerator, denominator):
+    """MIDI clocks per metronome click: a beat unit, or a dotted beat in compound meters (6/8, 12/8)."""
+    clocks = 24 * 4 // denominator
+    if denominator >= 8 and numerator % 3 == 0 and numerator > 3:
+        clocks *= 3
+    return clocks
@@ -0,0 +1,103 @@
+import random
+from src.music_theory import get_note_name
+
+# Composable transform stages for streams of note events.
+#
+# Events are note dicts in the classic format ('note', 'duration', 'velocity', 'offset'
+# and optionally 'name' and 'channel'; times in beats), arriving in time order, as yielded by
+# MelodyGenerator.iter_variation, ChordGenerator.iter_notes and DrumGenerator.iter_pattern.
+# Each factory below returns a stage: a function that takes an event iterable and lazily
+# yields transformed copies, still in time order. Stages hold no more than one event, so
+# a chain of them streams straight into StreamingMidiWriter:
+#
+#     events = pipeline(gen.iter_variation('B'), transpose(5), swing(0.6), humanize_velocity(8, seed=1))
+#     writer.add_track(events, track_name="Melody", channel=0)
+
+def pipeline(events, *stages):
+    """Chains stages over an event iterable; returns the (lazy) output of the last one."""
+    for stage in stages:
+        events = stage(events)
+    return events
+
+def transpose(semitones):
+    """Shifts every note by a number of semitones; raises ValueError if one leaves 0-127."""
+    def stage(events):
+        for event in events:
+            note = event['note'] + semitones
+            if not 0 <= note <= 127:
+                raise ValueError(f"Transposed note {note} is outside the MIDI range")
+            event = dict(event, note=note)
+            if 'name' in event:
+                event['name'] = get_note_name(note)
+            yield event
+    return stage
+
+def quantize(grid=0.25, strength=1.0):
+    """
+    Pulls note starts towards the nearest multiple of grid (in beats) by strength
+    (1.0 snaps fully, 0.5 halves the distance). Durations are kept.
+    Snapping is monotonic, so time order is preserved.
+    """
+    if grid <= 0:
+        raise ValueError("grid must be positive")
+    if not 0.0 <= strength <= 1.0:
+        raise ValueError("strength must be between 0 and 1")
+    def stage(events):
+        for event in events:
+            offset = event['offset']
+            offset += (round(offset / grid) * grid - offset) * strength
+            yield dict(event, offset=offset)
+    return stage
+
+def swing(amount=0.6, grid=0.5):
+    """
+    Swings pairs of grid-length steps (default 8ths): the off-beat moves from halfway
+    to `amount` of the pair (0.5 is straight, ~0.67 is a triplet feel).
+    Time is warped piecewise-linearly inside each pair, so starts and ends move
+    together and no two events swap order.
+    """
+    if not 0.0 < amount < 1.0:
+        raise ValueError("amount must be between 0 and 1")
+    if grid <= 0:
+        raise ValueError("grid must be positive")
+    pair = 2 * grid
+    split = amount * pair
+
+    def warp(t):
+        pairs, pos = divmod(t, pair)
+        if pos < grid:
+            pos = pos * split / grid
+        else:
+            pos = split + (pos - grid) * (pair - split) / grid
+        return pairs * pair + pos
+
+    def stage(events):
+        for event in events:
+            start = warp(event['offset'])
+            end = warp(event['offset'] + event['duration'])
+            yield dict(event, offset=start, duration=end - start)
+    return stage
+
+def humanize_velocity(amount=10, seed=None):
+    """Adds a random -amount..+amount to every velocity (kept within 1-127). Seeded per run of the stage."""
+    def stage(events):
+        rng = random.Random(seed)
+        for event in events:
+            velocity = min(127, max(1, event['velocity'] + rng.randint(-amount, amount)))
+            yield dict(event, velocity=velocity)
+    return stage
+
+def remap_channels(mapping):
+    """
+    Moves events to other MIDI channels: an int sends everything to that channel,
+    a dict {old: new} remaps the listed channels and leaves the rest alone.
+    """
+    def stage(events):
+        for event in events:
+            channel = event.get('channel', 0)
+            if isinstance(mapping, dict):
+                channel = mapping.get(channel, channel)
+            else:
+                channel = mapping
+            yield dict(event, channel=channel)
+    return stage
@@ -0,0 +1,94 @@
+from functools import lru_cache
+
+from src.music_theory import NOTES, get_note_index, normalize_scale_type, get_scale_table
+
+# Chord shapes as scale-step offsets from the root degree (stacked diatonic thirds)
+CHORD_TYPES = {
+    'triad': (0, 2, 4),
+    'seventh': (0, 2, 4, 6),
+    'ninth': (0, 2, 4, 6, 8),
+    'sus2': (0, 1, 4),
+    'sus4': (0, 3, 4),
+}
+
+# Voice-led chords stay inside this MIDI range (root-position chords start in octave 3)
+VOICING_RANGE = (40, 80)
+
+def _canonical(key, scale_type):
+    return get_note_index(key), normalize_scale_type(scale_type)
+
+@lru_cache(maxsize=4096)
+def _voicing(root_idx, scale_key, degree, chord_type, inversion):
+    steps = CHORD_TYPES.get(chord_type)
+    if steps is None:
+        raise ValueError(f"Unknown chord type: {chord_type}")
+    scale = get_scale_table(NOTES[root_idx], scale_key, 3, 5).notes
+    # Degree 1 = first scale note of octave 3
+    root_pos = degree - 1
+    notes = [scale[root_pos + s] for s in steps if 0 <= root_pos + s < len(scale)]
+    # Inversion k: the lowest k notes go up an octave
+    for _ in range(inversion % len(notes) if notes else 0):
+        notes = sorted(notes[1:] + [notes[0] + 12])
+    return tuple(notes)
+
+def chord_voicing(key, scale_type, degree, chord_type='triad', inversion=0):
+    """
+    MIDI notes of the chord on a scale degree (1-based), as a tuple.
+    Memoized per (key, scale, degree, chord type, inversion), shared by all generators;
+    enharmonic keys and scale spellings share entries.
+    """
+    root_idx, scale_key = _canonical(key, scale_type)
+    return _voicing(root_idx, scale_key, degree, chord_type, inversion)
+
+def _movement(a, b):
+    """Total semitones the voices move going from chord a to chord b."""
+    if len(a) == len(b):
+        return sum(abs(x - y) for x, y in zip(a, b))
+    # Different sizes: each note travels to the nearest note of the other chord
+    return sum(min(abs(x - y) for y in a) for x in b) + sum(min(abs(x - y) for y in b) for x in a)
+
+@lru_cache(maxsize=16384)
+def _lead(previous, root_idx, scale_key, degree, chord_type):
+    low, high = VOICING_RANGE
+    best = None
+    best_cost = None
+    size = len(_voicing(root_idx, scale_key, degree, chord_type, 0))
+    for inversion in range(max(size, 1)):
+        base = _voicing(root_idx, scale_key, degree, chord_type, inversion)
+        for shift in (0, -12, 12):
+            candidate = tuple(n + shift for n in base)
+            if candidate and (candidate[0] < low or candidate[-1] > high):
+                continue
+            cost = _movement(previous, candidate)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = candidate, cost
+    # Nothing fits the range: fall back to root position
+    return best if best is not None else _voicing(root_idx, scale_key, degree, chord_type, 0)
+
+def lead_to(previous, key, scale_type, degree, chord_type='triad'):
+    """
+    The voicing of a chord (any inversion, shifted by up to an octave within VOICING_RANGE)
+    that moves least from the previous chord. Memoized per transition.
+    """
+    root_idx, scale_key = _canonical(key, scale_type)
+    return _lead(tuple(previous), root_idx, scale_key, degree, chord_type)
+
+def voice_progression(key, scale_type, degrees, chord_type='triad', voice_leading=True):
+    """
+    Voicings (tuples of MIDI notes) for a list of scale degrees. The first chord is in root
+    position; with voice_leading, every later one is the minimal-movement voicing.
+    Long progressions repeat a few transitions, so most chords are cache hits.
+    """
+    return list(iter_voicings(key, scale_type, degrees, chord_type, voice_leading))
+
+def iter_voicings(key, scale_type, degrees, chord_type='triad', voice_leading=True):
+    """Lazy voice_progression over any iterable of degrees; only the previous chord is kept."""
+    root_idx, scale_key = _canonical(key, scale_type)
+    previous = None
+    for degree in degrees:
+        if not voice_leading or not previous:
+            chord = _voicing(root_idx, scale_key, degree, chord_type, 0)
+        else:
+            chord = _lead(previous, root_idx, scale_key, degree, chord_type)
+        yield chord
+        previous = chord